@@ -0,0 +1,104 @@
+"""Cold-start and warm-reuse measurement for the Lambda handler module.
+
+Each run starts a fresh interpreter (like a new Lambda container) and records:
+  import_ms       time to import lambda_function (the Lambda init phase)
+  init_ms         time to create the S3 client and report generator on first use
+  warm_init_ms    the same calls again, which should just return the cached clients
+  db_init_ms      first DBManager connect (only with --with-db; needs POSTGRES_* env vars)
+and the slowest modules reported by python -X importtime. Output is JSON so
+numbers can be compared from release to release.
+
+    python benchmarks/cold_start.py [--runs 5] [--with-db]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+lambda_function.get_s3_manager()
+lambda_function.get_report_generator()
+initialised = time.perf_counter()
+lambda_function.get_s3_manager()
+lambda_function.get_report_generator()
+warm = time.perf_counter()
+result = {
+    "import_ms": (imported - start) * 1000,
+    "init_ms": (initialised - imported) * 1000,
+    "warm_init_ms": (warm - initialised) * 1000,
+}
+if "--with-db" in sys.argv:
+    db_start = time.perf_counter()
+    lambda_function.get_db_manager()
+    result["db_init_ms"] = (time.perf_counter() - db_start) * 1000
+print(json.dumps(result))
+"""
+
+
+def probe_env():
+    env = dict(os.environ)
+    # The module copies these into DD_* at import time and fails if they are unset.
+    env.setdefault("DATADOG_API_KEY", "cold-start-benchmark")
+    env.setdefault("DD_SITE", "datadoghq.com")
+    env.setdefault("OPENAI_API_KEY", "cold-start-benchmark")
+    env.setdefault("AWS_S3_REGION_NAME", "us-east-1")
+    return env
+
+
+def slowest_imports(env, limit):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        cwd=SRC, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # Nested imports are indented by two extra spaces per level; keep the top-level ones.
+        if len(name) - len(name.lstrip()) == 1:
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:limit]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--with-db", action="store_true")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to report")
+    args = parser.parse_args()
+
+    env = probe_env()
+    runs = []
+    for _ in range(args.runs):
+        command = [sys.executable, "-c", PROBE] + (["--with-db"] if args.with_db else [])
+        completed = subprocess.run(command, cwd=SRC, env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    summary = {"python": sys.version.split()[0], "runs": len(runs)}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        summary[key] = {
+            "p50": round(statistics.median(values), 2),
+            "p95": round(percentile(values, 0.95), 2),
+            "max": round(max(values), 2),
+        }
+    summary["slowest_imports"] = slowest_imports(env, args.top)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
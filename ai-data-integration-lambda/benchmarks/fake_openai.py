@@ -0,0 +1,248 @@
+"""A stand-in for the OpenAI chat completions and Batch APIs, for benchmarks and tests.
+
+Answers POST /v1/chat/completions after a configurable delay with a valid
+InspectionReport, built from the deficiency lines that synthetic_pdfs.py
+writes ("<question>? No. Severity: <level>. <detail>"), so reports have the
+right shape and roughly the right size. Tool-call (instructor's default),
+json_schema and plain JSON requests are all answered, and usage is reported
+from the request size. Optionally answers a fraction of requests with 429.
+
+The Batch API is covered by POST /v1/files, GET /v1/files/<id>/content,
+POST /v1/batches and GET /v1/batches/<id>. A batch is answered as soon as it
+is created: every JSONL line gets the completion the chat endpoint would
+return, and the batch reports "completed" from the first retrieve. With
+fail_batches=True batch creation is rejected with a 400 instead.
+
+Run it standalone and point a client at it with OPENAI_BASE_URL:
+
+    python benchmarks/fake_openai.py --port 8089 --latency 1.5 --jitter 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 ...
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFICIENCY = re.compile(r"([A-Z]{1,3}\.[A-Z]\.\d+ [^?]{5,200}\?) No\. Severity: ([\w-]+)\. ([^.]{3,200}\.)")
+PAGE = re.compile(r"--- Page (\d+) ---")
+TITLE = re.compile(r"(Form for Inspection[^.]*)\.")
+FIELD = re.compile(r"(Location|Contact|Inspector): ([^.]+)\.")
+
+
+def build_report(text):
+    """InspectionReport fields for the text of one request."""
+    deficiencies = []
+    chunks = PAGE.split(text)
+    # PAGE.split gives [before, number, text, number, text, ...].
+    pages = list(zip(chunks[1::2], chunks[2::2])) or [(None, text)]
+    for page_no, page_text in pages:
+        for question, severity, detail in DEFICIENCY.findall(page_text):
+            deficiencies.append({
+                "status": None,
+                "severity": severity,
+                "description": f"{question} {detail}",
+                "page_no": page_no,
+            })
+    fields = dict(FIELD.findall(text))
+    title = TITLE.search(text)
+    return {
+        "title": title.group(1).strip() if title else "Inspection Report",
+        "location": fields.get("Location", "UNKNOWN").strip(),
+        "contact": fields.get("Contact", "null").strip(),
+        "inspector": fields.get("Inspector", "null").strip(),
+        "deficiency_summary": deficiencies,
+    }
+
+
+def completion(body, number):
+    """The chat.completion object answering one request body."""
+    messages = body.get("messages", [])
+    text = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    report = json.dumps(build_report(text))
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    message = {"role": "assistant", "content": report}
+    if body.get("tools"):
+        name = body["tools"][0]["function"]["name"]
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": "call_fake", "type": "function", "function": {"name": name, "arguments": report}}],
+        }
+    return {
+        "id": f"chatcmpl-fake-{number}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(report) // 4,
+            "total_tokens": prompt_tokens + len(report) // 4,
+        },
+    }
+
+
+def multipart_fields(content_type, data):
+    """{name: (filename, bytes)} for a multipart/form-data body."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + data
+    )
+    return {
+        part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.iter_parts()
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        number = server.count_request()
+        path = self.path.rstrip("/")
+        if path.endswith("/files"):
+            return self.create_file(data)
+        if path.endswith("/batches"):
+            return self.create_batch(json.loads(data or b"{}"))
+        if not path.endswith("chat/completions"):
+            return self.reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+        if server.error_rate and random.random() < server.error_rate:
+            return self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                              {"retry-after-ms": "200"})
+
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        self.reply(200, completion(json.loads(data or b"{}"), number))
+
+    def do_GET(self):
+        # /v1/files/<id>/content or /v1/batches/<id>
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        server = self.server
+        if parts[-1] == "content" and parts[-3] == "files" and parts[-2] in server.files:
+            return self.reply_bytes(200, server.files[parts[-2]], "application/octet-stream")
+        if parts[-2] == "batches" and parts[-1] in server.batches:
+            return self.reply(200, server.batches[parts[-1]])
+        self.reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def create_file(self, data):
+        fields = multipart_fields(self.headers.get("Content-Type", ""), data)
+        filename, content = fields.get("file", ("upload.jsonl", b""))
+        purpose = fields["purpose"][1].decode() if "purpose" in fields else "batch"
+        self.reply(200, self.server.add_file(content, filename, purpose))
+
+    def create_batch(self, body):
+        server = self.server
+        if server.fail_batches:
+            return self.reply(400, {"error": {"message": "Batch creation rejected", "type": "invalid_request_error"}})
+        if body.get("input_file_id") not in server.files:
+            return self.reply(404, {"error": {"message": f"No such file: {body.get('input_file_id')}"}})
+        self.reply(200, server.run_batch(body))
+
+    def reply(self, status, payload, headers=None):
+        self.reply_bytes(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def reply_bytes(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=1.0, jitter=0.0, error_rate=0.0, fail_batches=False):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_batches = fail_batches
+        self.requests = 0
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def add_file(self, data, filename, purpose):
+        with self.lock:
+            file_id = f"file-fake-{len(self.files) + 1}"
+            self.files[file_id] = data
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def run_batch(self, body):
+        """Answer every request line of the input file and return the completed batch."""
+        lines = [json.loads(line) for line in self.files[body["input_file_id"]].decode().splitlines() if line.strip()]
+        output = "\n".join(
+            json.dumps({
+                "id": f"batch_req_{index}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "request_id": f"req_{index}", "body": completion(line["body"], index)},
+                "error": None,
+            })
+            for index, line in enumerate(lines)
+        )
+        output_file = self.add_file(output.encode(), "batch_output.jsonl", "batch_output")
+        now = int(time.time())
+        with self.lock:
+            batch_id = f"batch_fake_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get("endpoint"),
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "completed",
+                "output_file_id": output_file["id"],
+                "error_file_id": None,
+                "created_at": now,
+                "completed_at": now,
+                "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+            }
+            return self.batches[batch_id]
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=1.0, help="mean seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Fake OpenAI listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""End-to-end throughput benchmark for lambda_handler and DeficiencyReportGenerator.
+
+Stands the pipeline up against local stand-ins and drives it to completion:
+  * a synthetic corpus from synthetic_pdfs.py (page counts x documents, seeded),
+  * S3 mocked in-process with moto, the corpus uploaded under "<pdf id>/<name>",
+  * Postgres: a scratch schema with the pdf_documents, pdf_metrics and
+    deficiencies tables in the database named by the POSTGRES_* variables
+    (e.g. a throwaway `docker run -e POSTGRES_PASSWORD=... -p 5432:5432 postgres`); the
+    handler is pointed at it through PGOPTIONS=search_path,
+  * fake_openai.py serving completions with --latency/--jitter seconds delay.
+
+Two runs are measured. "handler" invokes lambda_handler until every row is
+claimed, then reads the per-stage timings the pipeline itself recorded in
+pdf_metrics. "generator" calls DeficiencyReportGenerator.generate_report on
+the in-memory corpus with --generator-concurrency threads, isolating
+extraction + LLM from S3 and the database. Results (PDFs/second and
+p50/p95/p99 per stage and end to end, overall and per page count) are
+printed as JSON, or written to --output, tagged with the git commit so runs
+can be compared.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/pipeline.py [--pages 2 10 50 200] [--per-size 5] [--density 0.1]
+        [--latency 1.0] [--jitter 0.3] [--max-workers 4] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+import boto3  # noqa: E402
+import psycopg2  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+from synthetic_pdfs import make_corpus  # noqa: E402
+
+SCHEMA = "bench_pipeline"
+BUCKET = "bench-pipeline"
+STAGES = ("download_ms", "extract_ms", "llm_ms", "upload_ms", "total_ms")
+
+# Columns the Lambda reads and writes; mirrors the Django models. The tests build their own
+# schema from the same template.
+SCHEMA_TEMPLATE = """
+DROP SCHEMA IF EXISTS {schema} CASCADE;
+CREATE SCHEMA {schema};
+CREATE TABLE {schema}.pdf_documents (
+    id uuid PRIMARY KEY,
+    pdf_file varchar(100),
+    uploaded_at timestamptz NOT NULL DEFAULT now(),
+    status varchar(50) NOT NULL,
+    deficiency_report varchar(100),
+    claimed_by varchar(100),
+    lease_expires_at timestamptz,
+    content_hash varchar(64),
+    batch_id varchar(100)
+);
+CREATE INDEX ON {schema}.pdf_documents (uploaded_at) WHERE status IN ('Not Processed', 'Processing');
+CREATE INDEX ON {schema}.pdf_documents (content_hash);
+CREATE TABLE {schema}.pdf_metrics (
+    id bigserial PRIMARY KEY,
+    pdf_id uuid NOT NULL REFERENCES {schema}.pdf_documents (id),
+    source varchar(20) NOT NULL,
+    status varchar(50) NOT NULL,
+    model varchar(50),
+    download_ms integer, extract_ms integer, llm_ms integer, upload_ms integer, total_ms integer,
+    page_count integer,
+    prompt_tokens integer NOT NULL DEFAULT 0,
+    completion_tokens integer NOT NULL DEFAULT 0,
+    retries integer NOT NULL DEFAULT 0,
+    cost_usd numeric(12, 6) NOT NULL DEFAULT 0,
+    created_at timestamptz NOT NULL
+);
+CREATE TABLE {schema}.deficiencies (
+    id bigserial PRIMARY KEY,
+    pdf_id uuid NOT NULL REFERENCES {schema}.pdf_documents (id),
+    position integer NOT NULL,
+    status varchar(100),
+    severity varchar(100),
+    description text,
+    page_no varchar(50),
+    title varchar(500),
+    location varchar(255),
+    contact varchar(255),
+    inspector varchar(255),
+    uploaded_at timestamptz NOT NULL,
+    created_at timestamptz NOT NULL
+);
+CREATE INDEX ON {schema}.deficiencies (pdf_id);
+CREATE INDEX deficiency_uploaded_at_idx ON {schema}.deficiencies (uploaded_at, id);
+CREATE INDEX deficiency_severity_idx ON {schema}.deficiencies (severity, uploaded_at);
+CREATE INDEX deficiency_status_idx ON {schema}.deficiencies (status, uploaded_at);
+CREATE INDEX deficiency_location_idx ON {schema}.deficiencies (location, uploaded_at);
+CREATE INDEX deficiency_loc_severity_idx ON {schema}.deficiencies (location, severity, uploaded_at);
+"""
+SCHEMA_SQL = SCHEMA_TEMPLATE.format(schema=SCHEMA)
+
+
+class Context:
+    """The parts of the Lambda context object the handler reads."""
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+
+def percentiles(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))]  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": round(statistics.mean(values), 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def connect():
+    return psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DATABASE"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=os.getenv("POSTGRES_PORT", "5432"),
+    )
+
+
+def configure_environment(args, openai_url):
+    """Settings the Lambda modules read at import time; must run before importing them."""
+    os.environ.update({
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_KEY": "benchmark",
+        "AWS_STORAGE_BUCKET_NAME": BUCKET,
+        "AWS_S3_REGION_NAME": "us-east-1",
+        "AWS_ACCESS_KEY_ID_": "benchmark",
+        "AWS_SECRET_ACCESS_KEY_": "benchmark",
+        "DATADOG_API_KEY": "benchmark",
+        "DD_SITE": "datadoghq.com",
+        "MAX_WORKERS": str(args.max_workers),
+        "CLAIM_BATCH_SIZE": str(args.claim_batch_size),
+        "PGOPTIONS": f"-c search_path={SCHEMA}",
+    })
+
+
+def seed(corpus):
+    """Upload the corpus to the mocked bucket and insert one Not Processed row per document."""
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    rows, pages_by_id = [], {}
+    for name, pages, _, data in corpus:
+        pdf_id = str(uuid.uuid4())
+        key = f"{pdf_id}/{name}"
+        s3.put_object(Bucket=BUCKET, Key=key, Body=data)
+        rows.append((pdf_id, key))
+        pages_by_id[pdf_id] = pages
+    with contextlib.closing(connect()) as connection, connection, connection.cursor() as cursor:
+        cursor.execute(SCHEMA_SQL)
+        cursor.executemany(
+            f"INSERT INTO {SCHEMA}.pdf_documents (id, pdf_file, status) VALUES (%s, %s, 'Not Processed')", rows
+        )
+    return pages_by_id
+
+
+def quiet_lambda_logging(lambda_function):
+    # No Datadog shipping and no per-PDF chatter in the benchmark output.
+    lambda_function.logger.logger.handlers = [logging.NullHandler()]
+
+
+def run_handler(lambda_function):
+    invocations = []
+    started = time.perf_counter()
+    while True:
+        invocation_started = time.perf_counter()
+        response = lambda_function.lambda_handler({}, Context())
+        body = json.loads(response.get("body", "{}"))
+        if "processed" not in body:
+            break
+        invocations.append({"pdfs": len(body["processed"]), "seconds": round(time.perf_counter() - invocation_started, 3)})
+    return time.perf_counter() - started, invocations
+
+
+def handler_results(elapsed, invocations, pages_by_id):
+    with contextlib.closing(connect()) as connection, connection.cursor() as cursor:
+        cursor.execute(f"SELECT status, count(*) FROM {SCHEMA}.pdf_documents GROUP BY status")
+        statuses = dict(cursor.fetchall())
+        cursor.execute(f"SELECT pdf_id::text, {', '.join(STAGES)}, prompt_tokens, completion_tokens FROM {SCHEMA}.pdf_metrics")
+        metrics = cursor.fetchall()
+
+    processed = sum(i["pdfs"] for i in invocations)
+    result = {
+        "pdfs": processed,
+        "seconds": round(elapsed, 3),
+        "pdfs_per_second": round(processed / elapsed, 3) if elapsed else None,
+        "statuses": statuses,
+        "invocations": invocations,
+        "stages": {stage: percentiles(row[1 + i] for row in metrics) for i, stage in enumerate(STAGES)},
+        "prompt_tokens": sum(row[-2] for row in metrics),
+        "completion_tokens": sum(row[-1] for row in metrics),
+        "by_pages": {},
+    }
+    for page_count in sorted(set(pages_by_id.values())):
+        rows = [row for row in metrics if pages_by_id.get(row[0]) == page_count]
+        result["by_pages"][page_count] = {
+            "pdfs": len(rows),
+            **{stage: percentiles(row[1 + i] for row in rows) for i, stage in enumerate(STAGES)},
+        }
+    return result
+
+
+def run_generator(corpus, concurrency):
+    from deficiency_report import DeficiencyReportGenerator
+    from metrics import PipelineMetrics
+
+    generator = DeficiencyReportGenerator()
+
+    def generate(document):
+        name, pages, deficiencies, data = document
+        metrics = PipelineMetrics(name)
+        generator.generate_report(data, name, metrics)
+        row = metrics.as_dict()
+        return pages, row
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        rows = list(executor.map(generate, corpus))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "pdfs": len(rows),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "pdfs_per_second": round(len(rows) / elapsed, 3) if elapsed else None,
+        "stages": {stage: percentiles(row[stage] for _, row in rows) for stage in ("extract_ms", "llm_ms", "total_ms")},
+        "by_pages": {
+            page_count: {stage: percentiles(row[stage] for pages, row in rows if pages == page_count)
+                         for stage in ("extract_ms", "llm_ms", "total_ms")}
+            for page_count in sorted({pages for pages, _ in rows})
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 50, 200])
+    parser.add_argument("--per-size", type=int, default=5, help="documents per page count")
+    parser.add_argument("--density", type=float, default=0.1, help="fraction of checklist answers that are deficiencies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=1.0, help="mean fake OpenAI latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions answered with 429")
+    parser.add_argument("--max-workers", type=int, default=4, help="MAX_WORKERS for the handler")
+    parser.add_argument("--claim-batch-size", type=int, default=50)
+    parser.add_argument("--generator-concurrency", type=int, default=4)
+    parser.add_argument("--skip-handler", action="store_true")
+    parser.add_argument("--skip-generator", action="store_true")
+    parser.add_argument("--keep-schema", action="store_true")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.pages, args.per_size, args.density, args.seed)
+    server = FakeOpenAIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate).start()
+    configure_environment(args, server.base_url)
+
+    results = {
+        "commit": git_commit(),
+        "params": vars(args),
+        "corpus": {
+            "documents": len(corpus),
+            "pages": sum(doc[1] for doc in corpus),
+            "deficiencies": sum(doc[2] for doc in corpus),
+            "bytes": sum(len(doc[3]) for doc in corpus),
+        },
+    }
+    # The pipeline prints progress to stdout; keep stdout for the JSON.
+    with contextlib.redirect_stdout(sys.stderr), mock_aws():
+        if not args.skip_handler:
+            pages_by_id = seed(corpus)
+            import lambda_function
+
+            quiet_lambda_logging(lambda_function)
+            elapsed, invocations = run_handler(lambda_function)
+            lambda_function.get_db_manager().close_connection()
+            results["handler"] = handler_results(elapsed, invocations, pages_by_id)
+            if not args.keep_schema:
+                with contextlib.closing(connect()) as connection, connection, connection.cursor() as cursor:
+                    cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        if not args.skip_generator:
+            results["generator"] = run_generator(corpus, args.generator_concurrency)
+    results["openai_requests"] = server.requests
+    server.shutdown()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Recall and token-reduction benchmark for the deficiency page prefilter.
+
+Runs page_filter.select_pages over a labelled corpus and reports, per document
+and overall, how many deficiency pages were kept (recall) and how much of the
+text would no longer be sent to the model. Exits non-zero when recall falls
+below --min-recall, so it can gate PREFILTER_ENABLED / PREFILTER_MIN_SCORE changes.
+
+    python benchmarks/prefilter_recall.py [--corpus fixtures/prefilter_corpus.json] [--min-score 2]
+
+Corpus format: {"documents": [{"name", "pages": [text, ...], "deficiency_pages": [1-based page numbers]}]}
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from page_filter import select_pages  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "prefilter_corpus.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--min-score", type=int, default=int(os.getenv("PREFILTER_MIN_SCORE", "2")))
+    parser.add_argument("--min-recall", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        documents = json.load(f)["documents"]
+
+    expected_total = found_total = chars_total = chars_kept = 0
+    rows = []
+    for doc in documents:
+        pages = doc["pages"]
+        kept = {i + 1 for i in select_pages(pages, min_score=args.min_score)}
+        expected = set(doc["deficiency_pages"])
+        found = expected & kept
+        doc_chars = sum(len(p) for p in pages)
+        doc_kept_chars = sum(len(pages[n - 1]) for n in kept)
+
+        expected_total += len(expected)
+        found_total += len(found)
+        chars_total += doc_chars
+        chars_kept += doc_kept_chars
+        rows.append({
+            "name": doc["name"],
+            "pages": len(pages),
+            "kept_pages": len(kept),
+            "recall": len(found) / len(expected) if expected else 1.0,
+            "missed_pages": sorted(expected - kept),
+            "token_reduction": 1 - doc_kept_chars / doc_chars if doc_chars else 0.0,
+        })
+
+    summary = {
+        "min_score": args.min_score,
+        "documents": rows,
+        "recall": found_total / expected_total if expected_total else 1.0,
+        "token_reduction": 1 - chars_kept / chars_total if chars_total else 0.0,
+    }
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["recall"] >= args.min_recall else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Synthetic fire-inspection PDFs for benchmarks.
+
+Each document has a title/location/contact/inspector header on page 1 and
+numbered checklist questions on every page. A --density fraction of the
+questions are answered "No" with a severity and a detail sentence, which is
+what the prompt asks the model to extract and what fake_openai.py looks for.
+Documents are seeded, so the same arguments always produce the same corpus.
+
+    python benchmarks/synthetic_pdfs.py out_dir [--pages 2 10 50 200] [--per-size 3] [--density 0.1]
+"""
+import argparse
+import os
+import random
+
+import fitz
+
+QUESTIONS = [
+    "Pump house/room proper temperature",
+    "Waterflow test valves in closed position",
+    "Suction control valves fully open",
+    "Fire pump controller in automatic position",
+    "Jockey pump operating correctly",
+    "Sprinkler heads free of corrosion and paint",
+    "Fire department connection caps in place",
+    "Alarm valve trim free of leaks",
+    "Standpipe hose valves accessible",
+    "Emergency lighting operational",
+]
+SEVERITIES = ["Impairment", "Critical", "Non-Critical"]
+DETAILS = [
+    "Corrective action required by the owner",
+    "Reported to the facility manager on site",
+    "Component must be repaired or replaced",
+    "Condition observed during the annual inspection",
+]
+LINES_PER_PAGE = 45
+LINE_HEIGHT = 15
+
+
+def page_lines(rng, document_number, page_number, density, question_counter):
+    lines = []
+    if page_number == 1:
+        lines += [
+            f"Form for Inspection, Testing and Maintenance of Fire Pumps {document_number}.",
+            f"Location: LOC{document_number:05d}.",
+            f"Contact: Facility Manager {document_number}.",
+            f"Inspector: Inspector {rng.randint(1, 50)}.",
+            "",
+        ]
+    while len(lines) < LINES_PER_PAGE:
+        question_counter[0] += 1
+        number = question_counter[0]
+        section = f"{'I' * (1 + number // 100 % 3)}.{chr(65 + number // 10 % 26)}.{number % 10 + 1}"
+        question = rng.choice(QUESTIONS)
+        if rng.random() < density:
+            lines.append(f"{section} {question}? No. Severity: {rng.choice(SEVERITIES)}. {rng.choice(DETAILS)}.")
+        else:
+            lines.append(f"{section} {question}? Yes")
+    return lines
+
+
+def make_pdf(document_number, pages, density=0.1, seed=0):
+    """Return (pdf bytes, number of deficiencies written)."""
+    rng = random.Random(f"{seed}:{document_number}:{pages}:{density}")
+    question_counter = [0]
+    deficiencies = 0
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        lines = page_lines(rng, document_number, page_number, density, question_counter)
+        deficiencies += sum(" No. Severity: " in line for line in lines)
+        for index, line in enumerate(lines):
+            page.insert_text((36, 40 + index * LINE_HEIGHT), line, fontsize=8)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data, deficiencies
+
+
+def make_corpus(page_counts, per_size, density, seed=0):
+    """[(name, pages, deficiencies, pdf bytes)] for every page count, per_size documents each."""
+    corpus = []
+    for page_count in page_counts:
+        for copy in range(per_size):
+            number = len(corpus) + 1
+            data, deficiencies = make_pdf(number, page_count, density, seed)
+            corpus.append((f"inspection-{number:04d}-{page_count}p.pdf", page_count, deficiencies, data))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 50, 200])
+    parser.add_argument("--per-size", type=int, default=3)
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    for name, pages, deficiencies, data in make_corpus(args.pages, args.per_size, args.density, args.seed):
+        with open(os.path.join(args.out_dir, name), "wb") as f:
+            f.write(data)
+        print(f"{name}: {pages} pages, {deficiencies} deficiencies, {len(data)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import io
+import json
+from collections import defaultdict
+from config import MODEL, BATCH_COMPLETION_WINDOW, BATCH_LEASE_SECONDS
+from db_manager import PDFStatus
+from deficiency_report import InspectionReport
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+class BatchProcessor:
+    """Runs claimed PDFs through the OpenAI Batch API instead of synchronous completions.
+
+    submit() extracts the claimed PDFs, writes one JSONL request per PDF (or per
+    window for chunked documents), submits the batch and stores its id on the
+    rows. poll() is run by a later invocation: for every completed batch it
+    validates each output line against InspectionReport and finishes the PDF
+    through the usual S3 upload and status update.
+    """
+
+    def __init__(self, db_manager, s3_manager, report_generator, report_cache, logger):
+        self.db_manager = db_manager
+        self.s3_manager = s3_manager
+        self.report_generator = report_generator
+        self.report_cache = report_cache
+        self.openai_client = report_generator.openai_client
+        self.logger = logger
+
+    def build_request(self, custom_id, text):
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": MODEL,
+                "messages": self.report_generator.build_messages(text),
+                "temperature": 0,
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": "InspectionReport", "schema": InspectionReport.model_json_schema()},
+                },
+            },
+        }
+
+    def submit(self, pdfs, worker_id):
+        """Submit the claimed PDFs as one batch.
+
+        The PDFs are claimed with the normal lease; mark_batch_submitted only
+        stretches it to BATCH_LEASE_SECONDS once the batch exists. If the upload
+        or the submission fails, the claims are released right away.
+        """
+        lines, submitted, results = [], [], []
+        for pdf in pdfs:
+            pdf_id, pdf_url = str(pdf["id"]), str(pdf["url"])
+            pdf_source = None
+            try:
+                pdf_source = self.s3_manager.download_to_memory(pdf_url)
+                content_hash = self.report_cache.compute_key(pdf_source)
+                cached_report = self.report_cache.lookup(content_hash)
+                if cached_report:
+                    self.db_manager.queue_deficiency_response(pdf_id, cached_report, PDFStatus.PROCESS_SUCCESS, content_hash, worker_id)
+                    self.db_manager.queue_deficiencies(pdf_id, content_hash=content_hash)
+                    results.append({"id": pdf_id, "status": "Success", "report_s3_path": cached_report, "cached": True})
+                    continue
+                texts = self.report_generator.prepare_texts(pdf_source, pdf_id)
+                # custom_id is "<pdf id>:<window>", so poll() can merge chunked documents again.
+                lines.extend(
+                    json.dumps(self.build_request(f"{pdf_id}:{index}", text))
+                    for index, text in enumerate(texts)
+                )
+                submitted.append((pdf_id, content_hash))
+            except Exception as e:
+                self.logger.log(f"Error preparing PDF {pdf_id} for batch: {e}", "error")
+                self.db_manager.queue_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED, claimed_by=worker_id)
+                results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
+            finally:
+                self.s3_manager.release(pdf_source)
+
+        if not submitted:
+            return {"batch_id": None, "results": results}
+
+        payload = io.BytesIO("\n".join(lines).encode("utf-8"))
+        payload.name = "inspection_reports.jsonl"
+        try:
+            input_file = self.openai_client.files.create(file=payload, purpose="batch")
+            batch = self.openai_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+            )
+        except Exception as e:
+            released = self.db_manager.release_claims(worker_id, [pdf_id for pdf_id, _ in submitted])
+            self.logger.log(f"Error submitting batch, released {released} PDFs: {e}", "error")
+            results.extend({"id": pdf_id, "status": "Released", "error": str(e)} for pdf_id, _ in submitted)
+            return {"batch_id": None, "results": results}
+        self.db_manager.mark_batch_submitted(batch.id, submitted, BATCH_LEASE_SECONDS)
+        self.logger.log(f"Submitted batch {batch.id} with {len(lines)} requests for {len(submitted)} PDFs")
+        results.extend({"id": pdf_id, "status": "Submitted", "batch_id": batch.id} for pdf_id, _ in submitted)
+        return {"batch_id": batch.id, "results": results}
+
+    def poll(self):
+        results = []
+        for batch_id in self.db_manager.fetch_pending_batches():
+            batch = self.openai_client.batches.retrieve(batch_id)
+            if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                self.logger.log(f"Batch {batch_id} is {batch.status}")
+                continue
+            if batch.status != "completed":
+                # failed / expired / cancelled: hand the PDFs back to the normal queue.
+                released = self.db_manager.release_batch(batch_id)
+                self.logger.log(f"Batch {batch_id} ended as {batch.status}, released {released} PDFs", "error")
+                continue
+            results.extend(self.finish_batch(batch))
+        return results
+
+    def finish_batch(self, batch):
+        # The rows stay claimed by the worker that submitted the batch.
+        claims = self.db_manager.fetch_batch_pdfs(batch.id)
+        windows, errors = defaultdict(dict), {}
+
+        if batch.output_file_id:
+            for line in self.openai_client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                pdf_id, index = record["custom_id"].rsplit(":", 1)
+                try:
+                    response = record.get("response") or {}
+                    if response.get("status_code") != 200:
+                        raise ValueError(f"request failed with status {response.get('status_code')}")
+                    content = response["body"]["choices"][0]["message"]["content"]
+                    windows[pdf_id][int(index)] = InspectionReport.model_validate_json(content)
+                except Exception as e:
+                    errors[pdf_id] = str(e)
+        if batch.error_file_id:
+            for line in self.openai_client.files.content(batch.error_file_id).text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    errors[record["custom_id"].rsplit(":", 1)[0]] = json.dumps(record.get("error") or record.get("response"))
+
+        results = []
+        for pdf_id, (content_hash, claimed_by) in claims.items():
+            if pdf_id in errors or pdf_id not in windows:
+                error = errors.get(pdf_id, "no output line for PDF in batch")
+                self.logger.log(f"Batch {batch.id}: PDF {pdf_id} failed: {error}", "error")
+                self.db_manager.queue_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED, claimed_by=claimed_by)
+                results.append({"id": pdf_id, "status": "Failed", "error": error})
+                continue
+            reports = [windows[pdf_id][index] for index in sorted(windows[pdf_id])]
+            report = reports[0] if len(reports) == 1 else self.report_generator.merge_reports(reports)
+            report_filename = f"{pdf_id}/{pdf_id}_report.json"
+            try:
+                self.s3_manager.upload_file(json.dumps(report.model_dump(), indent=4), report_filename, {"content-hash": content_hash})
+            except Exception as e:
+                self.logger.log(f"Error uploading report to S3: {e}", "error")
+                self.db_manager.queue_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED, claimed_by=claimed_by)
+                results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
+                continue
+            self.db_manager.queue_deficiency_response(pdf_id, report_filename, PDFStatus.PROCESS_SUCCESS, content_hash, claimed_by)
+            self.db_manager.queue_deficiencies(pdf_id, report.model_dump())
+            results.append({"id": pdf_id, "status": "Success", "report_s3_path": report_filename, "batch_id": batch.id})
+        return results
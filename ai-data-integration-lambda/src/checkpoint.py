@@ -0,0 +1,31 @@
+import hashlib
+import json
+from config import CHECKPOINT_PREFIX
+
+
+class ChunkCheckpoint:
+    """S3 store of the window reports already extracted for one PDF.
+
+    Objects live under CHECKPOINT_PREFIX/<content_hash>/, keyed by a hash of the
+    window text, so a run that stopped half way (time budget or timeout) resumes
+    with only the missing windows. content_hash covers the PDF bytes, model and
+    prompt version, so a changed prompt never reuses stale windows. The prefix is
+    deleted once the full report has been written.
+    """
+
+    def __init__(self, s3_manager, content_hash):
+        self.s3_manager = s3_manager
+        self.prefix = f"{CHECKPOINT_PREFIX}/{content_hash}/"
+
+    def key(self, text):
+        return self.prefix + hashlib.sha256(text.encode()).hexdigest()[:32] + ".json"
+
+    def load(self):
+        """Return {key: report dict} for the windows saved so far."""
+        return {key: json.loads(body) for key, body in self.s3_manager.read_prefix(self.prefix).items()}
+
+    def save(self, key, report):
+        self.s3_manager.upload_file(json.dumps(report), key)
+
+    def clear(self):
+        return self.s3_manager.delete_prefix(self.prefix)
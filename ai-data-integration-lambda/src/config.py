@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -21,13 +22,95 @@ PROMPT="""
             Status: "null" if missing.
             Severity: Severity level.
             Description: Full description, excluding phrases like "see attachment. and also the question statement"
-            Page Number:  The page number where the deficiency **concludes** (not where it starts, but where the deficiency description **ends**). The page number will typically appear **after** the end of the deficiency text, especially when the report moves to a new section or comments are added. If the page number is given after a deficiency, that deficiency belongs to that page.
+            Page Number:  Each page of the report text starts with a marker like "--- Page 7 ---"; use the number from these markers. The page number where the deficiency **concludes** (not where it starts, but where the deficiency description **ends**). The page number will typically appear **after** the end of the deficiency text, especially when the report moves to a new section or comments are added. If the page number is given after a deficiency, that deficiency belongs to that page.
             Note: Include entries with "null" fields if data is missing. Process each deficiency individually.
             below mentioned is the sample response 
             {'title': 'Form for Inspection, Testing and Maintenance of Fire Pumps', 'location': 'EANLUBF', 'deficiency_summary': [{'status': None, 'severity': 'Impairment', 'description': 'II.A.1 1. Pump house/room proper temperature? Pump house/room is not in proper temperature.'}, {'status': None, 'severity': 'Critical', 'description': 'II.A.8 8. Waterflow test valves in closed position? Waterflow test valves are not in closed position',page_no:10}]}
             """.strip()
 
+# Part of the report cache key: changing the prompt (or setting PROMPT_VERSION) invalidates cached reports.
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", hashlib.sha256(PROMPT.encode()).hexdigest()[:12])
+
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID_")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY_")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME=os.getenv("AWS_S3_REGION_NAME")
+
+# Number of PDFs processed concurrently per invocation. 1 keeps the old sequential behaviour.
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+
+# Rows claimed per invocation and how long a claim is held before another worker may take it over.
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", "50"))
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "900"))
+
+# maxReceiveCount of the ingestion queue's redrive policy. A PDF that fails on an earlier delivery
+# is put back to Not Processed for the retry; only the last delivery marks it Process Failed.
+SQS_MAX_RECEIVE_COUNT = int(os.getenv("SQS_MAX_RECEIVE_COUNT", "3"))
+
+# In-memory PDF downloads: objects above S3_RANGE_PART_SIZE are fetched with parallel ranged GETs,
+# objects above S3_SPILL_THRESHOLD are written to /tmp instead of being held in memory.
+S3_RANGE_PART_SIZE = int(os.getenv("S3_RANGE_PART_SIZE", str(8 * 1024 * 1024)))
+S3_DOWNLOAD_CONCURRENCY = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "8"))
+S3_SPILL_THRESHOLD = int(os.getenv("S3_SPILL_THRESHOLD", str(100 * 1024 * 1024)))
+
+# Text extraction: documents with at least EXTRACT_PARALLEL_MIN_PAGES pages are split into page
+# ranges and extracted in EXTRACT_PROCESSES worker processes (0 or 1 disables the pool).
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", "50"))
+
+# Chunked extraction: documents estimated above CHUNK_TOKEN_BUDGET tokens are split into page windows
+# of that size (overlapping by CHUNK_OVERLAP_PAGES) and extracted concurrently. 0 disables chunking.
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "12000"))
+CHUNK_OVERLAP_PAGES = int(os.getenv("CHUNK_OVERLAP_PAGES", "1"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+
+# Page prefilter: only pages scoring at least PREFILTER_MIN_SCORE (plus the header page) are sent to the model.
+# Off by default; check recall with benchmarks/prefilter_recall.py before enabling.
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "false").lower() == "true"
+PREFILTER_MIN_SCORE = int(os.getenv("PREFILTER_MIN_SCORE", "2"))
+
+# OpenAI prices in USD per 1M tokens, used for the cost column of pdf_metrics (defaults: gpt-4o).
+INPUT_TOKEN_PRICE = float(os.getenv("INPUT_TOKEN_PRICE", "2.50"))
+OUTPUT_TOKEN_PRICE = float(os.getenv("OUTPUT_TOKEN_PRICE", "10.00"))
+
+# Datadog log shipping: records are batched (at most DD_BATCH_SIZE per request, sent at least every
+# DD_FLUSH_INTERVAL seconds) from a bounded buffer of DD_BUFFER_SIZE records; overflow is dropped.
+DD_BATCH_SIZE = int(os.getenv("DD_BATCH_SIZE", "100"))
+DD_BUFFER_SIZE = int(os.getenv("DD_BUFFER_SIZE", "10000"))
+DD_FLUSH_INTERVAL = float(os.getenv("DD_FLUSH_INTERVAL", "2"))
+DD_FLUSH_TIMEOUT = float(os.getenv("DD_FLUSH_TIMEOUT", "10"))
+# Base URL of the log intake; unset means the Datadog site in DD_SITE. Tests point it at a local fake.
+DD_INTAKE_URL = os.getenv("DD_INTAKE_URL") or None
+
+# Status/report updates and metrics rows are buffered and written in one statement once
+# STATUS_FLUSH_SIZE are pending or STATUS_FLUSH_INTERVAL seconds have passed (1 = write immediately).
+STATUS_FLUSH_SIZE = int(os.getenv("STATUS_FLUSH_SIZE", "20"))
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "5"))
+
+# OpenAI Batch API mode ({"mode": "batch_submit"} / {"mode": "batch_poll"} events). Batched rows keep
+# their claim for BATCH_LEASE_SECONDS once the batch is created, so the synchronous path does not
+# pick them up meanwhile; until then they hold the normal LEASE_SECONDS claim.
+BATCH_CLAIM_SIZE = int(os.getenv("BATCH_CLAIM_SIZE", "500"))
+BATCH_LEASE_SECONDS = int(os.getenv("BATCH_LEASE_SECONDS", str(26 * 60 * 60)))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+
+# Client-side OpenAI rate limits (requests / tokens per minute). 0 means learn them from the
+# x-ratelimit-* response headers. OUTPUT_TOKEN_ESTIMATE is added to each request's prompt estimate.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "0"))
+OUTPUT_TOKEN_ESTIMATE = int(os.getenv("OUTPUT_TOKEN_ESTIMATE", "1000"))
+
+# Time budget: a PDF is only started while the invocation has more than the p95 per-PDF time
+# (over the last PDF_TIME_WINDOW pdf_metrics rows, DEFAULT_PDF_MS without history) plus
+# TIME_BUDGET_MARGIN_MS left, which covers LLM calls in flight and the final flush. Unstarted
+# claims are released; with SELF_REINVOKE the function invokes itself asynchronously to
+# continue, at most MAX_REINVOKE_DEPTH times in a row.
+TIME_BUDGET_MARGIN_MS = int(os.getenv("TIME_BUDGET_MARGIN_MS", "60000"))
+DEFAULT_PDF_MS = int(os.getenv("DEFAULT_PDF_MS", "120000"))
+PDF_TIME_WINDOW = int(os.getenv("PDF_TIME_WINDOW", "200"))
+SELF_REINVOKE = os.getenv("SELF_REINVOKE", "false").lower() == "true"
+MAX_REINVOKE_DEPTH = int(os.getenv("MAX_REINVOKE_DEPTH", "20"))
+
+# Completed chunk windows of long reports are checkpointed under this S3 prefix so a PDF that
+# runs out of time resumes from the windows it already has.
+CHECKPOINT_PREFIX = os.getenv("CHECKPOINT_PREFIX", "checkpoints")
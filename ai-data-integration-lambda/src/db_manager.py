@@ -1,6 +1,10 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import os
+import threading
+import time
+from config import STATUS_FLUSH_SIZE, STATUS_FLUSH_INTERVAL
 from enum import Enum
 
 class PDFStatus(Enum):
@@ -9,8 +13,58 @@ class PDFStatus(Enum):
     PROCESS_SUCCESS = "Process Successful"
     PROCESS_FAILED = "Process Failed"
 
+# Columns of the deficiencies table filled from a report; uploaded_at is copied from pdf_documents.
+DEFICIENCY_COLUMNS = ("position", "status", "severity", "description", "page_no", "title", "location", "contact", "inspector")
+
+
+def clean_field(value, max_length, title_case=False):
+    """Trimmed text for a deficiencies column; blanks and "null" become NULL."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or value.lower() == "null":
+        return None
+    return (value.title() if title_case else value)[:max_length]
+
+
+def deficiency_rows(report):
+    """Rows for the deficiencies table, one per deficiency_summary entry, in DEFICIENCY_COLUMNS order.
+
+    Severity and status are title-cased so filters match however the model
+    capitalised them. Must stay in step with utils/deficiencies.py in the API.
+    """
+    header = (
+        clean_field(report.get("title"), 500),
+        clean_field(report.get("location"), 255),
+        clean_field(report.get("contact"), 255),
+        clean_field(report.get("inspector"), 255),
+    )
+    return [
+        (
+            position,
+            clean_field(deficiency.get("status"), 100, title_case=True),
+            clean_field(deficiency.get("severity"), 100, title_case=True),
+            clean_field(deficiency.get("description"), None),
+            clean_field(deficiency.get("page_no"), 50),
+        ) + header
+        for position, deficiency in enumerate(report.get("deficiency_summary") or [])
+    ]
+
+
 class DBManager:
     def __init__(self):
+        # The cursor is shared by the worker threads of lambda_handler.
+        self.lock = threading.Lock()
+        # Buffered writes, see queue_deficiency_response / queue_metrics.
+        self.pending_responses = []
+        self.pending_metrics = []
+        self.pending_deficiencies = []
+        # PDFs whose last status update was skipped by the claim guard; their deficiencies are dropped.
+        self.unclaimed_ids = set()
+        self.last_flush = time.monotonic()
+        self.connect()
+
+    def connect(self):
         self.connection = psycopg2.connect(
             dbname=os.getenv('POSTGRES_DATABASE'),
             user=os.getenv('POSTGRES_USER'),
@@ -21,50 +75,376 @@ class DBManager:
         self.connection.autocommit = True
         self.cursor = self.connection.cursor()
 
-    def fetch_not_processed_pdfs(self):
+    def ensure_connection(self):
+        """Reconnect if the connection kept from a previous (warm) invocation has gone away."""
+        with self.lock:
+            try:
+                if not self.connection.closed:
+                    self.cursor.execute("SELECT 1")
+                    return
+            except psycopg2.Error as e:
+                print(f"Database connection lost, reconnecting: {e}")
+            try:
+                self.connection.close()
+            except psycopg2.Error:
+                pass
+            self.connect()
+
+    def claim_pdfs(self, worker_id, batch_size, lease_seconds):
+        """Atomically claim up to batch_size rows for worker_id.
+
+        Rows are either "Not Processed" or "Processing" with an expired lease
+        (left behind by a crashed or timed-out invocation). SKIP LOCKED lets
+        concurrent workers claim disjoint batches without waiting on each other.
+        """
         query = """
-        SELECT id, pdf_file AS url
-        FROM pdf_documents
-        WHERE status = %s
+        UPDATE pdf_documents
+        SET status = %s,
+            claimed_by = %s,
+            lease_expires_at = now() + make_interval(secs => %s)
+        WHERE id IN (
+            SELECT id
+            FROM pdf_documents
+            WHERE status = %s
+               OR (status = %s AND lease_expires_at < now())
+            ORDER BY uploaded_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, pdf_file AS url, claimed_by
         """
         try:
-            self.cursor.execute(query, (PDFStatus.NOT_PROCESSED.value,))
-            columns = [desc[0] for desc in self.cursor.description]
-            results = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+            with self.lock:
+                self.cursor.execute(query, (
+                    PDFStatus.PROCESSING.value,
+                    worker_id,
+                    lease_seconds,
+                    PDFStatus.NOT_PROCESSED.value,
+                    PDFStatus.PROCESSING.value,
+                    batch_size,
+                ))
+                columns = [desc[0] for desc in self.cursor.description]
+                results = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+            print(f"Worker {worker_id} claimed {len(results)} PDFs")
             return results
         except psycopg2.Error as e:
-            print(f"Error fetching data: {e}")
+            print(f"Error claiming PDFs: {e}")
+            raise
+
+    def claim_pdfs_by_id(self, worker_id, pdf_ids, lease_seconds):
+        """Claim the given rows, skipping any that are finished or already held by another worker."""
+        query = """
+        UPDATE pdf_documents
+        SET status = %s,
+            claimed_by = %s,
+            lease_expires_at = now() + make_interval(secs => %s)
+        WHERE id IN (
+            SELECT id
+            FROM pdf_documents
+            WHERE id = ANY(%s::uuid[])
+              AND (status = %s OR (status = %s AND lease_expires_at < now()))
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, pdf_file AS url, claimed_by
+        """
+        try:
+            with self.lock:
+                self.cursor.execute(query, (
+                    PDFStatus.PROCESSING.value,
+                    worker_id,
+                    lease_seconds,
+                    list(pdf_ids),
+                    PDFStatus.NOT_PROCESSED.value,
+                    PDFStatus.PROCESSING.value,
+                ))
+                columns = [desc[0] for desc in self.cursor.description]
+                results = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+            print(f"Worker {worker_id} claimed {len(results)} of {len(pdf_ids)} requested PDFs")
+            return results
+        except psycopg2.Error as e:
+            print(f"Error claiming PDFs: {e}")
+            raise
+
+    def fetch_report_by_hash(self, content_hash):
+        query = """
+        SELECT deficiency_report
+        FROM pdf_documents
+        WHERE content_hash = %s
+          AND status = %s
+          AND deficiency_report IS NOT NULL
+          AND deficiency_report <> ''
+        LIMIT 1
+        """
+        try:
+            with self.lock:
+                self.cursor.execute(query, (content_hash, PDFStatus.PROCESS_SUCCESS.value))
+                row = self.cursor.fetchone()
+            return row[0] if row else None
+        except psycopg2.Error as e:
+            print(f"Error looking up cached report: {e}")
+            raise
+
+    def clear_content_hash(self, content_hash=None):
+        query = "UPDATE pdf_documents SET content_hash = NULL WHERE content_hash IS NOT NULL"
+        params = ()
+        if content_hash:
+            query += " AND content_hash = %s"
+            params = (content_hash,)
+        try:
+            with self.lock:
+                self.cursor.execute(query, params)
+                print(f"Rows affected: {self.cursor.rowcount}")
+                return self.cursor.rowcount
+        except psycopg2.Error as e:
+            print(f"Error clearing report cache: {e}")
+            raise
+
+    def mark_batch_submitted(self, batch_id, pdfs, lease_seconds):
+        """Record the OpenAI batch id (and content hash) for each submitted (pdf_id, content_hash).
+
+        The lease is extended to lease_seconds so the rows stay claimed while
+        the batch runs.
+        """
+        try:
+            with self.lock:
+                execute_values(self.cursor, """
+                    UPDATE pdf_documents AS p
+                    SET batch_id = v.batch_id,
+                        content_hash = v.content_hash,
+                        lease_expires_at = now() + make_interval(secs => v.lease_seconds)
+                    FROM (VALUES %s) AS v (id, content_hash, batch_id, lease_seconds)
+                    WHERE p.id = v.id
+                    """, [(pdf_id, content_hash, batch_id, lease_seconds) for pdf_id, content_hash in pdfs],
+                    template="(%s::uuid, %s::varchar, %s::varchar, %s::integer)")
+        except psycopg2.Error as e:
+            print(f"Error recording batch {batch_id}: {e}")
+            raise
+
+    def fetch_pending_batches(self):
+        query = """
+        SELECT DISTINCT batch_id
+        FROM pdf_documents
+        WHERE status = %s AND batch_id IS NOT NULL
+        """
+        try:
+            with self.lock:
+                self.cursor.execute(query, (PDFStatus.PROCESSING.value,))
+                return [row[0] for row in self.cursor.fetchall()]
+        except psycopg2.Error as e:
+            print(f"Error fetching pending batches: {e}")
+            raise
+
+    def fetch_batch_pdfs(self, batch_id):
+        """{pdf_id: (content_hash, claimed_by)} for the PDFs of a batch that are still Processing."""
+        query = """
+        SELECT id, content_hash, claimed_by
+        FROM pdf_documents
+        WHERE batch_id = %s AND status = %s
+        """
+        try:
+            with self.lock:
+                self.cursor.execute(query, (batch_id, PDFStatus.PROCESSING.value))
+                return {str(row[0]): (row[1], row[2]) for row in self.cursor.fetchall()}
+        except psycopg2.Error as e:
+            print(f"Error fetching PDFs of batch {batch_id}: {e}")
             raise
 
-    def update_pdf_status(self, pdf_id, status: PDFStatus):
+    def release_batch(self, batch_id):
+        """Put the PDFs of a failed or expired batch back into the Not Processed queue."""
         query = """
         UPDATE pdf_documents
-        SET status = %s
-        WHERE id = %s
+        SET status = %s,
+            batch_id = NULL,
+            claimed_by = NULL,
+            lease_expires_at = NULL
+        WHERE batch_id = %s AND status = %s
         """
         try:
-            self.cursor.execute(query, (status.value, pdf_id))
-            print(f"Rows affected: {self.cursor.rowcount}")
+            with self.lock:
+                self.cursor.execute(query, (PDFStatus.NOT_PROCESSED.value, batch_id, PDFStatus.PROCESSING.value))
+                return self.cursor.rowcount
         except psycopg2.Error as e:
-            print(f"Error updating status: {e}")
-            self.connection.rollback()
+            print(f"Error releasing batch {batch_id}: {e}")
             raise
 
-    def update_deficiency_response(self, pdf_id, report_filename, status: PDFStatus):
+    def release_claims(self, worker_id, pdf_ids):
+        """Put PDFs claimed by worker_id but not started back into the Not Processed queue."""
         query = """
         UPDATE pdf_documents
         SET status = %s,
-            deficiency_report = %s
-        WHERE id = %s
+            claimed_by = NULL,
+            lease_expires_at = NULL
+        WHERE id = ANY(%s::uuid[]) AND claimed_by = %s AND status = %s
         """
         try:
-            self.cursor.execute(query, (status.value, report_filename, pdf_id))
-            print(f"Rows affected: {self.cursor.rowcount}")
+            with self.lock:
+                self.cursor.execute(query, (
+                    PDFStatus.NOT_PROCESSED.value, [str(pdf_id) for pdf_id in pdf_ids], worker_id,
+                    PDFStatus.PROCESSING.value,
+                ))
+                return self.cursor.rowcount
         except psycopg2.Error as e:
-            print(f"Error updating deficiency response: {e}")
-            self.connection.rollback()
+            print(f"Error releasing claims of {worker_id}: {e}")
             raise
 
+    def fetch_pdf_time_p95(self, window, source="lambda"):
+        """p95 of total_ms over the last `window` finished PDFs, or None without history."""
+        query = """
+        SELECT percentile_cont(0.95) WITHIN GROUP (ORDER BY total_ms)
+        FROM (
+            SELECT total_ms
+            FROM pdf_metrics
+            WHERE source = %s AND status IN (%s, %s) AND total_ms IS NOT NULL
+            ORDER BY created_at DESC
+            LIMIT %s
+        ) AS recent
+        """
+        try:
+            with self.lock:
+                self.cursor.execute(query, (
+                    source, PDFStatus.PROCESS_SUCCESS.value, PDFStatus.PROCESS_FAILED.value, window,
+                ))
+                row = self.cursor.fetchone()
+            return int(row[0]) if row and row[0] is not None else None
+        except psycopg2.Error as e:
+            print(f"Error reading per-PDF timings: {e}")
+            raise
+
+    def queue_deficiency_response(self, pdf_id, report_filename, status: PDFStatus, content_hash=None, claimed_by=None):
+        """Buffer a final status/report update; written by flush() together with others.
+
+        Until a row is flushed it stays "Processing" with its lease, so if the
+        invocation dies first the row is reclaimed and processed again rather
+        than lost. claimed_by is the worker the row was claimed for; the update
+        is only applied while that worker still holds the row.
+        """
+        with self.lock:
+            self.pending_responses.append((pdf_id, status.value, report_filename, content_hash, claimed_by))
+        self.flush_if_due()
+
+    def queue_deficiencies(self, pdf_id, report=None, content_hash=None):
+        """Buffer the deficiencies rows of a PDF, replacing any it already has.
+
+        With a report they are parsed from it; without one (a reused cached
+        report) they are copied from another PDF with the same content_hash.
+        """
+        rows = deficiency_rows(report) if report is not None else None
+        with self.lock:
+            self.pending_deficiencies.append((str(pdf_id), rows, content_hash))
+        self.flush_if_due()
+
+    def queue_metrics(self, metrics: dict, status: PDFStatus):
+        with self.lock:
+            self.pending_metrics.append(dict(metrics, status=status.value))
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        pending = len(self.pending_responses) + len(self.pending_metrics) + len(self.pending_deficiencies)
+        if pending and (pending >= STATUS_FLUSH_SIZE or time.monotonic() - self.last_flush >= STATUS_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except psycopg2.Error:
+                # The writes stay buffered and are retried by the next flush.
+                pass
+
+    def flush(self):
+        """Write all buffered status updates in one UPDATE ... FROM (VALUES ...) and metrics in one INSERT."""
+        with self.lock:
+            responses, self.pending_responses = self.pending_responses, []
+            metrics, self.pending_metrics = self.pending_metrics, []
+            deficiencies, self.pending_deficiencies = self.pending_deficiencies, []
+            self.last_flush = time.monotonic()
+            # One row per PDF; a later transition for the same id wins.
+            responses = list({response[0]: response for response in responses}.values())
+            try:
+                if responses:
+                    # Only rows this worker still holds: once a lease has expired and another
+                    # worker has reclaimed (or finished) the row, this update must not land.
+                    updated = execute_values(self.cursor, f"""
+                        UPDATE pdf_documents AS p
+                        SET status = v.status,
+                            deficiency_report = v.deficiency_report,
+                            content_hash = v.content_hash,
+                            lease_expires_at = NULL
+                        FROM (VALUES %s) AS v (id, status, deficiency_report, content_hash, claimed_by)
+                        WHERE p.id = v.id
+                          AND p.status = '{PDFStatus.PROCESSING.value}'
+                          AND p.claimed_by = v.claimed_by
+                        RETURNING p.id
+                        """, responses, template="(%s::uuid, %s::varchar, %s::varchar, %s::varchar, %s::varchar)", fetch=True)
+                    updated = {str(row[0]) for row in updated}
+                    skipped = {str(response[0]) for response in responses} - updated
+                    self.unclaimed_ids = (self.unclaimed_ids - updated) | skipped
+                    print(f"Flushed {len(updated)} of {len(responses)} status updates")
+                    if skipped:
+                        print(f"Skipped {len(skipped)} status updates for PDFs no longer claimed by this worker")
+                    responses = []
+                # Deficiencies follow their status update: another worker owns the rows that were skipped.
+                deficiencies = [entry for entry in deficiencies if entry[0] not in self.unclaimed_ids]
+                if deficiencies:
+                    self.write_deficiencies(deficiencies)
+                    deficiencies = []
+                if metrics:
+                    columns = list(metrics[0])
+                    query = sql.SQL("INSERT INTO pdf_metrics ({}, created_at) VALUES %s").format(
+                        sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+                    ).as_string(self.cursor)
+                    execute_values(
+                        self.cursor, query, [[row[column] for column in columns] for row in metrics],
+                        template="(" + ", ".join(["%s"] * len(columns)) + ", now())",
+                    )
+            except psycopg2.Error as e:
+                # Keep the writes that did not go through so the next flush retries them.
+                self.pending_responses = responses + self.pending_responses
+                self.pending_metrics = metrics + self.pending_metrics
+                self.pending_deficiencies = deficiencies + self.pending_deficiencies
+                print(f"Error flushing buffered writes: {e}")
+                raise
+
+    def write_deficiencies(self, deficiencies):
+        """Replace the deficiencies rows of the given PDFs in one transaction. Caller holds self.lock."""
+        # A later entry for the same PDF wins.
+        deficiencies = list({entry[0]: entry for entry in deficiencies}.values())
+        parsed = [(pdf_id,) + row for pdf_id, rows, _ in deficiencies if rows for row in rows]
+        copied = [(pdf_id, content_hash) for pdf_id, rows, content_hash in deficiencies if rows is None and content_hash]
+        columns = ", ".join(DEFICIENCY_COLUMNS)
+        selected = ", ".join(f"v.{column}" for column in DEFICIENCY_COLUMNS)
+        self.connection.autocommit = False
+        try:
+            # Committed together, rolled back together.
+            with self.connection:
+                self.cursor.execute(
+                    "DELETE FROM deficiencies WHERE pdf_id = ANY(%s::uuid[])", ([entry[0] for entry in deficiencies],)
+                )
+                if parsed:
+                    execute_values(self.cursor, f"""
+                        INSERT INTO deficiencies (pdf_id, {columns}, uploaded_at, created_at)
+                        SELECT v.pdf_id, {selected}, p.uploaded_at, now()
+                        FROM (VALUES %s) AS v (pdf_id, {columns})
+                        JOIN pdf_documents p ON p.id = v.pdf_id
+                        """, parsed, page_size=1000,
+                        template="(%s::uuid, %s::integer" + ", %s::varchar" * (len(DEFICIENCY_COLUMNS) - 1) + ")")
+                if copied:
+                    execute_values(self.cursor, f"""
+                        INSERT INTO deficiencies (pdf_id, {columns}, uploaded_at, created_at)
+                        SELECT v.pdf_id, {", ".join(f"d.{column}" for column in DEFICIENCY_COLUMNS)}, p.uploaded_at, now()
+                        FROM (VALUES %s) AS v (pdf_id, content_hash)
+                        JOIN pdf_documents p ON p.id = v.pdf_id
+                        JOIN LATERAL (
+                            SELECT s.id
+                            FROM pdf_documents s
+                            WHERE s.content_hash = v.content_hash
+                              AND s.id <> v.pdf_id
+                              AND EXISTS (SELECT 1 FROM deficiencies x WHERE x.pdf_id = s.id)
+                            LIMIT 1
+                        ) AS source ON true
+                        JOIN deficiencies d ON d.pdf_id = source.id
+                        """, copied, template="(%s::uuid, %s::varchar)")
+        finally:
+            self.connection.autocommit = True
+        print(f"Flushed deficiencies of {len(deficiencies)} PDFs ({len(parsed)} parsed rows, {len(copied)} copied reports)")
+
     def close_connection(self):
+        self.flush()
         self.cursor.close()
         self.connection.close()
@@ -1,11 +1,21 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY, MODEL, PROMPT
+from openai import OpenAI, DefaultHttpxClient
+from config import (OPENAI_API_KEY, MODEL, PROMPT, EXTRACT_PROCESSES, EXTRACT_PARALLEL_MIN_PAGES,
+                    CHUNK_TOKEN_BUDGET, CHUNK_OVERLAP_PAGES, CHUNK_CONCURRENCY,
+                    PREFILTER_ENABLED, PREFILTER_MIN_SCORE, OUTPUT_TOKEN_ESTIMATE)
+from page_filter import select_pages
+from rate_limiter import openai_limiter
+from time_budget import OutOfTime
 from typing import List, Optional
 from pydantic import BaseModel, Field
 import instructor
 import fitz
+import multiprocessing
 import re
-import json
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 class DeficiencySummary(BaseModel):
     status: Optional[str] = Field(default=None, description="Status of the deficiency.")
@@ -20,39 +30,272 @@ class InspectionReport(BaseModel):
     deficiency_summary: List[DeficiencySummary] = Field(..., description="List of deficiencies extracted from the report.")
 
 
+PAGE_MARKER = "--- Page {} ---"
+WHITESPACE = re.compile(r'\s+')
+# Rough tokens-per-character ratio for English text; good enough for budgeting windows.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def open_pdf(pdf_source):
+    # In-memory downloads are opened as a stream; spilled downloads by path.
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf_source, filetype="pdf")
+    return fitz.open(pdf_source)
+
+
+def extract_page_range(pdf_source, start: int, stop: int) -> List[str]:
+    """Return the whitespace-normalised text of pages [start, stop)."""
+    with open_pdf(pdf_source) as doc:
+        return [WHITESPACE.sub(' ', doc[i].get_text()).strip() for i in range(start, stop)]
+
+
+# One pool per container, shared by every worker thread. Spawned rather than forked:
+# extract_pages runs in worker threads, and forking a process with threads running can
+# leave the child holding locks that no thread will release.
+_extract_executor = None
+_extract_executor_lock = threading.Lock()
+
+
+def get_extract_executor():
+    """The page extraction pool, created on first use; None where processes can't be started."""
+    global _extract_executor
+    with _extract_executor_lock:
+        if _extract_executor is None:
+            try:
+                _extract_executor = ProcessPoolExecutor(
+                    max_workers=EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+                )
+            except OSError as e:
+                # Lambda has no /dev/shm for the pool's semaphores; remember that and stay in-process.
+                print(f"Process pool unavailable ({e}), extracting pages in-process")
+                _extract_executor = False
+        return _extract_executor or None
+
+
+def reset_extract_executor(executor):
+    """Drop a broken pool so the next get_extract_executor() starts a new one."""
+    global _extract_executor
+    with _extract_executor_lock:
+        if _extract_executor is executor:
+            _extract_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() > deadline:
+        raise OutOfTime("not enough time left to start another LLM call")
+
+
 class DeficiencyReportGenerator:
     def __init__(self):
-        self.client = instructor.from_openai(OpenAI(api_key=OPENAI_API_KEY))
-        
+        # Every response feeds its x-ratelimit-* headers and 429s back into the shared limiter.
+        self.openai_client = OpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=DefaultHttpxClient(event_hooks={"response": [openai_limiter.on_response]}),
+        )
+        self.client = instructor.from_openai(self.openai_client)
+        # instructor hooks run in the calling thread, so retries are counted per thread.
+        self.local = threading.local()
+        self.client.on("parse:error", self.count_retry)
+
+    def count_retry(self, *args, **kwargs):
+        self.local.retries = getattr(self.local, "retries", 0) + 1
 
     def clean_text(self, text: str) -> str:
         cleaned_text = re.sub(r'\s+', ' ', text).strip()
         
         return cleaned_text
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        all_text = ""
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text = page.get_text()
-                all_text += text
-        return self.clean_text(all_text)
+    def open_pdf(self, pdf_source):
+        return open_pdf(pdf_source)
+
+    def extract_pages(self, pdf_source) -> List[str]:
+        """Extract the text of every page, one cleaned string per page.
+
+        Large documents are split into contiguous page ranges that are extracted
+        in the shared process pool. Lambda has no /dev/shm, so if the pool can't
+        be created the ranges are extracted in-process instead.
+        """
+        with self.open_pdf(pdf_source) as doc:
+            page_count = doc.page_count
+            if EXTRACT_PROCESSES <= 1 or page_count < EXTRACT_PARALLEL_MIN_PAGES:
+                return [WHITESPACE.sub(' ', page.get_text()).strip() for page in doc]
+
+        if isinstance(pdf_source, memoryview):
+            pdf_source = pdf_source.tobytes()
+        step = -(-page_count // EXTRACT_PROCESSES)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        executor = get_extract_executor()
+        if executor is None:
+            parts = [extract_page_range(pdf_source, start, stop) for start, stop in ranges]
+        else:
+            try:
+                futures = [executor.submit(extract_page_range, pdf_source, start, stop) for start, stop in ranges]
+                parts = [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory); start a fresh pool next time.
+                print(f"Extraction pool broke ({e}), extracting {page_count} pages in-process")
+                reset_extract_executor(executor)
+                parts = [extract_page_range(pdf_source, start, stop) for start, stop in ranges]
+        return [text for part in parts for text in part]
+
+    def join_pages(self, pages: List[str], page_numbers: Optional[List[int]] = None) -> str:
+        # One join instead of repeated concatenation; markers carry the real page numbers.
+        page_numbers = page_numbers or range(1, len(pages) + 1)
+        return "\n".join(f"{PAGE_MARKER.format(number)}\n{text}" for number, text in zip(page_numbers, pages))
+
+    def extract_text_from_pdf(self, pdf_source) -> str:
+        return self.join_pages(self.extract_pages(pdf_source))
     
-    def generate_report(self, pdf_path,pdf_id):
-        try:
-            text = self.extract_text_from_pdf(pdf_path)
-       
-            messages = [
-                {"role": "system", "content": PROMPT},
-                {"role": "user", "content": text},
-            ]
-            response = self.client.chat.completions.create(
-                model=MODEL,
-                messages=messages,
-                response_model=InspectionReport,
-                temperature=0,
+    def build_windows(self, pages: List[str]) -> List[List[int]]:
+        """Group page indexes into windows of at most CHUNK_TOKEN_BUDGET tokens.
+
+        Consecutive windows share CHUNK_OVERLAP_PAGES pages so a deficiency that
+        spans a window boundary is seen whole by at least one window.
+        """
+        windows, current, used = [], [], 0
+        for index, text in enumerate(pages):
+            cost = estimate_tokens(text)
+            if current and used + cost > CHUNK_TOKEN_BUDGET:
+                windows.append(current)
+                current = current[-CHUNK_OVERLAP_PAGES:] if CHUNK_OVERLAP_PAGES > 0 else []
+                used = sum(estimate_tokens(pages[i]) for i in current)
+                if used + cost > CHUNK_TOKEN_BUDGET:
+                    # Overlap alone would overflow the window; start clean.
+                    current, used = [], 0
+            current.append(index)
+            used += cost
+        if current:
+            windows.append(current)
+        return windows
+
+    def build_messages(self, text: str):
+        return [
+            {"role": "system", "content": PROMPT},
+            {"role": "user", "content": text},
+        ]
+
+    def extract_report(self, text: str, metrics=None) -> InspectionReport:
+        messages = self.build_messages(text)
+        openai_limiter.acquire(estimate_tokens(PROMPT) + estimate_tokens(text) + OUTPUT_TOKEN_ESTIMATE)
+        self.local.retries = 0
+        response, completion = self.client.chat.completions.create_with_completion(
+            model=MODEL,
+            messages=messages,
+            response_model=InspectionReport,
+            temperature=0,
+        )
+        if metrics is not None:
+            # instructor sums usage over its retries into the final completion.
+            usage = getattr(completion, "usage", None)
+            metrics.add_usage(
+                getattr(usage, "prompt_tokens", 0),
+                getattr(usage, "completion_tokens", 0),
+                self.local.retries,
+            )
+        return response
+
+    def merge_reports(self, reports: List[InspectionReport]) -> InspectionReport:
+        """Combine window reports: header fields from the first window, deficiencies deduplicated."""
+        merged, seen = [], {}
+        for report in reports:
+            for deficiency in report.deficiency_summary:
+                key = (
+                    WHITESPACE.sub(' ', deficiency.description or '').strip().lower(),
+                    (deficiency.severity or '').strip().lower(),
+                )
+                if key in seen:
+                    # Same deficiency from an overlapping window; keep the first, fill its gaps.
+                    existing = seen[key]
+                    existing.status = existing.status or deficiency.status
+                    existing.page_no = existing.page_no or deficiency.page_no
+                    continue
+                seen[key] = deficiency
+                merged.append(deficiency)
+        header = reports[0]
+        return InspectionReport(
+            title=header.title,
+            location=header.location,
+            contact=header.contact,
+            inspector=header.inspector,
+            deficiency_summary=merged,
+        )
+
+    def prepare_texts(self, pdf_source, pdf_id, metrics=None) -> List[str]:
+        """Extract, prefilter and window a PDF into the user messages to send.
+
+        Returns one text for documents within CHUNK_TOKEN_BUDGET, otherwise one
+        text per window; the window reports are combined with merge_reports.
+        """
+        with metrics.stage("extract") if metrics else nullcontext():
+            pages = self.extract_pages(pdf_source)
+        if metrics:
+            metrics.page_count = len(pages)
+        page_numbers = list(range(1, len(pages) + 1))
+
+        if PREFILTER_ENABLED:
+            full_tokens = estimate_tokens(self.join_pages(pages))
+            kept = select_pages(pages, min_score=PREFILTER_MIN_SCORE)
+            total_pages = len(pages)
+            pages = [pages[i] for i in kept]
+            page_numbers = [page_numbers[i] for i in kept]
+            kept_tokens = estimate_tokens(self.join_pages(pages, page_numbers))
+            print(
+                f"PDF {pdf_id}: prefilter kept {len(kept)}/{total_pages} pages, "
+                f"~{full_tokens} -> ~{kept_tokens} tokens ({100 - 100 * kept_tokens // max(full_tokens, 1)}% saved)"
             )
-            report = response.dict()
+
+        text = self.join_pages(pages, page_numbers)
+        if CHUNK_TOKEN_BUDGET <= 0 or estimate_tokens(text) <= CHUNK_TOKEN_BUDGET:
+            return [text]
+
+        windows = self.build_windows(pages)
+        print(f"PDF {pdf_id}: {len(pages)} pages split into {len(windows)} windows")
+        return [
+            self.join_pages([pages[i] for i in window], [page_numbers[i] for i in window])
+            for window in windows
+        ]
+
+    def generate_report(self, pdf_source,pdf_id, metrics=None, checkpoint=None, deadline=None):
+        """Build the report dict for one PDF.
+
+        checkpoint (a ChunkCheckpoint) saves each finished window of a chunked
+        document and skips the windows saved by an earlier run. deadline is a
+        time.monotonic() value after which no new LLM call is started; windows
+        not started by then raise OutOfTime, keeping the ones already saved.
+        """
+        try:
+            texts = self.prepare_texts(pdf_source, pdf_id, metrics)
+
+            with metrics.stage("llm") if metrics else nullcontext():
+                if len(texts) == 1:
+                    check_deadline(deadline)
+                    response = self.extract_report(texts[0], metrics)
+                else:
+                    saved = checkpoint.load() if checkpoint else {}
+                    if saved:
+                        print(f"PDF {pdf_id}: resuming with {len(saved)} checkpointed windows")
+
+                    def extract_window(text):
+                        key = checkpoint.key(text) if checkpoint else None
+                        if key in saved:
+                            return InspectionReport(**saved[key])
+                        check_deadline(deadline)
+                        window_report = self.extract_report(text, metrics)
+                        if checkpoint:
+                            checkpoint.save(key, window_report.model_dump())
+                        return window_report
+
+                    # Map: every window is extracted concurrently, so latency follows the
+                    # slowest window instead of the document length. Reduce: merge_reports.
+                    with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_CONCURRENCY, len(texts)))) as executor:
+                        responses = list(executor.map(extract_window, texts))
+                    response = self.merge_reports(responses)
+            report = response.model_dump()
             return report
         except FileNotFoundError as e:
             raise Exception(f"An unexpected error occurred while generating the report for PDF {pdf_id}: {e}")
\ No newline at end of file
@@ -1,51 +1,118 @@
 import json
-from config import AWS_STORAGE_BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,AWS_S3_REGION_NAME
+from urllib.parse import unquote_plus
+from config import (AWS_STORAGE_BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,AWS_S3_REGION_NAME, MAX_WORKERS, CLAIM_BATCH_SIZE, LEASE_SECONDS,
+                    DD_BATCH_SIZE, DD_BUFFER_SIZE, DD_FLUSH_INTERVAL, DD_FLUSH_TIMEOUT, DD_INTAKE_URL, BATCH_CLAIM_SIZE,
+                    PDF_TIME_WINDOW, SELF_REINVOKE, MAX_REINVOKE_DEPTH, SQS_MAX_RECEIVE_COUNT)
 from db_manager import DBManager, PDFStatus
-from s3_manager import S3Manager
-from deficiency_report import DeficiencyReportGenerator
+from report_cache import ReportCache
+from metrics import PipelineMetrics
+from rate_limiter import openai_limiter
+from checkpoint import ChunkCheckpoint
+from time_budget import TimeBudget, OutOfTime
 from botocore.exceptions import ClientError
-from datadog_api_client.v2 import ApiClient, ApiException, Configuration
-from datadog_api_client.v2.api import logs_api
-from datadog_api_client.v2.models import HTTPLog, HTTPLogItem
 import os
 import logging
 import sys
+import uuid
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-class DDHandler(logging.StreamHandler):
-    def __init__(self, configuration, service_name, ddsource):
+class DDHandler(logging.Handler):
+    """Ships log records to Datadog in batches from a background thread.
+
+    emit() only formats the record and puts it on a bounded queue, so logging
+    never waits on the network. The worker sends one HTTPLog payload per batch,
+    when DD_BATCH_SIZE records are queued or DD_FLUSH_INTERVAL seconds have
+    passed. When the queue is full new records are dropped and counted; flush()
+    reports how many were dropped since the previous flush.
+    """
+
+    def __init__(self, service_name, ddsource, intake_url=DD_INTAKE_URL):
         super().__init__()
-        self.configuration = configuration
         self.service_name = service_name
         self.ddsource = ddsource
+        self.intake_url = intake_url
+        self.ddtags = f"env:{os.getenv('ENV', 'DEV')}"
+        self.queue = queue.Queue(maxsize=DD_BUFFER_SIZE)
+        self.dropped = 0
+        self.worker = threading.Thread(target=self.run, name="datadog-log-shipper", daemon=True)
+        self.worker.start()
 
     def emit(self, record):
-        msg = self.format(record)
-        with ApiClient(self.configuration) as api_client:
+        try:
+            self.queue.put_nowait(self.format(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self, timeout=DD_FLUSH_TIMEOUT):
+        """Block until everything queued so far has been sent, for at most timeout seconds in all."""
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+            done.wait(max(0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            print(f"Dropped {dropped} log records bound for Datadog")
+
+    def run(self):
+        # datadog_api_client is slow to import. The worker starts with the module, so the import
+        # still happens during the cold start, but in this thread rather than blocking the handler.
+        from datadog_api_client.v2 import ApiClient, Configuration
+        from datadog_api_client.v2.api import logs_api
+
+        with ApiClient(Configuration(host=self.intake_url)) as api_client:
             api_instance = logs_api.LogsApi(api_client)
-            body = HTTPLog([
-                HTTPLogItem(
-                    ddsource=self.ddsource,
-                    ddtags=f"env:{os.getenv('ENV', 'DEV')}",
-                    message=msg,
-                    service=self.service_name,
-                )
-            ])
-            try:
-                api_instance.submit_log(body)
-            except ApiException as e:
-                # Print the error so that it also appears in CloudWatch.
-                print(f"Error sending log to Datadog: {e}")
+            batch = []
+            deadline = time.monotonic() + DD_FLUSH_INTERVAL
+            while True:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if isinstance(item, threading.Event):
+                    self.send(api_instance, batch)
+                    batch = []
+                    item.set()
+                elif item is not None:
+                    batch.append(item)
+
+                if len(batch) >= DD_BATCH_SIZE or time.monotonic() >= deadline:
+                    self.send(api_instance, batch)
+                    batch = []
+                    deadline = time.monotonic() + DD_FLUSH_INTERVAL
+
+    def send(self, api_instance, batch):
+        if not batch:
+            return
+        from datadog_api_client.v2.models import HTTPLog, HTTPLogItem
+
+        body = HTTPLog([
+            HTTPLogItem(ddsource=self.ddsource, ddtags=self.ddtags, message=message, service=self.service_name)
+            for message in batch
+        ])
+        try:
+            api_instance.submit_log(body)
+        except Exception as e:
+            # Print the error so that it also appears in CloudWatch.
+            print(f"Error sending {len(batch)} logs to Datadog: {e}")
 
 
 class Logger:
     def __init__(self, service_name, ddsource):
         # Configure the logger to send logs both to Datadog and CloudWatch.
-        self.configuration = Configuration()
         self.logger = logging.getLogger("datadog_logger")
         self.logger.setLevel(logging.INFO)
 
         # Datadog Handler
-        dd_handler = DDHandler(self.configuration, service_name, ddsource)
+        dd_handler = DDHandler(service_name, ddsource)
         dd_handler.setFormatter(logging.Formatter("%(message)s"))
         self.logger.addHandler(dd_handler)
 
@@ -60,6 +127,10 @@ class Logger:
         else:
             self.logger.info(message)
 
+    def flush(self):
+        for handler in self.logger.handlers:
+            handler.flush()
+
 
 # Set DataDog related environment variables.
 os.environ["DD_API_KEY"] = os.environ.get("DATADOG_API_KEY")
@@ -68,62 +139,355 @@ os.environ["ENV"] = "DEV"  # This can be overridden if needed.
 
 logger = Logger(service_name="INSPECTPOINT-AI", ddsource="python")
 logger.log("Logger initialized.")
-def lambda_handler(event, context):
+
+
+def process_pdf(pdf, db_manager, s3_manager, report_generator, report_cache, budget=None):
+    pdf_id, pdf_url = str(pdf["id"]), str(pdf["url"])
+    claimed_by = pdf.get("claimed_by")
+    # A failure that will be retried (an SQS message with deliveries left) puts the row back
+    # to Not Processed so the redelivery can claim it; otherwise it is final.
+    failed_status = PDFStatus.PROCESS_FAILED if pdf.get("final_attempt", True) else PDFStatus.NOT_PROCESSED
+    pdf_source = None
+    metrics = PipelineMetrics(pdf_id)
+    status = PDFStatus.PROCESS_FAILED
+
+    try:
+        try:
+            with metrics.stage("download"):
+                pdf_source = s3_manager.download_to_memory(pdf_url)
+        except ClientError as e:
+            print(f"Error downloading file {pdf_url} from S3: {e}")
+            logger.log(f"Error downloading file {pdf_url} from S3: {e}")
+            db_manager.queue_deficiency_response(pdf_id, None, failed_status, claimed_by=claimed_by)
+            return {"id": pdf_id, "status": "Failed", "error": str(e)}
+
+        content_hash = report_cache.compute_key(pdf_source)
+        cached_report = report_cache.lookup(content_hash)
+        if cached_report:
+            logger.log(f"Reusing cached report {cached_report} for PDF {pdf_id}")
+            db_manager.queue_deficiency_response(pdf_id, cached_report, PDFStatus.PROCESS_SUCCESS, content_hash, claimed_by)
+            db_manager.queue_deficiencies(pdf_id, content_hash=content_hash)
+            status = PDFStatus.PROCESS_SUCCESS
+            return {"id": pdf_id, "status": "Success", "report_s3_path": cached_report, "cached": True}
+
+        report_filename = f"{pdf_id}/{pdf_id}_report.json"
+        if (s3_manager.read_metadata(report_filename) or {}).get("content-hash") == content_hash:
+            # An earlier attempt uploaded this report but died before its status update was
+            # flushed, so the row was reclaimed; reuse the report instead of calling the model again.
+            logger.log(f"Reusing report {report_filename} already uploaded for PDF {pdf_id}")
+            report = json.loads(s3_manager.read_object(report_filename))
+            db_manager.queue_deficiency_response(pdf_id, report_filename, PDFStatus.PROCESS_SUCCESS, content_hash, claimed_by)
+            db_manager.queue_deficiencies(pdf_id, report)
+            status = PDFStatus.PROCESS_SUCCESS
+            return {"id": pdf_id, "status": "Success", "report_s3_path": report_filename, "cached": True}
+
+        checkpoint = ChunkCheckpoint(s3_manager, content_hash)
+        try:
+            report = report_generator.generate_report(
+                pdf_source, pdf_id, metrics, checkpoint=checkpoint, deadline=budget.deadline() if budget else None
+            )
+            report_json = json.dumps(report, indent=4)
+        except OutOfTime as e:
+            # The finished windows are checkpointed; the caller releases the claim so
+            # the next invocation picks the PDF up again and only runs what is missing.
+            logger.log(f"Deferring PDF {pdf_id}: {e}")
+            status = None
+            return {"id": pdf_id, "status": "Deferred"}
+        except Exception as e:
+            print(f"Error generating report for PDF {pdf_id}: {e}")
+            logger.log(f"Error generating report for PDF {pdf_id}: {e}")
+            db_manager.queue_deficiency_response(pdf_id, None, failed_status, claimed_by=claimed_by)
+            return {"id": pdf_id, "status": "Failed", "error": str(e)}
+        try:
+            with metrics.stage("upload"):
+                s3_manager.upload_file(report_json, report_filename, {"content-hash": content_hash})
+        except ClientError as e:
+            print(f"Error uploading report to S3: {e}")
+            logger.log(f"Error uploading report to S3: {e}")
+            db_manager.queue_deficiency_response(pdf_id, None, failed_status, claimed_by=claimed_by)
+            return {"id": pdf_id, "status": "Failed", "error": str(e)}
         
-    db_manager = DBManager()
-    s3_manager = S3Manager(AWS_STORAGE_BUCKET_NAME,AWS_SECRET_ACCESS_KEY,AWS_ACCESS_KEY_ID,AWS_S3_REGION_NAME)
-    report_generator = DeficiencyReportGenerator()
+        db_manager.queue_deficiency_response(pdf_id, report_filename, PDFStatus.PROCESS_SUCCESS, content_hash, claimed_by)
+        db_manager.queue_deficiencies(pdf_id, report)
+        status = PDFStatus.PROCESS_SUCCESS
+        try:
+            checkpoint.clear()
+        except ClientError as e:
+            logger.log(f"Error clearing checkpoints of PDF {pdf_id}: {e}", "error")
 
-    pdfs_to_process = db_manager.fetch_not_processed_pdfs()
+        return {"id": pdf_id, "status": "Success", "report_s3_path": report_filename}
+        
+    except Exception as e:
+        logger.log(f"Error processing PDF {pdf_id}: {e}", "error")
+        
+        db_manager.queue_deficiency_response(pdf_id, None, failed_status, claimed_by=claimed_by)
 
-    if not pdfs_to_process:
-        logger.info("No PDFs to process.")
-        return {"statusCode": 200, "body": json.dumps({"message": "No PDFs to process."})}
+        return {"id": pdf_id, "status": "Failed", "error": str(e)}
+
+    finally:
+        # Only large PDFs are spilled to /tmp; remove them so warm containers don't fill the disk.
+        s3_manager.release(pdf_source)
+        try:
+            # Deferred PDFs (status None) have no final timing to record.
+            if status is not None:
+                db_manager.queue_metrics(metrics.as_dict(), status)
+        except Exception as e:
+            # Metrics are best effort and must never fail the PDF itself.
+            logger.log(f"Error recording metrics for PDF {pdf_id}: {e}", "error")
+
+
+# Clients are created on first use and kept for the life of the container, so
+# warm invocations skip the DB connect, boto3 client and OpenAI client setup.
+clients = {}
+
+
+def get_db_manager():
+    if "db" not in clients:
+        clients["db"] = DBManager()
+    else:
+        clients["db"].ensure_connection()
+    return clients["db"]
+
+
+def get_s3_manager():
+    if "s3" not in clients:
+        from s3_manager import S3Manager
+
+        clients["s3"] = S3Manager(AWS_STORAGE_BUCKET_NAME,AWS_SECRET_ACCESS_KEY,AWS_ACCESS_KEY_ID,AWS_S3_REGION_NAME)
+    return clients["s3"]
 
+
+def get_report_generator():
+    if "report_generator" not in clients:
+        # openai, instructor and fitz are only imported once there is work to do.
+        from deficiency_report import DeficiencyReportGenerator
+
+        clients["report_generator"] = DeficiencyReportGenerator()
+    return clients["report_generator"]
+
+
+def get_time_budget(context, db_manager):
+    try:
+        history_p95_ms = db_manager.fetch_pdf_time_p95(PDF_TIME_WINDOW)
+    except Exception as e:
+        logger.log(f"Error reading per-PDF timings, using the default estimate: {e}", "error")
+        history_p95_ms = None
+    return TimeBudget(context, history_p95_ms)
+
+
+def process_within_budget(pdfs, worker_id, db_manager, report_cache, budget):
+    """Process claimed PDFs concurrently, starting each one only while budget allows.
+
+    PDFs are handed to the pool one at a time as workers free up, so the check
+    is made against the time actually left. Claims that were never started and
+    PDFs deferred mid-way (OutOfTime) are released back to Not Processed.
+    Returns (results, released_ids).
+    """
+    s3_manager = get_s3_manager()
+    report_generator = get_report_generator()
+
+    def timed_process_pdf(pdf):
+        started = time.monotonic()
+        result = process_pdf(pdf, db_manager, s3_manager, report_generator, report_cache, budget)
+        if result["status"] != "Deferred":
+            budget.observe(int((time.monotonic() - started) * 1000))
+        return result
+
+    # Each PDF spends most of its time waiting on S3 and OpenAI, so a thread pool
+    # lets the LLM call of one PDF overlap with the downloads/uploads of others.
+    max_workers = max(1, min(MAX_WORKERS, len(pdfs)))
+    pending = list(pdfs)
     results = []
-    for pdf in pdfs_to_process:
-        pdf_id, pdf_url = str(pdf["id"]), str(pdf["url"])
-        db_manager.update_pdf_status(pdf_id,PDFStatus.PROCESSING)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = set()
+        while pending or running:
+            while pending and len(running) < max_workers and budget.can_start():
+                running.add(executor.submit(timed_process_pdf, pending.pop(0)))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+
+    released = [str(pdf["id"]) for pdf in pending] + [r["id"] for r in results if r["status"] == "Deferred"]
+    if released:
+        count = db_manager.release_claims(worker_id, released)
+        logger.log(f"Time budget reached, released {count} claimed PDFs (p95 per PDF {budget.p95_ms()} ms).")
+    return results, released
+
+
+def reinvoke(event, context):
+    """Invoke this function again asynchronously to continue draining the backlog."""
+    depth = (event or {}).get("continuation_depth", 0) + 1
+    if depth > MAX_REINVOKE_DEPTH:
+        logger.log(f"Not re-invoking: {MAX_REINVOKE_DEPTH} continuations in a row.", "error")
+        return False
+    if "lambda" not in clients:
+        import boto3
+
+        clients["lambda"] = boto3.client("lambda")
+    try:
+        clients["lambda"].invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps({"continuation_depth": depth}),
+        )
+    except ClientError as e:
+        logger.log(f"Error re-invoking {context.invoked_function_arn}: {e}", "error")
+        return False
+    logger.log(f"Re-invoked to continue the backlog (continuation {depth}).")
+    return True
+
+
+def lambda_handler(event, context):
+    try:
+        return handle_event(event, context)
+    finally:
+        # Logs are shipped asynchronously; make sure nothing is left queued when
+        # the container is frozen after this invocation returns.
+        logger.flush()
+
+
+def handle_event(event, context):
+    db_manager = get_db_manager()
+    report_cache = ReportCache(db_manager)
+
+    if event and event.get("invalidate_report_cache"):
+        cleared = report_cache.invalidate(event.get("content_hash"))
+        logger.log(f"Report cache invalidated, {cleared} entries cleared.")
 
+    # Rows are claimed (status Processing + lease) atomically, so concurrent
+    # invocations never pick up the same PDF twice.
+    worker_id = getattr(context, "aws_request_id", None) or str(uuid.uuid4())
+    mode = event.get("mode") if event else None
+    if mode in ("batch_submit", "batch_poll"):
+        return handle_batch_event(mode, worker_id, db_manager, report_cache)
+    if event and event.get("Records"):
+        return handle_records(event["Records"], worker_id, db_manager, report_cache, context)
+
+    # Batches are claimed only as large as the remaining time allows, and claiming
+    # continues until the backlog is empty or the time budget runs out. Without a
+    # Lambda context the budget is unlimited and a single batch is processed.
+    budget = get_time_budget(context, db_manager)
+    results, released = [], []
+    try:
+        while True:
+            claim_size = budget.capacity(MAX_WORKERS, CLAIM_BATCH_SIZE)
+            if claim_size <= 0:
+                budget.exhausted = True
+                break
+            pdfs_to_process = db_manager.claim_pdfs(worker_id, claim_size, LEASE_SECONDS)
+            if not pdfs_to_process:
+                break
+            logger.log(f"Processing {len(pdfs_to_process)} PDFs with {max(1, min(MAX_WORKERS, len(pdfs_to_process)))} workers.")
+            batch_results, batch_released = process_within_budget(pdfs_to_process, worker_id, db_manager, report_cache, budget)
+            results.extend(batch_results)
+            released.extend(batch_released)
+            if budget.exhausted or len(pdfs_to_process) < claim_size or budget.remaining_ms() is None:
+                break
+    finally:
+        db_manager.flush()
+
+    if not results and not released and not budget.exhausted:
+        logger.log("No PDFs to process.")
+        return {"statusCode": 200, "body": json.dumps({"message": "No PDFs to process."})}
+
+    reinvoked = bool(budget.exhausted and SELF_REINVOKE and context is not None and reinvoke(event, context))
+
+    logger.log(f"Report cache stats: {report_cache.stats()}")
+    logger.log(f"OpenAI rate limiter stats: {openai_limiter.stats()}")
+    return {"statusCode": 200, "body": json.dumps({
+        "processed": results,
+        "released": released,
+        "reinvoked": reinvoked,
+        "report_cache": report_cache.stats(),
+    })}
+
+
+def pdf_ids_from_record(record):
+    """PDF ids referenced by an SQS message or S3 notification record.
+
+    SQS bodies are either {"pdf_id": ...} as published by the upload API or an
+    S3 notification forwarded to the queue. S3 keys are "<pdf id>/<filename>";
+    report JSON files written under the same prefix are ignored.
+    """
+    if record.get("eventSource") == "aws:sqs":
+        body = json.loads(record.get("body") or "{}")
+        if "Records" in body:
+            return [pdf_id for inner in body["Records"] for pdf_id in pdf_ids_from_record(inner)]
+        candidates = [body.get("pdf_id")]
+    elif record.get("eventSource") == "aws:s3":
+        key = unquote_plus(record["s3"]["object"]["key"])
+        candidates = [key.split("/", 1)[0]] if key.lower().endswith(".pdf") else []
+    else:
+        candidates = []
+
+    pdf_ids = []
+    for candidate in candidates:
         try:
-            
-            try:
-                local_pdf_path = s3_manager.download_file(pdf_url)
-            except ClientError as e:
-                print(f"Error downloading file {pdf_url} from S3: {e}")
-                logger.log(f"Error downloading file {pdf_url} from S3: {e}")
-                db_manager.update_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED)
-                results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
-                continue
-            try:
-                report = report_generator.generate_report(local_pdf_path, pdf_id)
-                report_json = json.dumps(report, indent=4)
-                report_filename = f"{pdf_id}/{pdf_id}_report.json"
-            except Exception as e:
-                print(f"Error generating report for PDF {pdf_id}: {e}")
-                logger.log(f"Error generating report for PDF {pdf_id}: {e}")
-                db_manager.update_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED)
-                results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
-                continue
-            try:
-                s3_manager.upload_file(report_json, report_filename)
-            except ClientError as e:
-                print(f"Error uploading report to S3: {e}")
-                logger.log(f"Error uploading report to S3: {e}")
-                db_manager.update_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED)
-                results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
-                continue
-            
-            db_manager.update_deficiency_response(pdf_id, report_filename, PDFStatus.PROCESS_SUCCESS)
-            
-            results.append({"id": pdf_id, "status": "Success", "report_s3_path": report_filename})
-            
-        except Exception as e:
-            logger.log(f"Error processing PDF {pdf_id}: {e}", "error")
-            
-            db_manager.update_deficiency_response(pdf_id, None, PDFStatus.PROCESS_FAILED)
+            pdf_ids.append(str(uuid.UUID(str(candidate))))
+        except ValueError:
+            logger.log(f"Ignoring record without a valid PDF id: {candidate}", "error")
+    return pdf_ids
 
-            results.append({"id": pdf_id, "status": "Failed", "error": str(e)})
 
-    return {"statusCode": 200, "body": json.dumps({"processed": results})}
+def handle_records(records, worker_id, db_manager, report_cache, context=None):
+    """Process the PDFs named in an SQS batch or S3 event concurrently.
 
+    Returns batchItemFailures listing only the SQS messages whose PDF failed or
+    was released for lack of time, so SQS retries just those. PDFs that are
+    already processed or claimed by another worker count as handled.
+
+    A failed PDF goes back to Not Processed while one of its messages still has
+    deliveries left (ApproximateReceiveCount below SQS_MAX_RECEIVE_COUNT), so
+    the redelivery can claim it again. It is marked Process Failed on the last
+    delivery, or straight away for S3 events, which are not retried.
+    """
+    message_ids = {}
+    retryable = set()
+    for record in records:
+        receive_count = int((record.get("attributes") or {}).get("ApproximateReceiveCount", SQS_MAX_RECEIVE_COUNT))
+        for pdf_id in pdf_ids_from_record(record):
+            message_ids.setdefault(pdf_id, []).append(record.get("messageId"))
+            if record.get("eventSource") == "aws:sqs" and receive_count < SQS_MAX_RECEIVE_COUNT:
+                retryable.add(pdf_id)
+
+    results, released = [], []
+    pdfs_to_process = db_manager.claim_pdfs_by_id(worker_id, list(message_ids), LEASE_SECONDS) if message_ids else []
+    for pdf in pdfs_to_process:
+        pdf["final_attempt"] = str(pdf["id"]) not in retryable
+    if pdfs_to_process:
+        max_workers = max(1, min(MAX_WORKERS, len(pdfs_to_process)))
+        logger.log(f"Processing {len(pdfs_to_process)} PDFs from {len(records)} event records with {max_workers} workers.")
+        try:
+            budget = get_time_budget(context, db_manager)
+            results, released = process_within_budget(pdfs_to_process, worker_id, db_manager, report_cache, budget)
+        finally:
+            db_manager.flush()
+
+    retry_ids = {str(result["id"]) for result in results if result["status"] == "Failed"} | set(released)
+    failures = [
+        {"itemIdentifier": message_id}
+        for pdf_id in retry_ids
+        for message_id in message_ids.get(pdf_id, []) if message_id
+    ]
+    return {"batchItemFailures": failures, "processed": results, "released": released}
+
+
+def handle_batch_event(mode, worker_id, db_manager, report_cache):
+    """Submit claimed PDFs to the OpenAI Batch API, or collect the results of finished batches."""
+    from batch_processor import BatchProcessor
+
+    processor = BatchProcessor(db_manager, get_s3_manager(), get_report_generator(), report_cache, logger)
+    try:
+        if mode == "batch_submit":
+            # The lease is stretched to BATCH_LEASE_SECONDS once the batch has been created.
+            pdfs = db_manager.claim_pdfs(worker_id, BATCH_CLAIM_SIZE, LEASE_SECONDS)
+            if not pdfs:
+                logger.log("No PDFs to process.")
+                return {"statusCode": 200, "body": json.dumps({"message": "No PDFs to process."})}
+            body = processor.submit(pdfs, worker_id)
+        else:
+            body = {"processed": processor.poll()}
+    finally:
+        db_manager.flush()
+    return {"statusCode": 200, "body": json.dumps(body)}
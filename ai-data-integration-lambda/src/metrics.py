@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+from config import MODEL, INPUT_TOKEN_PRICE, OUTPUT_TOKEN_PRICE
+
+
+class PipelineMetrics:
+    """Stage timings, token usage and retries for one PDF, stored in pdf_metrics."""
+
+    STAGES = ("download", "extract", "llm", "upload")
+
+    def __init__(self, pdf_id, source="lambda"):
+        self.pdf_id = pdf_id
+        self.source = source
+        self.timings = {}
+        self.page_count = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = int((time.perf_counter() - start) * 1000)
+            with self.lock:
+                self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def add_usage(self, prompt_tokens, completion_tokens, retries=0):
+        # Called from the chunk threads of a single PDF, hence the lock.
+        with self.lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.retries += retries
+
+    @property
+    def cost_usd(self):
+        return (self.prompt_tokens * INPUT_TOKEN_PRICE + self.completion_tokens * OUTPUT_TOKEN_PRICE) / 1_000_000
+
+    def as_dict(self):
+        row = {f"{stage}_ms": self.timings.get(stage) for stage in self.STAGES}
+        row.update({
+            "pdf_id": self.pdf_id,
+            "source": self.source,
+            "model": MODEL,
+            "page_count": self.page_count,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "retries": self.retries,
+            "cost_usd": round(self.cost_usd, 6),
+            "total_ms": int((time.perf_counter() - self.started) * 1000),
+        })
+        return row
@@ -0,0 +1,37 @@
+import re
+from typing import List
+
+# Vocabulary and answer patterns taken from the inspection forms the PROMPT examples come from.
+SEVERITY_TERMS = re.compile(r'\b(impairment|critical|non-critical|deficien(?:t|cy|cies))\b', re.IGNORECASE)
+FAILURE_TERMS = re.compile(
+    r'\b(fail(?:ed|s|ure)?|not (?:in )?(?:proper|working|functional|operational|accessible)|'
+    r'needs? (?:repair|replacement|service)|damaged|corroded|leak(?:ing|s)?|obstructed|missing|'
+    r'out of service|recommend(?:ed|ation)?)\b',
+    re.IGNORECASE,
+)
+# "7. Waterflow test valves in closed position? Waterflow test valves are not in closed position"
+NEGATIVE_ANSWER = re.compile(r'\?\s*(?:no\b|fail\b|[^?.]{0,200}?\b(?:is|are|was|were|did|does|do|has|have) not\b)', re.IGNORECASE)
+
+
+def score_page(text: str) -> int:
+    """Cheap local score of how likely a page is to contain a deficiency."""
+    return (
+        3 * len(SEVERITY_TERMS.findall(text))
+        + 2 * len(NEGATIVE_ANSWER.findall(text))
+        + len(FAILURE_TERMS.findall(text))
+    )
+
+
+def select_pages(pages: List[str], min_score: int = 2, header_pages: int = 1, context_pages: int = 1) -> List[int]:
+    """Return the indexes of the pages worth sending to the model.
+
+    The first header_pages pages are always kept for title, location and
+    inspector. Each candidate page also keeps the next context_pages pages,
+    because a deficiency often concludes (and takes its page number) on the
+    following page.
+    """
+    keep = set(range(min(header_pages, len(pages))))
+    for index, text in enumerate(pages):
+        if score_page(text) >= min_score:
+            keep.update(range(index, min(index + context_pages + 1, len(pages))))
+    return sorted(keep)
@@ -0,0 +1,47 @@
+import hashlib
+import threading
+from config import MODEL, PROMPT_VERSION
+
+
+class ReportCache:
+    """Content-addressed cache of generated reports.
+
+    The key is a hash of the PDF bytes, the model and the prompt version, and is
+    stored in pdf_documents.content_hash next to the report it produced. A PDF
+    whose key matches a successfully processed row reuses that row's report in S3
+    instead of paying for another extraction and LLM call.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def compute_key(self, pdf_source) -> str:
+        digest = hashlib.sha256()
+        if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+            digest.update(pdf_source)
+        else:
+            with open(pdf_source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        digest.update(f"|{MODEL}|{PROMPT_VERSION}".encode())
+        return digest.hexdigest()
+
+    def lookup(self, content_hash: str):
+        report_key = self.db_manager.fetch_report_by_hash(content_hash)
+        with self.lock:
+            if report_key:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return report_key
+
+    def invalidate(self, content_hash=None):
+        """Drop one cache entry, or every entry when content_hash is None."""
+        return self.db_manager.clear_content_hash(content_hash)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
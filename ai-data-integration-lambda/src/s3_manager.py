@@ -1,9 +1,10 @@
 import boto3
 import os
-import logging
 from botocore.exceptions import ClientError
 import time
 import botocore
+from concurrent.futures import ThreadPoolExecutor
+from config import S3_RANGE_PART_SIZE, S3_DOWNLOAD_CONCURRENCY, S3_SPILL_THRESHOLD
 
 
 class S3Manager:
@@ -17,7 +18,8 @@ class S3Manager:
         self.bucket_name = bucket_name
     
     def download_file(self, key: str) -> str:
-        local_path = f"/tmp/{os.path.basename(key)}"
+        # Keys are "<pdf id>/<filename>", so flattening keeps concurrent downloads apart.
+        local_path = f"/tmp/{key.replace('/', '_')}"
         max_retries = 3
         delay = 2  # seconds
 
@@ -46,13 +48,87 @@ class S3Manager:
                 else:
                     raise  # Exhausted retries, re-raise the exception
 
-    def upload_file(self, file_content: str, s3_key: str) -> str:
+    def download_to_memory(self, key: str):
+        """Download an object without touching /tmp.
+
+        Returns the object bytes, ready for fitz.open(stream=...). Large objects
+        are fetched with parallel ranged GETs straight into one preallocated
+        buffer. Objects above S3_SPILL_THRESHOLD fall back to download_file and
+        the local path is returned instead.
+        """
         max_retries = 3
         delay = 2  # seconds
 
         for attempt in range(1, max_retries + 1):
             try:
-                self.s3_client.put_object(Body=file_content, Bucket=self.bucket_name, Key=s3_key)
+                size = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)["ContentLength"]
+                if size > S3_SPILL_THRESHOLD:
+                    print(f"File {key} is {size} bytes, spilling to disk")
+                    return self.download_file(key)
+                if size <= S3_RANGE_PART_SIZE:
+                    return self.s3_client.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+                return self._download_ranges(key, size)
+
+            except ClientError as e:
+                error_code = e.response["Error"].get("Code", "")
+                if error_code == "403":
+                    print(f"Permission error (403) downloading file {key} from S3: {e}")
+                    raise  # No retry for permission errors
+
+                print(f"Attempt {attempt}: Error downloading file {key} from S3: {e}")
+                if attempt < max_retries:
+                    time.sleep(delay)
+                else:
+                    raise  # Exhausted retries, re-raise the exception
+
+            except botocore.exceptions.BotoCoreError as e:
+                print(f"Attempt {attempt}: Network error or unknown error: {e}")
+                if attempt < max_retries:
+                    time.sleep(delay)
+                else:
+                    raise  # Exhausted retries, re-raise the exception
+
+    def read_object(self, key: str) -> bytes:
+        """Download an object and return its bytes, whether or not download_to_memory spilled it to /tmp."""
+        source = self.download_to_memory(key)
+        if isinstance(source, str):
+            try:
+                with open(source, "rb") as f:
+                    return f.read()
+            finally:
+                self.release(source)
+        return bytes(source)
+
+    def release(self, pdf_source):
+        """Remove a download that was spilled to /tmp; in-memory downloads need no cleanup."""
+        if isinstance(pdf_source, str) and os.path.exists(pdf_source):
+            os.remove(pdf_source)
+
+    def _download_ranges(self, key: str, size: int) -> bytearray:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+
+        def fetch(start):
+            end = min(start + S3_RANGE_PART_SIZE, size) - 1
+            body = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=key, Range=f"bytes={start}-{end}"
+            )["Body"]
+            chunk = body.read()
+            if len(chunk) != end + 1 - start:
+                raise botocore.exceptions.IncompleteReadError(actual_bytes=len(chunk), expected_bytes=end + 1 - start)
+            view[start:end + 1] = chunk
+
+        with ThreadPoolExecutor(max_workers=S3_DOWNLOAD_CONCURRENCY) as executor:
+            list(executor.map(fetch, range(0, size, S3_RANGE_PART_SIZE)))
+        return buffer
+
+    def upload_file(self, file_content: str, s3_key: str, metadata=None) -> str:
+        max_retries = 3
+        delay = 2  # seconds
+
+        for attempt in range(1, max_retries + 1):
+            try:
+                self.s3_client.put_object(Body=file_content, Bucket=self.bucket_name, Key=s3_key, Metadata=metadata or {})
                 return f"s3://{self.bucket_name}/{s3_key}"  # Success
 
             except ClientError as e:
@@ -73,3 +149,32 @@ class S3Manager:
                     time.sleep(delay)
                 else:
                     raise  # Exhausted retries, re-raise the exception
+
+    def read_metadata(self, key: str):
+        """User metadata of an object, or None when it does not exist."""
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=key)["Metadata"]
+        except ClientError as e:
+            if e.response["Error"].get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def read_prefix(self, prefix: str) -> dict:
+        """Return {key: body bytes} for every object under prefix."""
+        objects = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for item in page.get("Contents", []):
+                objects[item["Key"]] = self.s3_client.get_object(Bucket=self.bucket_name, Key=item["Key"])["Body"].read()
+        return objects
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every object under prefix; returns how many were deleted."""
+        deleted = 0
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if keys:
+                self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={"Objects": keys, "Quiet": True})
+                deleted += len(keys)
+        return deleted
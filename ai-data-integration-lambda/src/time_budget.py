@@ -0,0 +1,67 @@
+import math
+import threading
+import time
+from config import TIME_BUDGET_MARGIN_MS, DEFAULT_PDF_MS
+
+
+class OutOfTime(Exception):
+    """Raised when a PDF cannot finish before the invocation's time budget runs out."""
+
+
+class TimeBudget:
+    """Tracks how much of the Lambda timeout is left and whether another PDF fits in it.
+
+    A PDF is only started while the remaining time exceeds the p95 per-PDF time
+    plus TIME_BUDGET_MARGIN_MS (kept back for LLM calls already in flight and
+    for flushing writes and logs). The p95 starts from the recent pdf_metrics
+    history and is replaced by the timings observed in this invocation once
+    there are enough of them. Without a Lambda context (local runs) the budget
+    is unlimited.
+    """
+
+    MIN_OBSERVED = 5
+
+    def __init__(self, context, history_p95_ms=None, margin_ms=TIME_BUDGET_MARGIN_MS):
+        self.get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        self.history_p95_ms = history_p95_ms or DEFAULT_PDF_MS
+        self.margin_ms = margin_ms
+        self.lock = threading.Lock()
+        self.observed = []
+        self.exhausted = False
+
+    def remaining_ms(self):
+        return self.get_remaining() if self.get_remaining else None
+
+    def observe(self, elapsed_ms):
+        with self.lock:
+            self.observed.append(elapsed_ms)
+
+    def p95_ms(self):
+        with self.lock:
+            observed = sorted(self.observed)
+        if len(observed) < self.MIN_OBSERVED:
+            return self.history_p95_ms
+        return observed[min(len(observed) - 1, math.ceil(0.95 * len(observed)) - 1)]
+
+    def can_start(self):
+        """True while another PDF is expected to finish before the margin is reached."""
+        remaining = self.remaining_ms()
+        if remaining is None or remaining >= self.p95_ms() + self.margin_ms:
+            return True
+        self.exhausted = True
+        return False
+
+    def capacity(self, workers, limit):
+        """How many PDFs (at most limit) workers can be expected to finish in the remaining time."""
+        remaining = self.remaining_ms()
+        if remaining is None:
+            return limit
+        rounds = max(0, remaining - self.margin_ms) // max(self.p95_ms(), 1)
+        return int(min(limit, workers * rounds))
+
+    def deadline(self):
+        """time.monotonic() value after which no new LLM call should be started, or None."""
+        remaining = self.remaining_ms()
+        if remaining is None:
+            return None
+        return time.monotonic() + (remaining - self.margin_ms) / 1000
@@ -0,0 +1,55 @@
+"""Shared setup for the Lambda tests.
+
+The modules in src/ import each other flat, as they do inside the Lambda, so
+src/ (and benchmarks/, for the local OpenAI and PDF stand-ins) go on
+sys.path. config.py reads the environment at import time, so the variables
+the modules need are set here first.
+
+    pip install -r benchmarks/requirements.txt pytest
+    python -m pytest tests
+"""
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+for name, value in {
+    "OPENAI_API_KEY": "test-key",
+    "DATADOG_API_KEY": "test-key",
+    "DD_SITE": "datadoghq.com",
+    # Nothing listens here; tests that check log shipping start their own intake.
+    "DD_INTAKE_URL": "http://127.0.0.1:9",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_S3_REGION_NAME": "us-east-1",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """The local OpenAI stand-in, with OPENAI_BASE_URL pointing at it."""
+    from fake_openai import FakeOpenAIServer
+
+    server = FakeOpenAIServer(latency=0).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def s3_manager():
+    """An S3Manager on an empty moto bucket."""
+    from s3_manager import S3Manager
+
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+        yield S3Manager("test-bucket", "testing", "testing", "us-east-1")
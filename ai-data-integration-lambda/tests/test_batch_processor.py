@@ -0,0 +1,128 @@
+"""BatchProcessor against the local fake OpenAI Batch API and a moto S3 bucket."""
+import json
+import uuid
+
+from config import BATCH_LEASE_SECONDS
+from fake_openai import FakeOpenAIServer
+from synthetic_pdfs import make_pdf
+
+
+class RecordingDB:
+    """The DBManager calls BatchProcessor makes, kept in memory."""
+
+    def __init__(self, pdf_ids):
+        self.rows = {
+            pdf_id: {"status": "Processing", "batch_id": None, "content_hash": None, "claimed_by": "worker-1"}
+            for pdf_id in pdf_ids
+        }
+        self.released = []
+        self.leases = {}
+        self.deficiencies = {}
+
+    def fetch_report_by_hash(self, content_hash):
+        return None
+
+    def release_claims(self, worker_id, pdf_ids):
+        self.released.extend(pdf_ids)
+        for pdf_id in pdf_ids:
+            self.rows[pdf_id]["status"] = "Not Processed"
+        return len(pdf_ids)
+
+    def mark_batch_submitted(self, batch_id, pdfs, lease_seconds):
+        for pdf_id, content_hash in pdfs:
+            self.rows[pdf_id].update(batch_id=batch_id, content_hash=content_hash)
+            self.leases[pdf_id] = lease_seconds
+
+    def fetch_pending_batches(self):
+        return sorted({row["batch_id"] for row in self.rows.values() if row["status"] == "Processing" and row["batch_id"]})
+
+    def fetch_batch_pdfs(self, batch_id):
+        return {
+            pdf_id: (row["content_hash"], row["claimed_by"])
+            for pdf_id, row in self.rows.items() if row["batch_id"] == batch_id
+        }
+
+    def release_batch(self, batch_id):
+        raise AssertionError(f"batch {batch_id} should not be released")
+
+    def queue_deficiency_response(self, pdf_id, report_filename, status, content_hash=None, claimed_by=None):
+        assert claimed_by == self.rows[pdf_id]["claimed_by"]
+        self.rows[pdf_id].update(status=status.value, report=report_filename)
+
+    def queue_deficiencies(self, pdf_id, report=None, content_hash=None):
+        self.deficiencies[pdf_id] = report
+
+
+class ListLogger:
+    def __init__(self):
+        self.messages = []
+
+    def log(self, message, level="info"):
+        self.messages.append((level, message))
+
+
+
+def make_processor(s3_manager, pdfs):
+    # Imported here so the OpenAI client is built after OPENAI_BASE_URL points at the fake.
+    from batch_processor import BatchProcessor
+    from deficiency_report import DeficiencyReportGenerator
+    from report_cache import ReportCache
+
+    db = RecordingDB([pdf["id"] for pdf in pdfs])
+    processor = BatchProcessor(db, s3_manager, DeficiencyReportGenerator(), ReportCache(db), ListLogger())
+    return processor, db
+
+
+def claimed_pdfs(s3_manager, count):
+    pdfs, expected = [], {}
+    for number in range(1, count + 1):
+        data, deficiencies = make_pdf(number, pages=2, density=0.5)
+        pdf_id = str(uuid.uuid4())
+        key = f"{pdf_id}/inspection-{number}.pdf"
+        s3_manager.s3_client.put_object(Bucket=s3_manager.bucket_name, Key=key, Body=data)
+        pdfs.append({"id": pdf_id, "url": key})
+        expected[pdf_id] = deficiencies
+    return pdfs, expected
+
+
+def test_submit_poll_ingest(fake_openai, s3_manager):
+    pdfs, expected = claimed_pdfs(s3_manager, 3)
+    processor, db = make_processor(s3_manager, pdfs)
+
+    submitted = processor.submit(pdfs, "worker-1")
+    assert submitted["batch_id"] in fake_openai.batches
+    assert {row["batch_id"] for row in db.rows.values()} == {submitted["batch_id"]}
+    assert set(db.leases.values()) == {BATCH_LEASE_SECONDS}
+
+    results = processor.poll()
+
+    assert sorted(result["id"] for result in results) == sorted(expected)
+    assert all(result["status"] == "Success" for result in results)
+    for pdf_id, deficiencies in expected.items():
+        assert db.rows[pdf_id]["status"] == "Process Successful"
+        key = db.rows[pdf_id]["report"]
+        stored = s3_manager.s3_client.get_object(Bucket=s3_manager.bucket_name, Key=key)
+        assert stored["Metadata"] == {"content-hash": db.rows[pdf_id]["content_hash"]}
+        report = json.loads(stored["Body"].read())
+        assert len(report["deficiency_summary"]) == deficiencies
+        assert len(db.deficiencies[pdf_id]["deficiency_summary"]) == deficiencies
+    assert db.released == []
+
+
+def test_failed_submission_releases_claims(s3_manager, monkeypatch):
+    server = FakeOpenAIServer(latency=0, fail_batches=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    try:
+        pdfs, expected = claimed_pdfs(s3_manager, 2)
+        processor, db = make_processor(s3_manager, pdfs)
+
+        submitted = processor.submit(pdfs, "worker-1")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert submitted["batch_id"] is None
+    assert sorted(db.released) == sorted(expected)
+    assert all(row["status"] == "Not Processed" and row["batch_id"] is None for row in db.rows.values())
+    assert db.leases == {}
+
@@ -0,0 +1,152 @@
+"""DBManager's SQL against a real Postgres.
+
+The claim queries (FOR UPDATE SKIP LOCKED), the claim-guarded
+UPDATE ... FROM (VALUES ...) of flush() and write_deficiencies only mean
+something to Postgres, so these tests need one. They run when
+TEST_POSTGRES_DATABASE names a database they may create a scratch schema in,
+reached with the usual POSTGRES_USER / POSTGRES_PASSWORD / POSTGRES_HOST /
+POSTGRES_PORT, and are skipped otherwise:
+
+    TEST_POSTGRES_DATABASE=postgres POSTGRES_HOST=localhost POSTGRES_USER=postgres \
+        POSTGRES_PASSWORD=... python -m pytest tests/test_db_manager.py
+"""
+import os
+import uuid
+
+import pytest
+
+from db_manager import DBManager, PDFStatus
+
+DATABASE = os.getenv("TEST_POSTGRES_DATABASE")
+SCHEMA = "test_db_manager"
+
+pytestmark = pytest.mark.skipif(not DATABASE, reason="TEST_POSTGRES_DATABASE is not set")
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    from pipeline import SCHEMA_TEMPLATE
+
+    monkeypatch.setenv("POSTGRES_DATABASE", DATABASE or "")
+    monkeypatch.setenv("PGOPTIONS", f"-c search_path={SCHEMA}")
+    managers = []
+
+    def connect():
+        managers.append(DBManager())
+        return managers[-1]
+
+    connect().cursor.execute(SCHEMA_TEMPLATE.format(schema=SCHEMA))
+    yield connect
+    managers[0].cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    for manager in managers:
+        manager.connection.close()
+
+
+@pytest.fixture
+def db(connect):
+    return connect()
+
+
+def insert(db, status=PDFStatus.NOT_PROCESSED, claimed_by=None, lease_seconds=None, content_hash=None):
+    pdf_id = str(uuid.uuid4())
+    db.cursor.execute(
+        """
+        INSERT INTO pdf_documents (id, pdf_file, status, claimed_by, lease_expires_at, content_hash)
+        VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s), %s)
+        """,
+        (pdf_id, f"{pdf_id}/inspection.pdf", status.value, claimed_by, lease_seconds, content_hash),
+    )
+    return pdf_id
+
+
+def row(db, pdf_id):
+    db.cursor.execute("SELECT status, claimed_by, deficiency_report FROM pdf_documents WHERE id = %s", (pdf_id,))
+    return db.cursor.fetchone()
+
+
+def deficiency_descriptions(db, pdf_id):
+    db.cursor.execute("SELECT description FROM deficiencies WHERE pdf_id = %s ORDER BY position", (pdf_id,))
+    return [description for description, in db.cursor.fetchall()]
+
+
+def report(*descriptions):
+    return {"title": "Form", "deficiency_summary": [{"description": description} for description in descriptions]}
+
+
+def test_claim_skips_locked_and_leased_rows(connect):
+    db, other = connect(), connect()
+    locked = insert(db)
+    free = insert(db)
+    expired = insert(db, PDFStatus.PROCESSING, "crashed-worker", lease_seconds=-60)
+    insert(db, PDFStatus.PROCESSING, "live-worker", lease_seconds=600)
+    insert(db, PDFStatus.PROCESS_SUCCESS)
+
+    # Another worker is in the middle of claiming `locked`; SKIP LOCKED passes over it instead of waiting.
+    other.connection.autocommit = False
+    other.cursor.execute("SELECT id FROM pdf_documents WHERE id = %s FOR UPDATE", (locked,))
+    try:
+        claimed = db.claim_pdfs("worker-1", 10, 60)
+    finally:
+        other.connection.rollback()
+
+    assert sorted(str(pdf["id"]) for pdf in claimed) == sorted([free, expired])
+    assert {pdf["claimed_by"] for pdf in claimed} == {"worker-1"}
+    assert row(db, expired)[:2] == (PDFStatus.PROCESSING.value, "worker-1")
+    assert [str(pdf["id"]) for pdf in db.claim_pdfs("worker-2", 10, 60)] == [locked]
+
+
+def test_claim_by_id_skips_finished_and_held_rows(db):
+    free = insert(db)
+    held = insert(db, PDFStatus.PROCESSING, "worker-2", lease_seconds=600)
+    done = insert(db, PDFStatus.PROCESS_SUCCESS)
+
+    claimed = db.claim_pdfs_by_id("worker-1", [free, held, done], 60)
+
+    assert [str(pdf["id"]) for pdf in claimed] == [free]
+
+
+def test_flush_only_updates_rows_still_claimed(db):
+    mine = insert(db, PDFStatus.PROCESSING, "worker-1", lease_seconds=600)
+    taken_over = insert(db, PDFStatus.PROCESSING, "worker-2", lease_seconds=600)
+
+    for pdf_id in (mine, taken_over):
+        db.queue_deficiency_response(pdf_id, f"{pdf_id}/report.json", PDFStatus.PROCESS_SUCCESS, "hash", "worker-1")
+        db.queue_deficiencies(pdf_id, report("from worker-1"))
+    db.flush()
+
+    assert row(db, mine) == (PDFStatus.PROCESS_SUCCESS.value, "worker-1", f"{mine}/report.json")
+    assert row(db, taken_over) == (PDFStatus.PROCESSING.value, "worker-2", None)
+    assert deficiency_descriptions(db, mine) == ["from worker-1"]
+    assert deficiency_descriptions(db, taken_over) == []
+
+
+def test_deficiencies_queued_after_a_skipped_update_are_dropped(db):
+    taken_over = insert(db, PDFStatus.PROCESSING, "worker-2", lease_seconds=600)
+
+    db.queue_deficiency_response(taken_over, "report.json", PDFStatus.PROCESS_SUCCESS, "hash", "worker-1")
+    db.flush()
+    db.queue_deficiencies(taken_over, report("from worker-1"))
+    db.flush()
+    assert deficiency_descriptions(db, taken_over) == []
+
+    # Once this worker holds the row again, its deficiencies are written as usual.
+    db.cursor.execute("UPDATE pdf_documents SET claimed_by = 'worker-1' WHERE id = %s", (taken_over,))
+    db.queue_deficiency_response(taken_over, "report.json", PDFStatus.PROCESS_SUCCESS, "hash", "worker-1")
+    db.queue_deficiencies(taken_over, report("from worker-1"))
+    db.flush()
+    assert deficiency_descriptions(db, taken_over) == ["from worker-1"]
+
+
+def test_write_deficiencies_replaces_and_copies_rows(db):
+    original = insert(db, PDFStatus.PROCESS_SUCCESS, content_hash="same-pdf")
+    duplicate = insert(db, PDFStatus.PROCESS_SUCCESS, content_hash="same-pdf")
+
+    db.queue_deficiencies(original, report("stale"))
+    db.flush()
+    db.queue_deficiencies(original, report("first", "second"))
+    db.flush()
+    db.queue_deficiencies(duplicate, content_hash="same-pdf")
+    db.flush()
+
+    assert deficiency_descriptions(db, original) == ["first", "second"]
+    assert deficiency_descriptions(db, duplicate) == ["first", "second"]
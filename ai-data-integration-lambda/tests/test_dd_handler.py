@@ -0,0 +1,151 @@
+"""DDHandler against a local stand-in for the Datadog log intake."""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import lambda_function
+from lambda_function import DDHandler
+
+
+class FakeIntakeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/api/v2/logs":
+            self.server.received(json.loads(data))
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+
+class FakeIntake(ThreadingHTTPServer):
+    """Records the body of every POST /api/v2/logs."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeIntakeHandler)
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def received(self, batch):
+        with self.lock:
+            self.batches.append(batch)
+
+    @property
+    def messages(self):
+        return [item["message"] for batch in self.batches for item in batch]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StoppedHandler(DDHandler):
+    """A DDHandler whose sender thread has died."""
+
+    def run(self):
+        pass
+
+
+class StalledHandler(DDHandler):
+    """A DDHandler whose sender takes one record after a pause and then hangs."""
+
+    def run(self):
+        time.sleep(0.4)
+        self.queue.get()
+
+
+@pytest.fixture
+def intake():
+    server = FakeIntake()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_logger(handler):
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger(f"dd-test-{id(handler)}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def test_records_are_batched(intake, monkeypatch):
+    monkeypatch.setattr(lambda_function, "DD_BATCH_SIZE", 10)
+    monkeypatch.setattr(lambda_function, "DD_FLUSH_INTERVAL", 60)
+    handler = DDHandler("test-service", "python", intake.url)
+    logger = make_logger(handler)
+
+    for number in range(25):
+        logger.info(f"record {number}")
+    handler.flush()
+
+    assert [len(batch) for batch in intake.batches] == [10, 10, 5]
+    assert intake.messages == [f"record {number}" for number in range(25)]
+    assert {item["service"] for batch in intake.batches for item in batch} == {"test-service"}
+
+
+def test_flush_sends_a_partial_batch(intake, monkeypatch):
+    monkeypatch.setattr(lambda_function, "DD_FLUSH_INTERVAL", 60)
+    handler = DDHandler("test-service", "python", intake.url)
+    logger = make_logger(handler)
+
+    logger.info("last words")
+    time.sleep(0.2)
+    assert intake.batches == []
+
+    handler.flush()
+    assert intake.messages == ["last words"]
+
+
+def test_overflow_is_counted_and_reset(capsys, monkeypatch):
+    monkeypatch.setattr(lambda_function, "DD_BUFFER_SIZE", 5)
+    handler = StoppedHandler("test-service", "python")
+    logger = make_logger(handler)
+
+    for number in range(8):
+        logger.info(f"record {number}")
+    assert handler.dropped == 3
+
+    handler.flush(timeout=0.1)
+    assert "Dropped 3 log records" in capsys.readouterr().out
+    assert handler.dropped == 0
+
+    handler.flush(timeout=0.1)
+    assert "Dropped" not in capsys.readouterr().out
+
+
+def test_flush_gives_up_when_the_sender_is_down():
+    handler = StoppedHandler("test-service", "python")
+    make_logger(handler).info("never sent")
+
+    started = time.monotonic()
+    handler.flush(timeout=0.3)
+    elapsed = time.monotonic() - started
+
+    assert 0.3 <= elapsed < 2
+    assert lambda_function.DDHandler.flush.__defaults__ == (lambda_function.DD_FLUSH_TIMEOUT,)
+
+
+def test_flush_timeout_covers_queueing_and_waiting(monkeypatch):
+    monkeypatch.setattr(lambda_function, "DD_BUFFER_SIZE", 1)
+    handler = StalledHandler("test-service", "python")
+    make_logger(handler).info("fills the queue")
+
+    # The marker only gets a slot after 0.4 s; the wait for it to be sent gets what is left.
+    started = time.monotonic()
+    handler.flush(timeout=0.6)
+    elapsed = time.monotonic() - started
+
+    assert 0.6 <= elapsed < 0.9
@@ -0,0 +1,115 @@
+"""handle_records through a failed SQS delivery and its redelivery."""
+import json
+import uuid
+
+import pytest
+
+import lambda_function
+from config import SQS_MAX_RECEIVE_COUNT
+from db_manager import PDFStatus
+
+
+class TableDB:
+    """pdf_documents rows in memory, with the claim and claim-guarded flush of DBManager."""
+
+    def __init__(self, rows):
+        self.rows = {pdf_id: {"url": url, "status": PDFStatus.NOT_PROCESSED.value, "claimed_by": None} for pdf_id, url in rows.items()}
+        self.pending = []
+
+    def claim_pdfs_by_id(self, worker_id, pdf_ids, lease_seconds):
+        claimed = []
+        for pdf_id in pdf_ids:
+            row = self.rows[pdf_id]
+            if row["status"] == PDFStatus.NOT_PROCESSED.value:
+                row.update(status=PDFStatus.PROCESSING.value, claimed_by=worker_id)
+                claimed.append({"id": pdf_id, "url": row["url"], "claimed_by": worker_id})
+        return claimed
+
+    def release_claims(self, worker_id, pdf_ids):
+        raise AssertionError("nothing should be released for lack of time")
+
+    def fetch_pdf_time_p95(self, window):
+        return None
+
+    def fetch_report_by_hash(self, content_hash):
+        return None
+
+    def queue_deficiency_response(self, pdf_id, report_filename, status, content_hash=None, claimed_by=None):
+        self.pending.append((pdf_id, status, report_filename, claimed_by))
+
+    def queue_deficiencies(self, pdf_id, report=None, content_hash=None):
+        pass
+
+    def queue_metrics(self, metrics, status):
+        pass
+
+    def flush(self):
+        for pdf_id, status, report_filename, claimed_by in self.pending:
+            row = self.rows[pdf_id]
+            if row["status"] == PDFStatus.PROCESSING.value and row["claimed_by"] == claimed_by:
+                row.update(status=status.value, report=report_filename)
+        self.pending = []
+
+
+class FlakyGenerator:
+    """Fails the first `failures` reports, then returns an empty one."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def generate_report(self, pdf_source, pdf_id, metrics=None, checkpoint=None, deadline=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("model unavailable")
+        return {"deficiency_summary": []}
+
+
+def sqs_record(pdf_id, receive_count):
+    return {
+        "eventSource": "aws:sqs",
+        "messageId": f"message-{receive_count}",
+        "body": json.dumps({"pdf_id": pdf_id}),
+        "attributes": {"ApproximateReceiveCount": str(receive_count)},
+    }
+
+
+@pytest.fixture
+def pdf(s3_manager):
+    pdf_id = str(uuid.uuid4())
+    s3_manager.s3_client.put_object(Bucket=s3_manager.bucket_name, Key=f"{pdf_id}/inspection.pdf", Body=b"%PDF-1.4 test")
+    return pdf_id, TableDB({pdf_id: f"{pdf_id}/inspection.pdf"})
+
+
+def handle(record, db, s3_manager, generator, monkeypatch):
+    from report_cache import ReportCache
+
+    monkeypatch.setattr(lambda_function, "clients", {"s3": s3_manager, "report_generator": generator})
+    return lambda_function.handle_records([record], f"worker-{uuid.uuid4()}", db, ReportCache(db))
+
+
+def test_failed_delivery_is_retried_on_redelivery(pdf, s3_manager, monkeypatch):
+    pdf_id, db = pdf
+    generator = FlakyGenerator(failures=1)
+
+    first = handle(sqs_record(pdf_id, 1), db, s3_manager, generator, monkeypatch)
+    assert first["batchItemFailures"] == [{"itemIdentifier": "message-1"}]
+    assert db.rows[pdf_id]["status"] == PDFStatus.NOT_PROCESSED.value
+
+    second = handle(sqs_record(pdf_id, 2), db, s3_manager, generator, monkeypatch)
+    assert second["batchItemFailures"] == []
+    assert [result["status"] for result in second["processed"]] == ["Success"]
+    assert db.rows[pdf_id]["status"] == PDFStatus.PROCESS_SUCCESS.value
+    assert generator.calls == 2
+
+
+def test_last_delivery_marks_the_pdf_failed(pdf, s3_manager, monkeypatch):
+    pdf_id, db = pdf
+    generator = FlakyGenerator(failures=SQS_MAX_RECEIVE_COUNT)
+
+    for receive_count in range(1, SQS_MAX_RECEIVE_COUNT + 1):
+        result = handle(sqs_record(pdf_id, receive_count), db, s3_manager, generator, monkeypatch)
+        assert result["batchItemFailures"] == [{"itemIdentifier": f"message-{receive_count}"}]
+
+    assert db.rows[pdf_id]["status"] == PDFStatus.PROCESS_FAILED.value
+    assert generator.calls == SQS_MAX_RECEIVE_COUNT
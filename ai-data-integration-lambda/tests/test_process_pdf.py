@@ -0,0 +1,74 @@
+"""process_pdf after a crash between the report upload and the status flush."""
+from db_manager import PDFStatus
+from synthetic_pdfs import make_pdf
+
+
+class QueueingDB:
+    """The buffered DBManager writes process_pdf makes, kept in memory."""
+
+    def __init__(self):
+        self.responses = {}
+        self.deficiencies = {}
+
+    def fetch_report_by_hash(self, content_hash):
+        # The earlier attempt's status update was never flushed, so the cache misses.
+        return None
+
+    def queue_deficiency_response(self, pdf_id, report_filename, status, content_hash=None, claimed_by=None):
+        self.responses[pdf_id] = (status, report_filename, content_hash, claimed_by)
+
+    def queue_deficiencies(self, pdf_id, report=None, content_hash=None):
+        self.deficiencies[pdf_id] = report
+
+    def queue_metrics(self, metrics, status):
+        pass
+
+
+class NoModel:
+    def generate_report(self, *args, **kwargs):
+        raise AssertionError("the report should not be generated again")
+
+
+
+def test_uploaded_report_is_reused_after_a_crash(fake_openai, s3_manager):
+    from deficiency_report import DeficiencyReportGenerator
+    from lambda_function import process_pdf
+    from report_cache import ReportCache
+
+    data, deficiencies = make_pdf(1, pages=2, density=0.5)
+    s3_manager.s3_client.put_object(Bucket=s3_manager.bucket_name, Key="pdf-1/inspection.pdf", Body=data)
+
+    first = QueueingDB()
+    pdf = {"id": "pdf-1", "url": "pdf-1/inspection.pdf", "claimed_by": "worker-1"}
+    result = process_pdf(pdf, first, s3_manager, DeficiencyReportGenerator(), ReportCache(first))
+    assert result["status"] == "Success" and "cached" not in result
+    requests = fake_openai.requests
+
+    # The invocation dies before flushing; the lease expires and worker-2 reclaims the row.
+    second = QueueingDB()
+    pdf = dict(pdf, claimed_by="worker-2")
+    result = process_pdf(pdf, second, s3_manager, NoModel(), ReportCache(second))
+
+    assert result == {"id": "pdf-1", "status": "Success", "report_s3_path": "pdf-1/pdf-1_report.json", "cached": True}
+    assert fake_openai.requests == requests
+    status, report_filename, content_hash, claimed_by = second.responses["pdf-1"]
+    assert (status, report_filename, claimed_by) == (PDFStatus.PROCESS_SUCCESS, "pdf-1/pdf-1_report.json", "worker-2")
+    assert content_hash == first.responses["pdf-1"][2]
+    assert len(second.deficiencies["pdf-1"]["deficiency_summary"]) == deficiencies
+
+
+def test_report_from_another_version_is_not_reused(fake_openai, s3_manager):
+    from deficiency_report import DeficiencyReportGenerator
+    from lambda_function import process_pdf
+    from report_cache import ReportCache
+
+    data, _ = make_pdf(2, pages=1, density=0.5)
+    s3_manager.s3_client.put_object(Bucket=s3_manager.bucket_name, Key="pdf-2/inspection.pdf", Body=data)
+    s3_manager.upload_file("{}", "pdf-2/pdf-2_report.json", {"content-hash": "made-with-an-older-prompt"})
+
+    db = QueueingDB()
+    pdf = {"id": "pdf-2", "url": "pdf-2/inspection.pdf", "claimed_by": "worker-1"}
+    result = process_pdf(pdf, db, s3_manager, DeficiencyReportGenerator(), ReportCache(db))
+
+    assert result["status"] == "Success" and "cached" not in result
+    assert fake_openai.requests > 0
@@ -0,0 +1,174 @@
+"""RateLimiter under bursts against a stub server that answers 429 when its own bucket is empty."""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from rate_limiter import RateLimiter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DJANGO_COPY = os.path.join(HERE, "..", "..", "ai-data-integration", "deficiency_reports", "utils", "rate_limiter.py")
+LAMBDA_COPY = os.path.join(HERE, "..", "src", "rate_limiter.py")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        allowed, remaining = self.server.take()
+        body = json.dumps({"ok": allowed}).encode()
+        self.send_response(200 if allowed else 429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-ratelimit-limit-requests", str(self.server.requests_per_minute))
+        self.send_header("x-ratelimit-remaining-requests", str(remaining))
+        if not allowed:
+            self.send_header("retry-after-ms", str(self.server.retry_after_ms))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    """Allows requests_per_minute with a bucket of capacity requests; answers 429 beyond that."""
+    daemon_threads = True
+
+    def __init__(self, requests_per_minute, capacity, retry_after_ms=200):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests_per_minute = requests_per_minute
+        self.capacity = capacity
+        self.retry_after_ms = retry_after_ms
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.requests_per_minute / 60)
+            self.updated = now
+            if self.available >= 1:
+                self.available -= 1
+                self.accepted += 1
+                return True, int(self.available)
+            self.rejected += 1
+            return False, 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/chat/completions"
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*args, **kwargs):
+        server = StubServer(*args, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def call(client, limiter, url):
+    """acquire() then POST, retrying 429s the way the OpenAI client does."""
+    while True:
+        limiter.acquire(100)
+        if client.post(url, json={}).status_code != 429:
+            return
+
+
+def test_burst_is_paced_to_the_limit():
+    limiter = RateLimiter(requests_per_minute=120)
+    started = time.monotonic()
+    for _ in range(120):
+        limiter.acquire(0)
+    assert time.monotonic() - started < 0.5
+
+    # The bucket is empty: 120/min refills one request every 0.5s.
+    started = time.monotonic()
+    limiter.acquire(0)
+    limiter.acquire(0)
+    assert 0.8 <= time.monotonic() - started < 2
+
+
+def test_bucket_refills_while_idle():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=60000)
+    for _ in range(600):
+        limiter.acquire(0)
+    limiter.acquire(60000 - 1)
+
+    time.sleep(0.5)  # 5 requests and 500 tokens at these rates
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire(100)
+    assert time.monotonic() - started < 0.2
+    assert limiter.stats()["waited_s"] < 0.2
+
+
+def test_429_pauses_every_caller_and_halves_the_rate(stub):
+    server = stub(requests_per_minute=600, capacity=1, retry_after_ms=400)
+    limiter = RateLimiter()
+    with httpx.Client(event_hooks={"response": [limiter.on_response]}) as client:
+        assert client.post(server.url, json={}).status_code == 200
+        assert client.post(server.url, json={}).status_code == 429
+
+        assert limiter.stats()["rate_limited"] == 1
+        assert limiter.stats()["throttle"] == 0.5
+        assert limiter.request_limit == 600
+
+        started = time.monotonic()
+        limiter.acquire(0)
+        assert time.monotonic() - started >= 0.35
+
+        # Successful responses bring the rate back gradually.
+        time.sleep(0.2)
+        assert client.post(server.url, json={}).status_code == 200
+        assert limiter.stats()["throttle"] == 0.55
+
+
+def test_concurrent_burst_backs_off_together(stub):
+    # The server allows 10 requests per second with a burst of 5; the client starts
+    # without knowing the limit and learns it from the first response headers.
+    server = stub(requests_per_minute=600, capacity=5)
+    limiter = RateLimiter()
+    with httpx.Client(event_hooks={"response": [limiter.on_response]}) as client:
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: call(client, limiter, server.url), range(30)))
+        elapsed = time.monotonic() - started
+
+    assert server.accepted == 30
+    # Unpaced, 8 threads retrying on every 429 would get hundreds of rejections.
+    assert server.rejected <= 15
+    assert limiter.stats()["rate_limited"] == server.rejected
+    # 30 requests at 10/s after a burst of 5 take at least 2.5s.
+    assert elapsed >= 2.4
+
+
+def test_lambda_copy_matches_the_django_source():
+    if not os.path.exists(DJANGO_COPY):
+        pytest.skip("the Django app is not checked out next to the Lambda")
+
+    def body(path):
+        with open(path) as f:
+            lines = f.read().splitlines()
+        while lines[0].startswith("#"):
+            lines.pop(0)
+        # The config import is the only line that should differ.
+        return [line for line in lines if "import OPENAI_RPM" not in line]
+
+    assert body(LAMBDA_COPY) == body(DJANGO_COPY)
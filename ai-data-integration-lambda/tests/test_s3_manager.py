@@ -0,0 +1,18 @@
+"""S3Manager downloads against a moto bucket."""
+import os
+
+import s3_manager as s3_manager_module
+
+
+def test_read_object_returns_bytes_from_memory(s3_manager):
+    s3_manager.upload_file('{"small": true}', "pdf-1/pdf-1_report.json")
+
+    assert s3_manager.read_object("pdf-1/pdf-1_report.json") == b'{"small": true}'
+
+
+def test_read_object_reads_back_a_spilled_download(s3_manager, monkeypatch):
+    monkeypatch.setattr(s3_manager_module, "S3_SPILL_THRESHOLD", 4)
+    s3_manager.upload_file('{"large": true}', "pdf-2/pdf-2_report.json")
+
+    assert s3_manager.read_object("pdf-2/pdf-2_report.json") == b'{"large": true}'
+    assert not os.path.exists("/tmp/pdf-2_pdf-2_report.json")
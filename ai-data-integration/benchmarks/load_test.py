@@ -0,0 +1,301 @@
+"""HTTP load test for the deficiency_reports API.
+
+Drives a running server (runserver, gunicorn or uvicorn) with a weighted mix
+of requests at a fixed concurrency, or in steps of increasing concurrency to
+find where it saturates, and prints JSON with throughput, p50/p95/p99 latency
+and error rate per endpoint.
+
+1. Start the local stand-ins (S3 via moto) and note the environment it prints:
+       pip install -r benchmarks/requirements.txt
+       python benchmarks/load_test.py stubs
+2. Start the app with that environment plus a Postgres in POSTGRES_*, and seed it:
+       python manage.py makemigrations deficiency_reports && python manage.py migrate
+       DEBUG=true python manage.py seed_load_test --pdfs 10000 --password <password>
+       gunicorn core.wsgi:application -w 4 --bind 127.0.0.1:8000
+3. Run the load:
+       python benchmarks/load_test.py run --base-url http://127.0.0.1:8000 --password <password> \\
+           --mix get-pdf=4,get-report=10,upload=1 --concurrency 32 --duration 60
+       python benchmarks/load_test.py run ... --step 8 --max-concurrency 256 --step-duration 30
+
+Endpoints available to --mix: get-pdf (one keyset page), get-pdf-stream
+(whole range, streamed), get-report, get-report-async, upload (multipart
+through Django), create-upload (presigned direct upload), generate (queue a
+report job).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+# Responses that count as success; 304 comes back for conditional report reads.
+OK_STATUSES = {200, 201, 202, 208, 302, 304}
+
+
+class State:
+    """Shared inputs for request builders: report ids and the seeded date range."""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.days = args.days
+        self.range_days = args.range_days
+        self.report_ids = []
+        self.pdf_ids = []
+
+    def date_range(self):
+        end = date.today() - timedelta(days=self.rng.randint(0, max(0, self.days - self.range_days)))
+        return end - timedelta(days=self.range_days - 1), end
+
+
+async def get_pdf(client, state):
+    start, end = state.date_range()
+    return await client.get(f"/get-pdf/{start}/{end}/", params={"limit": 100})
+
+
+async def get_pdf_stream(client, state):
+    start, end = state.date_range()
+    async with client.stream("GET", f"/get-pdf/{start}/{end}/") as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+
+async def get_report(client, state):
+    return await client.get(f"/get-deficiency-report/{state.rng.choice(state.report_ids)}/")
+
+
+async def get_report_async(client, state):
+    return await client.get(f"/async/get-deficiency-report/{state.rng.choice(state.report_ids)}/")
+
+
+async def upload(client, state):
+    return await client.post("/upload-pdf/", files={"pdf_file": ("loadtest-upload.pdf", UPLOAD_PDF, "application/pdf")})
+
+
+async def create_upload(client, state):
+    return await client.post("/create-upload/", json={"filename": "loadtest-direct.pdf", "size": len(UPLOAD_PDF)})
+
+
+async def generate(client, state):
+    return await client.get(f"/generate-deficiency-report/{state.rng.choice(state.pdf_ids)}/")
+
+
+ENDPOINTS = {
+    "get-pdf": get_pdf,
+    "get-pdf-stream": get_pdf_stream,
+    "get-report": get_report,
+    "get-report-async": get_report_async,
+    "upload": upload,
+    "create-upload": create_upload,
+    "generate": generate,
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def summarize(samples, elapsed):
+    """samples: [(endpoint, status or exception name, latency ms)] -> per-endpoint and overall stats."""
+    def stats(rows):
+        latencies = sorted(latency for _, _, latency in rows)
+        errors = sum(1 for _, outcome, _ in rows if outcome not in OK_STATUSES)
+        statuses = {}
+        for _, outcome, _ in rows:
+            statuses[str(outcome)] = statuses.get(str(outcome), 0) + 1
+        return {
+            "requests": len(rows),
+            "rps": round(len(rows) / elapsed, 1) if elapsed else None,
+            "error_rate": round(errors / len(rows), 4) if rows else None,
+            "statuses": statuses,
+            "p50_ms": round(percentile(latencies, 0.50), 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 1) if latencies else None,
+            "mean_ms": round(statistics.mean(latencies), 1) if latencies else None,
+        }
+
+    endpoints = sorted({endpoint for endpoint, _, _ in samples})
+    return {
+        "seconds": round(elapsed, 2),
+        "overall": stats(samples),
+        "endpoints": {endpoint: stats([s for s in samples if s[0] == endpoint]) for endpoint in endpoints},
+    }
+
+
+async def load_ids(client, state, pool_size):
+    """Collect PDF ids (and those with reports) from the seeded range through the paginated listing."""
+    end = date.today()
+    start = end - timedelta(days=state.days)
+    cursor = None
+    while len(state.report_ids) < pool_size:
+        params = {"limit": 1000, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"/get-pdf/{start}/{end}/", params=params)
+        response.raise_for_status()
+        page = response.json()
+        for row in page["results"]:
+            state.pdf_ids.append(row["request_id"])
+            if row["deficiency_report"]:
+                state.report_ids.append(row["request_id"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+
+async def run_level(client, state, mix, concurrency, duration):
+    names, weights = list(mix), list(mix.values())
+    samples = []
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            endpoint = state.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                outcome = (await ENDPOINTS[endpoint](client, state)).status_code
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            samples.append((endpoint, outcome, (time.perf_counter() - started) * 1000))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+async def run(args):
+    state = State(args)
+    limits = httpx.Limits(max_connections=args.max_concurrency if args.step else args.concurrency)
+    auth = httpx.BasicAuth(args.user, args.password)
+    async with httpx.AsyncClient(base_url=args.base_url, auth=auth, limits=limits, timeout=args.timeout) as client:
+        await load_ids(client, state, args.id_pool)
+        needs_reports = any(name.startswith("get-report") for name in args.mix)
+        if needs_reports and not state.report_ids:
+            sys.exit("No PDFs with reports found in the seeded range; run manage.py seed_load_test first.")
+        if "generate" in args.mix and not state.pdf_ids:
+            sys.exit("No PDFs found in the seeded range; run manage.py seed_load_test first.")
+
+        if not args.step:
+            result = await run_level(client, state, args.mix, args.concurrency, args.duration)
+            return {"mode": "fixed", "concurrency": args.concurrency, **result}
+
+        steps, saturation = [], None
+        for concurrency in range(args.step, args.max_concurrency + 1, args.step):
+            result = await run_level(client, state, args.mix, concurrency, args.step_duration)
+            overall = result["overall"]
+            steps.append({"concurrency": concurrency, **result})
+            print(f"concurrency {concurrency}: {overall['rps']} rps, p95 {overall['p95_ms']} ms, "
+                  f"errors {overall['error_rate']}", file=sys.stderr)
+            reasons = []
+            if overall["p95_ms"] is not None and overall["p95_ms"] > args.p95_limit_ms:
+                reasons.append(f"p95 {overall['p95_ms']} ms > {args.p95_limit_ms} ms")
+            if overall["error_rate"] is not None and overall["error_rate"] > args.error_limit:
+                reasons.append(f"error rate {overall['error_rate']} > {args.error_limit}")
+            if len(steps) > 1 and overall["rps"] < steps[-2]["overall"]["rps"] * (1 + args.min_gain):
+                reasons.append("throughput stopped growing")
+            if reasons:
+                saturation = {"concurrency": concurrency, "reasons": reasons}
+                break
+        best = max(steps, key=lambda step: step["overall"]["rps"])
+        return {
+            "mode": "step",
+            "saturation": saturation,
+            "max_rps": best["overall"]["rps"],
+            "max_rps_concurrency": best["concurrency"],
+            "steps": steps,
+        }
+
+
+def serve_stubs(args):
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=args.port)
+    server.start()
+    endpoint = f"http://127.0.0.1:{args.port}"
+    boto3.client("s3", endpoint_url=endpoint, region_name="us-east-1",
+                 aws_access_key_id="loadtest", aws_secret_access_key="loadtest").create_bucket(Bucket=args.bucket)
+    print("Local S3 running. Start the app and seed_load_test with:\n")
+    for name, value in {
+        "AWS_ENDPOINT_URL": endpoint,
+        "AWS_STORAGE_BUCKET_NAME": args.bucket,
+        "AWS_S3_REGION_NAME": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "PDF_EVENTS_QUEUE_URL": "",
+    }.items():
+        print(f"export {name}={value}")
+    print("\nCtrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stubs = commands.add_parser("stubs", help="run a local S3 (moto) for the server under test")
+    stubs.add_argument("--port", type=int, default=5000)
+    stubs.add_argument("--bucket", default="loadtest")
+
+    load = commands.add_parser("run", help="drive the API and report latency percentiles")
+    load.add_argument("--base-url", default="http://127.0.0.1:8000")
+    load.add_argument("--user", default="loadtest")
+    load.add_argument("--password", required=True, help="password given to seed_load_test")
+    load.add_argument("--mix", type=parse_mix, default=parse_mix("get-pdf=4,get-report=10,upload=1"))
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--duration", type=float, default=60, help="seconds for a fixed-concurrency run")
+    load.add_argument("--step", type=int, default=0, help="step-load: add this many clients per step")
+    load.add_argument("--max-concurrency", type=int, default=256)
+    load.add_argument("--step-duration", type=float, default=30)
+    load.add_argument("--p95-limit-ms", type=float, default=1000, help="step-load stops once p95 exceeds this")
+    load.add_argument("--error-limit", type=float, default=0.01, help="step-load stops once errors exceed this rate")
+    load.add_argument("--min-gain", type=float, default=0.05,
+                      help="step-load stops once a step adds less than this fraction of throughput")
+    load.add_argument("--days", type=int, default=90, help="days seeded by seed_load_test")
+    load.add_argument("--range-days", type=int, default=7, help="width of get-pdf date ranges")
+    load.add_argument("--id-pool", type=int, default=2000, help="report ids to sample from")
+    load.add_argument("--timeout", type=float, default=60)
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--output", help="write the JSON here instead of stdout")
+
+    args = parser.parse_args()
+    if args.command == "stubs":
+        return serve_stubs(args)
+
+    result = asyncio.run(run(args))
+    result.update({"base_url": args.base_url, "mix": args.mix})
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
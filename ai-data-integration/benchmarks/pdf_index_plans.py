@@ -0,0 +1,170 @@
+"""Query plans for the pdf_documents listing and claim queries, before and after indexing.
+
+Builds a scratch copy of pdf_documents in its own schema, fills it with
+synthetic rows (mostly finished reports, a thin tail of pending ones), and runs
+EXPLAIN (ANALYZE, BUFFERS) for each query with no secondary indexes and then
+with the indexes declared on the PDF model. Output is JSON: execution time,
+buffers touched and the scan nodes used per query and phase.
+
+Needs a Postgres reachable through the usual POSTGRES_* variables; nothing
+outside the scratch schema is touched, and the schema is dropped afterwards
+unless --keep is given.
+
+    python benchmarks/pdf_index_plans.py [--rows 3000000] [--days 365] [--plans] [--keep]
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+
+SCHEMA = "bench_pdf_index"
+
+SETUP = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+CREATE TABLE {SCHEMA}.pdf_documents (
+    id uuid PRIMARY KEY,
+    pdf_file varchar(100),
+    uploaded_at timestamptz NOT NULL,
+    status varchar(50) NOT NULL,
+    deficiency_report varchar(100),
+    claimed_by varchar(100),
+    lease_expires_at timestamptz,
+    content_hash varchar(64),
+    batch_id varchar(100)
+);
+"""
+
+# ~1% not processed, a handful processing, ~1% failed, the rest finished.
+FILL = f"""
+INSERT INTO {SCHEMA}.pdf_documents (id, pdf_file, uploaded_at, status, lease_expires_at)
+SELECT md5(n::text)::uuid,
+       md5(n::text) || '/report.pdf',
+       now() - random() * make_interval(days => %(days)s),
+       CASE WHEN n %% 100 = 0 THEN 'Not Processed'
+            WHEN n %% 10000 = 1 THEN 'Processing'
+            WHEN n %% 100 = 2 THEN 'Process Failed'
+            ELSE 'Process Successful' END,
+       CASE WHEN n %% 10000 = 1 THEN now() - interval '1 minute' END
+FROM generate_series(1, %(rows)s) AS n;
+ANALYZE {SCHEMA}.pdf_documents;
+"""
+
+# Mirrors PDF.Meta.indexes.
+INDEXES = f"""
+CREATE INDEX pdf_uploaded_at_idx ON {SCHEMA}.pdf_documents (uploaded_at, id);
+CREATE INDEX pdf_status_uploaded_idx ON {SCHEMA}.pdf_documents (status, uploaded_at);
+CREATE INDEX pdf_pending_idx ON {SCHEMA}.pdf_documents (uploaded_at)
+    WHERE status IN ('Not Processed', 'Processing');
+ANALYZE {SCHEMA}.pdf_documents;
+"""
+
+QUERIES = {
+    # What uploaded_at__date__range compiles to with USE_TZ and TIME_ZONE = 'UTC'.
+    "get_pdf_date_cast": f"""
+        SELECT * FROM {SCHEMA}.pdf_documents
+        WHERE (uploaded_at AT TIME ZONE 'UTC')::date BETWEEN %(start)s AND %(end)s
+    """,
+    "get_pdf_half_open": f"""
+        SELECT * FROM {SCHEMA}.pdf_documents
+        WHERE uploaded_at >= %(start)s AND uploaded_at < %(end_exclusive)s
+    """,
+    "get_pdf_half_open_by_status": f"""
+        SELECT * FROM {SCHEMA}.pdf_documents
+        WHERE status = 'Process Failed' AND uploaded_at >= %(start)s AND uploaded_at < %(end_exclusive)s
+    """,
+    "lambda_fetch_not_processed": f"""
+        SELECT id, pdf_file FROM {SCHEMA}.pdf_documents
+        WHERE status = 'Not Processed'
+    """,
+    "lambda_claim_candidates": f"""
+        SELECT id FROM {SCHEMA}.pdf_documents
+        WHERE status = 'Not Processed'
+           OR (status = 'Processing' AND lease_expires_at < now())
+        ORDER BY uploaded_at
+        LIMIT 50
+    """,
+}
+
+
+def scan_nodes(plan, found=None):
+    found = [] if found is None else found
+    node = plan["Node Type"]
+    if "Scan" in node:
+        found.append(f"{node} on {plan['Index Name']}" if "Index Name" in plan else node)
+    for child in plan.get("Plans", []):
+        scan_nodes(child, found)
+    return found
+
+
+def explain(cursor, query, params, include_plan):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    result = cursor.fetchone()[0][0]
+    plan = result["Plan"]
+    summary = {
+        "execution_ms": round(result["Execution Time"], 2),
+        "rows": plan["Actual Rows"],
+        "shared_buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "scans": scan_nodes(plan),
+    }
+    if include_plan:
+        summary["plan"] = plan
+    return summary
+
+
+def run_queries(cursor, params, include_plan):
+    return {name: explain(cursor, query, params, include_plan) for name, query in QUERIES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--days", type=int, default=365, help="spread uploads over this many days")
+    parser.add_argument("--range-days", type=int, default=7, help="width of the listed date range")
+    parser.add_argument("--plans", action="store_true", help="include the full JSON plans")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch schema in place")
+    args = parser.parse_args()
+
+    load_dotenv()
+    connection = psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DATABASE"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=os.getenv("POSTGRES_PORT"),
+    )
+    connection.autocommit = True
+    end = date.today() - timedelta(days=30)
+    start = end - timedelta(days=args.range_days - 1)
+    params = {"start": start, "end": end, "end_exclusive": end + timedelta(days=1)}
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(SETUP)
+            cursor.execute(FILL, {"rows": args.rows, "days": args.days})
+            before = run_queries(cursor, params, args.plans)
+            cursor.execute(INDEXES)
+            after = run_queries(cursor, params, args.plans)
+            cursor.execute(
+                "SELECT indexrelname, pg_relation_size(indexrelid) FROM pg_stat_user_indexes WHERE schemaname = %s",
+                (SCHEMA,),
+            )
+            index_sizes = {name: size for name, size in cursor.fetchall()}
+            if not args.keep:
+                cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        connection.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "range": [str(start), str(end)],
+        "index_bytes": index_sizes,
+        "queries": {name: {"before": before[name], "after": after[name]} for name in QUERIES},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
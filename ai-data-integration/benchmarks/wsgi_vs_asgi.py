@@ -0,0 +1,144 @@
+"""Compare the API under gunicorn (WSGI) and uvicorn (ASGI) at increasing concurrency.
+
+Starts each server on a local port with the same number of worker processes,
+fires --requests requests per concurrency level at the sync and async
+variants of an endpoint, and prints JSON with throughput and latency
+percentiles per server, route and level. Uses the project's normal settings,
+so the database, bucket and credentials in the environment must be usable;
+point OPENAI_BASE_URL at a stub server to benchmark generation without
+calling OpenAI.
+
+    python benchmarks/wsgi_vs_asgi.py --ids ids.txt --user api --password secret \\
+        [--workers 4] [--concurrency 1 8 32 128] [--requests 400] [--routes report]
+
+ids.txt holds one PDF id per line. The "report" routes read existing reports
+(/get-deficiency-report/ vs /async/get-deficiency-report/). The "generate"
+routes need PDFs without reports, which are used up as they complete; the
+sync one only queues a job (202), so it measures enqueue cost, while the
+async one generates inline.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+PROJECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVERS = {
+    "wsgi": lambda port, workers: ["gunicorn", "core.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                                   "--workers", str(workers), "--timeout", "300"],
+    "asgi": lambda port, workers: ["uvicorn", "core.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+                                   "--workers", str(workers)],
+}
+
+ROUTES = {
+    "report": {"sync": "/get-deficiency-report/{id}/", "async": "/async/get-deficiency-report/{id}/"},
+    "generate": {"sync": "/generate-deficiency-report/{id}/", "async": "/async/generate-deficiency-report/{id}/"},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"server did not listen on port {port} within {timeout}s")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+
+async def run_level(base_url, path, ids, concurrency, total, auth):
+    latencies, statuses = [], {}
+    id_cycle = itertools.cycle(ids)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, auth=auth, limits=limits, timeout=300) as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path.format(id=next(id_cycle)))
+                    key = str(response.status_code)
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "statuses": statuses,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", required=True, help="file with one PDF id per line")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes per server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    parser.add_argument("--routes", choices=sorted(ROUTES), default="report")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=sorted(SERVERS))
+    args = parser.parse_args()
+
+    with open(args.ids) as f:
+        ids = [line.strip() for line in f if line.strip()]
+    auth = httpx.BasicAuth(args.user, args.password)
+    results = {}
+    for server in args.servers:
+        port = free_port()
+        process = subprocess.Popen(SERVERS[server](port, args.workers), cwd=PROJECT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port, process)
+            results[server] = {
+                variant: [
+                    asyncio.run(run_level(f"http://127.0.0.1:{port}", path, ids, level, args.requests, auth))
+                    for level in args.concurrency
+                ]
+                for variant, path in ROUTES[args.routes].items()
+            }
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        print(f"{server} done", file=sys.stderr)
+
+    print(json.dumps({"workers": args.workers, "routes": args.routes, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
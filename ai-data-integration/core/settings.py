@@ -17,10 +17,50 @@ AWS_SECRET_ACCESS_KEY = os.getenv(key="AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv(key="AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv(key="AWS_S3_REGION_NAME")  # Set your region here
 AWS_S3_CUSTOM_DOMAIN = f"{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com"
+# SQS queue the processing Lambda consumes; when unset, uploads wait for the scheduled run.
+PDF_EVENTS_QUEUE_URL = os.getenv(key="PDF_EVENTS_QUEUE_URL")
 AWS_S3_OBJECT_PARAMETERS = {
 "CacheControl": "max-age=86400",
 }
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"    
+
+# Report bodies served by get-deficiency-report. Point REPORT_CACHE_ALIAS at a shared
+# backend (e.g. Redis) in CACHES to share them between workers; the default is per process.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "reports": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "deficiency-reports",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv(key="REPORT_CACHE_MAX_ENTRIES", default="500"))},
+    },
+}
+REPORT_CACHE_ALIAS = os.getenv(key="REPORT_CACHE_ALIAS", default="reports")
+REPORT_CACHE_TIMEOUT = int(os.getenv(key="REPORT_CACHE_TIMEOUT", default="600"))
+# Larger reports are still served, just not kept in the cache.
+REPORT_CACHE_MAX_BODY_BYTES = int(os.getenv(key="REPORT_CACHE_MAX_BODY_BYTES", default=str(1024 * 1024)))
+# Lifetime of the presigned URL returned by ?redirect=true.
+REPORT_URL_EXPIRY = int(os.getenv(key="REPORT_URL_EXPIRY", default="300"))
+
+# Direct-to-S3 uploads (create-upload / complete-upload).
+UPLOAD_URL_EXPIRY = int(os.getenv(key="UPLOAD_URL_EXPIRY", default="900"))
+UPLOAD_MAX_BYTES = int(os.getenv(key="UPLOAD_MAX_BYTES", default=str(5 * 1024 ** 3)))
+# Files at least this large get presigned multipart part URLs instead of a single POST.
+UPLOAD_MULTIPART_THRESHOLD = int(os.getenv(key="UPLOAD_MULTIPART_THRESHOLD", default=str(100 * 1024 ** 2)))
+UPLOAD_PART_SIZE = int(os.getenv(key="UPLOAD_PART_SIZE", default=str(16 * 1024 ** 2)))
+
+# Report jobs queued by generate-deficiency-report and run by `manage.py run_report_worker`.
+REPORT_JOB_LEASE_SECONDS = int(os.getenv(key="REPORT_JOB_LEASE_SECONDS", default="900"))
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv(key="REPORT_JOB_MAX_ATTEMPTS", default="3"))
+# Base retry delay in seconds; doubles with each failed attempt.
+REPORT_JOB_RETRY_DELAY = int(os.getenv(key="REPORT_JOB_RETRY_DELAY", default="30"))
+# Completed jobs are POSTed to their callback_url, signed with HMAC-SHA256 when a secret is set.
+REPORT_WEBHOOK_SECRET = os.getenv(key="REPORT_WEBHOOK_SECRET")
+REPORT_WEBHOOK_TIMEOUT = int(os.getenv(key="REPORT_WEBHOOK_TIMEOUT", default="10"))
+# Comma-separated hosts callback URLs may point at; empty allows any host. Hosts that resolve to
+# private, loopback or link-local addresses are always refused.
+REPORT_WEBHOOK_ALLOWED_HOSTS = [host for host in os.getenv(key="REPORT_WEBHOOK_ALLOWED_HOSTS", default="").split(",") if host]
 BASE_DIR = Path(__file__).resolve().parent.parent
 current_date = str(datetime.now().date())
 
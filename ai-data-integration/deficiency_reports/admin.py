@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import PDF 
+from .models import PDF, PDFMetrics, ReportJob, Deficiency
 # Register your models here.
 
-admin.site.register(PDF)
\ No newline at end of file
+admin.site.register(PDF)
+admin.site.register(PDFMetrics)
+admin.site.register(ReportJob)
+admin.site.register(Deficiency)
@@ -0,0 +1,143 @@
+"""Async (ASGI) versions of the report endpoints.
+
+Served alongside the DRF views under /async/ when the app runs on an ASGI
+server (e.g. `uvicorn core.asgi:application`). A request waiting on OpenAI or
+S3 holds a coroutine rather than a worker thread, so one process can keep
+many generations in flight. DRF views are synchronous, so these are plain
+Django async views with the same Basic authentication the API uses.
+"""
+import asyncio
+import base64
+import binascii
+import logging
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import status
+
+from .models import PDF, PDFStatus
+from .serializers import PdfSerializer
+from .utils.aws import get_client
+from .utils.deficiency_report import AsyncDeficiencyReportGenerator
+from .utils.jobs import claim_pdf
+from .utils.metrics import PipelineMetrics
+from .utils.report_store import ReportNotFound, fetch_report, presigned_report_url
+
+logger = logging.getLogger(__name__)
+
+_report_generator = None
+
+
+def get_report_generator():
+    global _report_generator
+    if _report_generator is None:
+        _report_generator = AsyncDeficiencyReportGenerator()
+    return _report_generator
+
+
+def basic_auth_required(view):
+    """HTTP Basic authentication for async views, matching the DRF default."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = None
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'basic' and credentials:
+            try:
+                username, _, password = base64.b64decode(credentials).decode().partition(':')
+            except (binascii.Error, UnicodeDecodeError):
+                username = password = None
+            if username:
+                user = await aauthenticate(request, username=username, password=password)
+        if user is None or not user.is_active:
+            response = JsonResponse({"detail": "Authentication credentials were not provided or are invalid."},
+                                    status=status.HTTP_401_UNAUTHORIZED)
+            response['WWW-Authenticate'] = 'Basic realm="api"'
+            return response
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def serialize_pdf(pdf):
+    return await sync_to_async(lambda: PdfSerializer(pdf).data)()
+
+
+async def set_pdf_status(pdf, pdf_status):
+    await PDF.objects.filter(id=pdf.id).aupdate(status=pdf_status, claimed_by=None, lease_expires_at=None)
+
+
+def download_pdf(key):
+    return get_client('s3').get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)['Body'].read()
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@basic_auth_required
+async def generate_deficiency_report(request, id):
+    """Generate the report inside the request, without tying up a thread while OpenAI works."""
+    logger.info(f"Generating deficiency report (async) for PDF ID: {id}")
+    try:
+        pdf = await PDF.objects.aget(id=id)
+    except (PDF.DoesNotExist, ValidationError):
+        return JsonResponse({"error": f"PDF with ID {id} not found."}, status=status.HTTP_404_NOT_FOUND)
+    if pdf.deficiency_report:
+        return JsonResponse(await serialize_pdf(pdf), status=status.HTTP_208_ALREADY_REPORTED)
+    if pdf.status == PDFStatus.AWAITING_UPLOAD:
+        return JsonResponse({"error": "The PDF upload has not been completed."}, status=status.HTTP_409_CONFLICT)
+    if not await sync_to_async(claim_pdf)(pdf, f"api:{uuid.uuid4()}"):
+        return JsonResponse({"error": f"PDF with ID {id} is already being processed."}, status=status.HTTP_409_CONFLICT)
+
+    await pdf.arefresh_from_db()
+    metrics = PipelineMetrics(source="api")
+    try:
+        with metrics.stage("download"):
+            pdf_bytes = await asyncio.to_thread(download_pdf, pdf.pdf_file.name)
+        await get_report_generator().agenerate_report(pdf_bytes, pdf, metrics)
+    except Exception as e:
+        logger.error(f"Error processing PDF ID {id}: {e}")
+        await set_pdf_status(pdf, PDFStatus.PROCESS_FAILED)
+        await sync_to_async(metrics.save)(pdf, PDFStatus.PROCESS_FAILED)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    await set_pdf_status(pdf, PDFStatus.PROCESS_SUCCESS)
+    await sync_to_async(metrics.save)(pdf, PDFStatus.PROCESS_SUCCESS)
+    await pdf.arefresh_from_db()
+    logger.info(f"Deficiency report generated successfully for PDF ID: {id}")
+    return JsonResponse(await serialize_pdf(pdf), status=status.HTTP_200_OK)
+
+
+@require_http_methods(["GET"])
+@basic_auth_required
+async def get_deficiency_report(request, id):
+    """Async get-deficiency-report: same caching, conditional and ?redirect=true behaviour as the DRF view."""
+    try:
+        pdf = await PDF.objects.only('id', 'deficiency_report').aget(id=id)
+    except (PDF.DoesNotExist, ValidationError):
+        return JsonResponse({"error": f"PDF with ID {id} not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not pdf.deficiency_report:
+        return JsonResponse({"error": f"No report has been generated for PDF ID: {id}."}, status=status.HTTP_404_NOT_FOUND)
+    report_key = str(pdf.deficiency_report)
+
+    if request.GET.get('redirect', '').lower() == 'true':
+        response = HttpResponseRedirect(presigned_report_url(report_key))
+        patch_cache_control(response, no_store=True)
+        return response
+
+    try:
+        report = await sync_to_async(fetch_report, thread_sensitive=False)(report_key)
+    except ReportNotFound:
+        return JsonResponse({"error": f"Report file not found in S3 for PDF ID: {id}."}, status=status.HTTP_404_NOT_FOUND)
+    response = HttpResponse(report['body'], content_type='application/json')
+    response['ETag'] = report['etag']
+    response['Last-Modified'] = http_date(report['last_modified'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=report['etag'], last_modified=report['last_modified'], response=response)
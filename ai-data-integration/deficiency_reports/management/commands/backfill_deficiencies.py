@@ -0,0 +1,70 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from deficiency_reports.models import PDF, PDFStatus, Deficiency
+from deficiency_reports.utils.aws import get_client
+from deficiency_reports.utils.deficiencies import build_deficiencies, replace_deficiencies
+
+
+def load_report(pdf):
+    """Parsed report JSON for a PDF, or the error that prevented loading it."""
+    try:
+        body = get_client('s3').get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=pdf.deficiency_report.name)['Body'].read()
+        return pdf, json.loads(body), None
+    except Exception as e:
+        return pdf, None, e
+
+
+class Command(BaseCommand):
+    help = "Import the deficiencies of existing reports in S3 into the deficiencies table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="PDFs loaded and written per batch.")
+        parser.add_argument("--workers", type=int, default=16, help="Reports downloaded from S3 in parallel.")
+        parser.add_argument("--since", help="Only PDFs uploaded on or after this date (YYYY-MM-DD).")
+        parser.add_argument("--force", action="store_true", help="Re-import PDFs that already have deficiency rows.")
+
+    def handle(self, *args, **options):
+        pdfs = PDF.objects.filter(status=PDFStatus.PROCESS_SUCCESS).exclude(deficiency_report='').exclude(deficiency_report__isnull=True)
+        if options["since"]:
+            try:
+                since = timezone.make_aware(datetime.strptime(options["since"], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+            pdfs = pdfs.filter(uploaded_at__gte=since)
+        if not options["force"]:
+            pdfs = pdfs.exclude(Exists(Deficiency.objects.filter(pdf_id=OuterRef('id'))))
+        pdfs = pdfs.only('id', 'uploaded_at', 'deficiency_report').order_by('id')
+
+        started = time.monotonic()
+        imported = rows = failed = 0
+        last_id = None
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                # Keyset over id, so reports with no deficiencies (which stay unmatched by
+                # the Exists filter) are not picked up again within the same run.
+                batch = list((pdfs.filter(id__gt=last_id) if last_id else pdfs)[:options["batch_size"]])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                rows_by_pdf = {}
+                for pdf, report, error in executor.map(load_report, batch):
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f"PDF {pdf.id}: could not load {pdf.deficiency_report.name}: {error}")
+                        continue
+                    rows_by_pdf[pdf.id] = build_deficiencies(pdf, report)
+                if rows_by_pdf:
+                    rows += replace_deficiencies(rows_by_pdf)
+                    imported += len(rows_by_pdf)
+                self.stdout.write(f"Imported {imported} reports ({rows} deficiencies), {failed} failed, {time.monotonic() - started:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {rows} deficiencies from {imported} reports; {failed} reports failed."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from deficiency_reports.utils.report_cache import ReportCache
+
+
+class Command(BaseCommand):
+    help = "Invalidate cached deficiency reports so identical PDFs are processed again."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hash", dest="content_hash", help="Only clear this content hash.")
+
+    def handle(self, *args, **options):
+        cleared = ReportCache().invalidate(options["content_hash"])
+        self.stdout.write(self.style.SUCCESS(f"Cleared {cleared} cached report entries."))
@@ -0,0 +1,37 @@
+import os
+import socket
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from deficiency_reports.utils.deficiency_report import DeficiencyReportGenerator
+from deficiency_reports.utils.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued deficiency report jobs. Start several processes for more throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--max-jobs", type=int, default=0, help="Exit after this many jobs (0 = run forever).")
+        parser.add_argument("--once", action="store_true", help="Exit as soon as the queue is empty.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        report_generator = DeficiencyReportGenerator()
+        processed = 0
+        self.stdout.write(f"Report worker {worker_id} started.")
+        while not options["max_jobs"] or processed < options["max_jobs"]:
+            close_old_connections()
+            job = claim_next_job(worker_id)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+            run_job(job, report_generator)
+            processed += 1
+            self.stdout.write(f"Job {job.id} for PDF {job.pdf_id}: {job.status}")
+        self.stdout.write(self.style.SUCCESS(f"Report worker {worker_id} ran {processed} jobs."))
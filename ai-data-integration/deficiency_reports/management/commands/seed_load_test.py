@@ -0,0 +1,99 @@
+import json
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from deficiency_reports.models import PDF, PDFStatus
+from deficiency_reports.utils.aws import get_client
+
+SEED_FILENAME = "loadtest.pdf"
+# Smallest well-formed single-page PDF; the load test only needs something to store and serve.
+SEED_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def seed_report(pdf_id, deficiencies):
+    return json.dumps({
+        "title": "Form for Inspection, Testing and Maintenance of Fire Pumps",
+        "location": f"LOC{pdf_id.hex[:5].upper()}",
+        "contact": "Facility Manager",
+        "inspector": "Load Test",
+        "deficiency_summary": [
+            {"status": None, "severity": "Critical", "description": f"II.A.{n} Waterflow test valves in closed position? No."}
+            for n in range(1, deficiencies + 1)
+        ],
+    }, indent=4).encode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed PDFs, reports and an API user for load testing (see benchmarks/load_test.py). "
+        "Refuses to run unless DEBUG is on, since it creates a user that can log in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pdfs", type=int, default=10000)
+        parser.add_argument("--days", type=int, default=90, help="spread uploads over the last N days")
+        parser.add_argument("--report-ratio", type=float, default=0.8, help="fraction of PDFs that get a report")
+        parser.add_argument("--deficiencies", type=int, default=20, help="deficiencies per seeded report")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--username", default="loadtest")
+        parser.add_argument("--password", required=True, help="password of the seeded user; there is no default")
+        parser.add_argument("--skip-files", action="store_true", help="only create rows, do not write to the bucket")
+        parser.add_argument("--clear", action="store_true", help="delete previously seeded PDFs first")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        # settings.DEBUG is the raw DEBUG environment variable, so "False" is a non-empty string.
+        if str(settings.DEBUG).strip().lower() not in ("1", "true", "yes"):
+            raise CommandError("seed_load_test only runs with DEBUG on; it creates a login-capable user and fake PDFs.")
+
+        User = get_user_model()
+        if not User.objects.filter(username=options["username"]).exists():
+            User.objects.create_user(options["username"], password=options["password"])
+            self.stdout.write(f"Created user {options['username']}")
+
+        if options["clear"]:
+            deleted, _ = PDF.objects.filter(pdf_file__endswith=f"/{SEED_FILENAME}").delete()
+            self.stdout.write(f"Deleted {deleted} previously seeded rows")
+
+        rng = random.Random(options["seed"])
+        s3_client = None if options["skip_files"] else get_client("s3")
+        now = timezone.now()
+        created = 0
+        while created < options["pdfs"]:
+            batch = []
+            for _ in range(min(options["batch_size"], options["pdfs"] - created)):
+                pdf_id = uuid.uuid4()
+                has_report = rng.random() < options["report_ratio"]
+                batch.append(PDF(
+                    id=pdf_id,
+                    pdf_file=f"{pdf_id}/{SEED_FILENAME}",
+                    status=PDFStatus.PROCESS_SUCCESS if has_report else PDFStatus.PROCESS_FAILED,
+                    deficiency_report=f"{pdf_id}/{pdf_id}_report.json" if has_report else None,
+                ))
+            PDF.objects.bulk_create(batch)
+            # uploaded_at is auto_now_add, so the spread over past days is applied afterwards.
+            for pdf in batch:
+                pdf.uploaded_at = now - timedelta(seconds=rng.uniform(0, options["days"] * 86400))
+            PDF.objects.bulk_update(batch, ["uploaded_at"])
+
+            if s3_client:
+                for pdf in batch:
+                    s3_client.put_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=pdf.pdf_file.name, Body=SEED_PDF)
+                    if pdf.deficiency_report:
+                        s3_client.put_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=pdf.deficiency_report.name,
+                                             Body=seed_report(pdf.id, options["deficiencies"]))
+            created += len(batch)
+            self.stdout.write(f"Seeded {created}/{options['pdfs']} PDFs")
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {created} PDFs over the last {options['days']} days."))
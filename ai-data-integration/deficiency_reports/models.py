@@ -1,8 +1,11 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class PDFStatus(models.TextChoices):
+    # Row created for a direct-to-S3 upload that has not been completed yet.
+    AWAITING_UPLOAD = 'Awaiting Upload', _('Awaiting Upload')
     NOT_PROCESSED = 'Not Processed', _('Not Processed')
     PROCESSING = 'Processing', _('Processing')
     PROCESS_SUCCESS = 'Process Successful', _('Process Successful')
@@ -17,6 +20,13 @@ class PDF(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=PDFStatus.choices, default=PDFStatus.NOT_PROCESSED)
     deficiency_report = models.FileField(upload_to=pdf_upload_path, blank=True, null=True)
+    # Set by the Lambda when it claims the row; an expired lease makes the row claimable again.
+    claimed_by = models.CharField(max_length=100, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    # sha256 of the PDF bytes + model + prompt version; identical uploads reuse the same report.
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # OpenAI Batch API job the row was submitted with, while the Lambda waits for its results.
+    batch_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
 
     def __str__(self):
         return f"PDF Document {self.id}"
@@ -24,3 +34,126 @@ class PDF(models.Model):
     class Meta:
         db_table = 'pdf_documents'
         verbose_name_plural = "PDF Documents"
+        indexes = [
+            # Date-range listings (keyset-paginated on uploaded_at, id), optionally narrowed to one status.
+            models.Index(fields=['uploaded_at', 'id'], name='pdf_uploaded_at_idx'),
+            models.Index(fields=['status', 'uploaded_at'], name='pdf_status_uploaded_idx'),
+            # The Lambda's claim query only looks at unfinished rows; keeping them in a
+            # partial index keeps it small no matter how many reports are done.
+            models.Index(
+                fields=['uploaded_at'],
+                name='pdf_pending_idx',
+                condition=models.Q(status__in=[PDFStatus.NOT_PROCESSED, PDFStatus.PROCESSING]),
+            ),
+        ]
+
+
+class PDFMetrics(models.Model):
+    """Per-run stage timings, token usage and cost for one PDF."""
+    pdf = models.ForeignKey(PDF, on_delete=models.CASCADE, related_name='metrics')
+    source = models.CharField(max_length=20)
+    status = models.CharField(max_length=50, choices=PDFStatus.choices)
+    model = models.CharField(max_length=50, blank=True, null=True)
+    download_ms = models.IntegerField(blank=True, null=True)
+    extract_ms = models.IntegerField(blank=True, null=True)
+    llm_ms = models.IntegerField(blank=True, null=True)
+    upload_ms = models.IntegerField(blank=True, null=True)
+    total_ms = models.IntegerField(blank=True, null=True)
+    page_count = models.IntegerField(blank=True, null=True)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Metrics for PDF {self.pdf_id} at {self.created_at}"
+
+    class Meta:
+        db_table = 'pdf_metrics'
+        verbose_name_plural = "PDF Metrics"
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'Queued', _('Queued')
+    RUNNING = 'Running', _('Running')
+    SUCCEEDED = 'Succeeded', _('Succeeded')
+    FAILED = 'Failed', _('Failed')
+
+
+class ReportJob(models.Model):
+    """A queued generate-deficiency-report request, run by the run_report_worker command."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    pdf = models.ForeignKey(PDF, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    callback_url = models.URLField(max_length=500, blank=True, null=True)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    # Not picked up before this time; pushed back for retries and while another worker holds the PDF.
+    available_at = models.DateTimeField(default=timezone.now)
+    # Set when a worker claims the job; an expired lease makes a Running job claimable again.
+    claimed_by = models.CharField(max_length=100, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Report job {self.id} for PDF {self.pdf_id}"
+
+    class Meta:
+        db_table = 'report_jobs'
+        verbose_name_plural = "Report Jobs"
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                name='report_job_active_idx',
+                condition=models.Q(status__in=[JobStatus.QUEUED, JobStatus.RUNNING]),
+            ),
+        ]
+        constraints = [
+            # At most one queued or running job per PDF; enqueueing again returns that job.
+            models.UniqueConstraint(
+                fields=['pdf'],
+                name='report_job_one_active_per_pdf',
+                condition=models.Q(status__in=[JobStatus.QUEUED, JobStatus.RUNNING]),
+            ),
+        ]
+
+
+class Deficiency(models.Model):
+    """One entry of a report's deficiency_summary, with the report header fields copied alongside.
+
+    Written by the pipelines next to the report JSON in S3 (and by the
+    backfill_deficiencies command for older reports), so deficiencies can be
+    filtered and counted in SQL. uploaded_at is copied from the PDF to keep
+    date-range queries on this table alone.
+    """
+    pdf = models.ForeignKey(PDF, on_delete=models.CASCADE, related_name='deficiencies')
+    # Position in the report's deficiency_summary.
+    position = models.IntegerField()
+    status = models.CharField(max_length=100, blank=True, null=True)
+    severity = models.CharField(max_length=100, blank=True, null=True)
+    description = models.TextField(blank=True, null=True)
+    page_no = models.CharField(max_length=50, blank=True, null=True)
+    title = models.CharField(max_length=500, blank=True, null=True)
+    location = models.CharField(max_length=255, blank=True, null=True)
+    contact = models.CharField(max_length=255, blank=True, null=True)
+    inspector = models.CharField(max_length=255, blank=True, null=True)
+    uploaded_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Deficiency {self.position} of PDF {self.pdf_id}"
+
+    class Meta:
+        db_table = 'deficiencies'
+        verbose_name_plural = "Deficiencies"
+        indexes = [
+            # Listings are keyset-paginated on (uploaded_at, id), optionally narrowed by one of these columns.
+            models.Index(fields=['uploaded_at', 'id'], name='deficiency_uploaded_at_idx'),
+            models.Index(fields=['severity', 'uploaded_at'], name='deficiency_severity_idx'),
+            models.Index(fields=['status', 'uploaded_at'], name='deficiency_status_idx'),
+            models.Index(fields=['location', 'uploaded_at'], name='deficiency_location_idx'),
+            models.Index(fields=['location', 'severity', 'uploaded_at'], name='deficiency_loc_severity_idx'),
+        ]
@@ -1,12 +1,98 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from .models import PDF
-import json
+from .utils.aws import get_client
+
+# Columns behind PdfSerializer's fields; views that serialize PDFs load only these.
+PDF_COLUMNS = ('id', 'pdf_file', 'uploaded_at', 'status', 'deficiency_report')
+
+
 class PdfSerializer(serializers.ModelSerializer):
     request_id = serializers.CharField(source='id') 
     class Meta:
         model = PDF
-        # fields = ('request_id', 'pdf_file', 'uploaded_at', 'status', 'deficiency_report')  
-        exclude = ['id']
+        fields = ('request_id', 'pdf_file', 'uploaded_at', 'status', 'deficiency_report')
         
         # fields = '__all__'
-        # exclude=('id')
\ No newline at end of file
+        # exclude=('id')
+
+
+class FileUrlBuilder:
+    """Turn stored file names into URLs without a storage call per file.
+
+    With AWS_S3_CUSTOM_DOMAIN (and no CloudFront signing) S3Boto3Storage.url()
+    is the same prefix, location included, plus the quoted name, so the prefix
+    is taken once from storage.url(""). signed=True presigns each URL with
+    boto3 instead, since storage.url() never presigns on a custom domain.
+    """
+
+    def __init__(self, storage=None, signed=False):
+        self.storage = storage or default_storage
+        self.signed = signed
+        self.location = (getattr(self.storage, 'location', '') or '').strip('/')
+        custom_domain = getattr(self.storage, 'custom_domain', None)
+        cloudfront_signed = getattr(self.storage, 'querystring_auth', False) and getattr(self.storage, 'cloudfront_signer', None)
+        self.prefix = None
+        if custom_domain and not signed and not cloudfront_signed:
+            self.prefix = self.storage.url('').split('?')[0].rstrip('/') + '/'
+
+    def url(self, name):
+        if not name:
+            return None
+        if self.signed:
+            key = posixpath.join(self.location, name.lstrip('/'))
+            return get_client('s3').generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.storage.bucket_name, 'Key': key},
+                ExpiresIn=getattr(self.storage, 'querystring_expire', 3600),
+            )
+        if self.prefix is None:
+            return self.storage.url(name)
+        return self.prefix + filepath_to_uri(name.lstrip('/'))
+
+
+class PdfRowSerializer:
+    """PdfSerializer's output for list endpoints, built from .values() rows.
+
+    Skips model instantiation and DRF field machinery per row; the output
+    matches PdfSerializer field for field.
+    """
+    value_fields = PDF_COLUMNS
+
+    def __init__(self, signed=False):
+        self.urls = FileUrlBuilder(PDF._meta.get_field('pdf_file').storage, signed=signed)
+        self.datetime_field = serializers.DateTimeField()
+
+    def to_representation(self, row):
+        return {
+            'request_id': str(row['id']),
+            'pdf_file': self.urls.url(row['pdf_file']),
+            'uploaded_at': self.datetime_field.to_representation(row['uploaded_at']),
+            'status': row['status'],
+            'deficiency_report': self.urls.url(row['deficiency_report']),
+        }
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class DeficiencyRowSerializer:
+    """Deficiency rows for the deficiency list endpoint, built from .values() rows."""
+    value_fields = ('id', 'pdf_id', 'position', 'status', 'severity', 'description', 'page_no',
+                    'title', 'location', 'contact', 'inspector', 'uploaded_at')
+
+    def __init__(self):
+        self.datetime_field = serializers.DateTimeField()
+
+    def to_representation(self, row):
+        return dict(
+            row,
+            pdf_id=str(row['pdf_id']),
+            uploaded_at=self.datetime_field.to_representation(row['uploaded_at']),
+        )
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
@@ -2,12 +2,22 @@
 from django.urls import path
 from django.conf import settings
 
-from .views import upload_pdf, get_pdf, get_deficiency_report, generate_deficiency_report
+from . import async_views
+from .views import (upload_pdf, create_upload, complete_upload, get_pdf, get_deficiency_report, generate_deficiency_report, get_report_job, get_metrics_summary,
+                    get_deficiencies, get_deficiency_summary)
 
 urlpatterns = [
     path('upload-pdf/', upload_pdf, name='upload_pdf'),
+    path('create-upload/', create_upload, name='create_upload'),
+    path('complete-upload/<str:id>/', complete_upload, name='complete_upload'),
     # path('upload-multiple-pdfs/', upload_multiple_pdfs, name='upload_pdf'),
     path('get-pdf/<str:start_date>/<str:end_date>/', get_pdf, name='get_pdf'),
     path('generate-deficiency-report/<str:id>/',generate_deficiency_report),
+    path('report-jobs/<str:job_id>/', get_report_job, name='get_report_job'),
     path('get-deficiency-report/<str:id>/',get_deficiency_report),
+    path('async/generate-deficiency-report/<str:id>/', async_views.generate_deficiency_report),
+    path('async/get-deficiency-report/<str:id>/', async_views.get_deficiency_report),
+    path('get-metrics-summary/<str:start_date>/<str:end_date>/', get_metrics_summary, name='get_metrics_summary'),
+    path('deficiencies/', get_deficiencies, name='get_deficiencies'),
+    path('deficiencies/summary/', get_deficiency_summary, name='get_deficiency_summary'),
 ]
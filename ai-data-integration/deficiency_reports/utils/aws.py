@@ -0,0 +1,16 @@
+import boto3
+from django.conf import settings
+
+_clients = {}
+
+
+def get_client(service):
+    """boto3 client for service, created once per process and shared across requests."""
+    if service not in _clients:
+        _clients[service] = boto3.client(
+            service,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME,
+        )
+    return _clients[service]
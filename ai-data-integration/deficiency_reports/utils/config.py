@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,7 +21,26 @@ PROMPT="""
             Status: "null" if missing.
             Severity: Severity level.
             Description: Full description, excluding phrases like "see attachment. and also the question statement"
+            Page Number:  Each page of the report text starts with a marker like "--- Page 7 ---"; use the number from these markers. The page number where the deficiency **concludes** (not where it starts, but where the deficiency description **ends**). The page number will typically appear **after** the end of the deficiency text, especially when the report moves to a new section or comments are added. If the page number is given after a deficiency, that deficiency belongs to that page.
             Note: Include entries with "null" fields if data is missing. Process each deficiency individually.
             below mentioned is the sample response 
-            {'title': 'Form for Inspection, Testing and Maintenance of Fire Pumps', 'location': 'EANLUBF', 'deficiency_summary': [{'status': None, 'severity': 'Impairment', 'description': 'II.A.1 1. Pump house/room proper temperature? Pump house/room is not in proper temperature.'}, {'status': None, 'severity': 'Critical', 'description': 'II.A.8 8. Waterflow test valves in closed position? Waterflow test valves are not in closed position'}]}
-            """.strip()
\ No newline at end of file
+            {'title': 'Form for Inspection, Testing and Maintenance of Fire Pumps', 'location': 'EANLUBF', 'deficiency_summary': [{'status': None, 'severity': 'Impairment', 'description': 'II.A.1 1. Pump house/room proper temperature? Pump house/room is not in proper temperature.'}, {'status': None, 'severity': 'Critical', 'description': 'II.A.8 8. Waterflow test valves in closed position? Waterflow test valves are not in closed position',page_no:10}]}
+            """.strip()
+
+# Part of the report cache key: changing the prompt (or setting PROMPT_VERSION) invalidates cached reports.
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", hashlib.sha256(PROMPT.encode()).hexdigest()[:12])
+
+# OpenAI prices in USD per 1M tokens, used for the cost column of pdf_metrics (defaults: gpt-4o).
+INPUT_TOKEN_PRICE = float(os.getenv("INPUT_TOKEN_PRICE", "2.50"))
+OUTPUT_TOKEN_PRICE = float(os.getenv("OUTPUT_TOKEN_PRICE", "10.00"))
+
+# Client-side OpenAI rate limits (requests / tokens per minute). 0 means learn them from the
+# x-ratelimit-* response headers. OUTPUT_TOKEN_ESTIMATE is added to each request's prompt estimate.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "0"))
+OUTPUT_TOKEN_ESTIMATE = int(os.getenv("OUTPUT_TOKEN_ESTIMATE", "1000"))
+
+# Text extraction is CPU-bound; the async generator runs it in this many spawned processes
+# to keep the event loop free (0 = one per CPU). Named apart from the Lambda's EXTRACT_PROCESSES,
+# where 0 turns the pool off.
+ASYNC_EXTRACT_PROCESSES = int(os.getenv("ASYNC_EXTRACT_PROCESSES", "0")) or None
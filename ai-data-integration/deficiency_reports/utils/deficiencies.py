@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from ..models import Deficiency
+
+BULK_CREATE_BATCH_SIZE = 1000
+# Columns get_deficiency_summary can group by.
+GROUP_BY_FIELDS = ('severity', 'status', 'location', 'inspector')
+# Query parameters matched exactly against a column; severity and status are stored title-cased.
+FILTER_FIELDS = {'severity': True, 'status': True, 'location': False, 'inspector': False, 'pdf_id': False}
+
+
+def clean_field(value, max_length=None, title_case=False):
+    """Trimmed text for a Deficiency column; blanks and "null" become None.
+
+    Severity and status are title-cased so filters match however the model
+    capitalised them. The Lambda's db_manager.deficiency_rows does the same.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or value.lower() == 'null':
+        return None
+    return (value.title() if title_case else value)[:max_length]
+
+
+def build_deficiencies(pdf, report):
+    """Unsaved Deficiency rows for a parsed report dict, header fields copied onto each."""
+    header = {
+        'title': clean_field(report.get('title'), 500),
+        'location': clean_field(report.get('location'), 255),
+        'contact': clean_field(report.get('contact'), 255),
+        'inspector': clean_field(report.get('inspector'), 255),
+    }
+    return [
+        Deficiency(
+            pdf_id=pdf.id,
+            position=position,
+            status=clean_field(deficiency.get('status'), 100, title_case=True),
+            severity=clean_field(deficiency.get('severity'), 100, title_case=True),
+            description=clean_field(deficiency.get('description')),
+            page_no=clean_field(deficiency.get('page_no'), 50),
+            uploaded_at=pdf.uploaded_at,
+            **header,
+        )
+        for position, deficiency in enumerate(report.get('deficiency_summary') or [])
+    ]
+
+
+def replace_deficiencies(rows_by_pdf):
+    """Replace the Deficiency rows of every PDF in {pdf_id: rows} in one transaction."""
+    rows = [row for pdf_rows in rows_by_pdf.values() for row in pdf_rows]
+    with transaction.atomic():
+        Deficiency.objects.filter(pdf_id__in=list(rows_by_pdf)).delete()
+        Deficiency.objects.bulk_create(rows, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(rows)
+
+
+def store_deficiencies(pdf, report):
+    return replace_deficiencies({pdf.id: build_deficiencies(pdf, report)})
+
+
+def copy_deficiencies(pdf, content_hash):
+    """Give pdf the Deficiency rows of another PDF whose (cached) report it reuses."""
+    source = (
+        Deficiency.objects.filter(pdf__content_hash=content_hash)
+        .exclude(pdf_id=pdf.id)
+        .values_list('pdf_id', flat=True)
+        .first()
+    )
+    if source is None:
+        return 0
+    rows = []
+    for row in Deficiency.objects.filter(pdf_id=source).order_by('position'):
+        row.pk = None
+        row.pdf_id = pdf.id
+        row.uploaded_at = pdf.uploaded_at
+        rows.append(row)
+    return replace_deficiencies({pdf.id: rows})
+
+
+def filter_deficiencies(params):
+    """Deficiencies matching the request's filters.
+
+    start_date / end_date (YYYY-MM-DD, inclusive) become a half-open range on
+    uploaded_at; the other filters are exact matches. Raises ValueError on bad
+    dates.
+    """
+    queryset = Deficiency.objects.all()
+    if params.get('start_date'):
+        start = timezone.make_aware(datetime.strptime(params['start_date'], '%Y-%m-%d'))
+        queryset = queryset.filter(uploaded_at__gte=start)
+    if params.get('end_date'):
+        end = timezone.make_aware(datetime.strptime(params['end_date'], '%Y-%m-%d') + timedelta(days=1))
+        queryset = queryset.filter(uploaded_at__lt=end)
+    for field, title_case in FILTER_FIELDS.items():
+        if params.get(field):
+            queryset = queryset.filter(**{field: clean_field(params[field], title_case=title_case)})
+    return queryset
+
+
+def deficiency_summary(queryset, group_by):
+    """Deficiency counts per value of group_by, largest first."""
+    return list(
+        queryset.values(group_by)
+        .annotate(count=Count('id'), pdfs=Count('pdf_id', distinct=True))
+        .order_by('-count', group_by)
+    )
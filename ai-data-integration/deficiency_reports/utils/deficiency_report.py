@@ -1,26 +1,55 @@
-import fitz
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
 from dotenv import load_dotenv
 import instructor
 from django.conf import settings
-import os
 import json
 import boto3
-import os
-import re
 from .config import *
+from .report_cache import ReportCache
+from .rate_limiter import openai_limiter
+from .deficiencies import copy_deficiencies, store_deficiencies
+from .pdf_text import clean_text, extract_page_texts, open_pdf
 import logging
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
 from django.core.files.base import ContentFile
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+PAGE_MARKER = "--- Page {} ---"
+# instructor retries for the current call; a context variable so threads and asyncio tasks each count their own.
+RETRIES = ContextVar("instructor_retries", default=0)
+_extract_executor = None
+_extract_executor_lock = threading.Lock()
+
+
+def get_extract_executor():
+    """The page extraction pool, created on first use and shared by every request.
+
+    Spawned rather than forked: the server process runs threads (the event loop's
+    executors, DB and HTTP clients), and a forked child can inherit their locks held.
+    """
+    global _extract_executor
+    with _extract_executor_lock:
+        if _extract_executor is None:
+            _extract_executor = ProcessPoolExecutor(
+                max_workers=ASYNC_EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extract_executor
+
 class DeficiencySummary(BaseModel):
     status: Optional[str] = Field(default=None, description="Status of the deficiency.")
     severity: Optional[str] = Field(default=None, description="Severity of the deficiency.")
     description: Optional[str] = Field(default=None, description="Complete description of the deficiency.")
+    page_no: Optional[str] = Field(default=None, description="page number of the deficiency report.")
     # comments: Optional[str] = Field(default=None, description="Comments related to the deficiency.")
 
 class InspectionReport(BaseModel):
@@ -32,54 +61,122 @@ class InspectionReport(BaseModel):
 
 class DeficiencyReportGenerator:
     def __init__(self):
-        self.client = instructor.from_openai(OpenAI(api_key=OPENAI_API_KEY))
+        # Every response feeds its x-ratelimit-* headers and 429s back into the shared limiter.
+        self.client = instructor.from_openai(OpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=DefaultHttpxClient(event_hooks={"response": [openai_limiter.on_response]}),
+        ))
         self.s3_client = boto3.client('s3')
+        self.report_cache = ReportCache()
+        self.client.on("parse:error", self.count_retry)
         logger.info("DeficiencyReportGenerator initialized with OpenAI and S3 clients")
 
+    def count_retry(self, *args, **kwargs):
+        RETRIES.set(RETRIES.get() + 1)
+
     def clean_text(self, text: str) -> str:
-        cleaned_text = re.sub(r'\s+', ' ', text).strip()
-        logger.debug(f"Text cleaned: {cleaned_text[:100]}...")  # Log first 100 chars
-        return cleaned_text
-
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from a local PDF file."""
-        logger.info(f"Extracting text from PDF at path: {pdf_path}")
-        all_text = ""
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text = page.get_text()
-                all_text += text
-        logger.info("Text extraction completed from PDF")
-        return self.clean_text(all_text)
-
-    def generate_report(self, pdf_path: str, pdf):
+        return clean_text(text)
+
+    def open_pdf(self, pdf_source):
+        return open_pdf(pdf_source)
+
+    def extract_pages(self, pdf_source) -> List[str]:
+        """Extract the cleaned text of every page, one string per page."""
+        logger.info("Extracting text from PDF")
+        pages = extract_page_texts(pdf_source)
+        logger.info(f"Text extraction completed from PDF ({len(pages)} pages)")
+        return pages
+
+    def join_pages(self, pages: List[str]) -> str:
+        """Join page texts once, prefixing each with a page-boundary marker."""
+        return "\n".join(f"{PAGE_MARKER.format(number)}\n{text}" for number, text in enumerate(pages, start=1))
+
+    def extract_text_from_pdf(self, pdf_source) -> str:
+        """Extract text from PDF bytes or a local PDF file."""
+        return self.join_pages(self.extract_pages(pdf_source))
+
+    def generate_report(self, pdf_source, pdf, metrics=None):
         logger.info(f"Starting report generation for PDF ID: {pdf.id}")
-        
+
+        try:
+            content_hash = self.report_cache.compute_key(pdf_source)
+        except FileNotFoundError as e:
+            logger.error(f"Error accessing PDF file: {e}")
+            raise Exception(f"Error accessing file: {e}")
+
+        cached_report = self.report_cache.lookup(content_hash)
+        if cached_report:
+            pdf.deficiency_report.name = cached_report
+            pdf.content_hash = content_hash
+            pdf.save()
+            self.index_deficiencies(pdf, content_hash=content_hash)
+            logger.info(f"Reused cached report {cached_report} for PDF ID {pdf.id}, cache stats: {self.report_cache.stats()}")
+            return pdf
+
         try:
-            text = self.extract_text_from_pdf(pdf_path)
+            with metrics.stage("extract") if metrics else nullcontext():
+                pages = self.extract_pages(pdf_source)
+            text = self.join_pages(pages)
+            if metrics:
+                metrics.page_count = len(pages)
         except FileNotFoundError as e:
             logger.error(f"Error accessing PDF file: {e}")
             raise Exception(f"Error accessing file: {e}")
 
-        prompt = PROMPT
-        
-        messages = [
-            {"role": "system", "content": prompt},
+        messages = self.build_messages(text)
+        openai_limiter.acquire(self.estimate_tokens(messages))
+        RETRIES.set(0)
+        with metrics.stage("llm") if metrics else nullcontext():
+            response, completion = self.client.chat.completions.create_with_completion(
+                model=MODEL,
+                messages=messages,
+                response_model=InspectionReport,
+                temperature=0,
+            )
+        self.record_usage(completion, metrics)
+
+        report_content = self.format_report(response, pdf)
+        report_filename = f"{pdf.id}_report.json"
+
+        pdf.content_hash = content_hash
+        with metrics.stage("upload") if metrics else nullcontext():
+            pdf.deficiency_report.save(report_filename, ContentFile(report_content))
+        pdf.save()
+        self.index_deficiencies(pdf, json.loads(report_content))
+
+        logger.info(f"Deficiency report saved for PDF ID {pdf.id} at {pdf.deficiency_report.url}")
+        return pdf
+
+    def build_messages(self, text):
+        return [
+            {"role": "system", "content": PROMPT},
             {"role": "user", "content": text},
         ]
 
-        response = self.client.chat.completions.create(
-            model=MODEL,
-            messages=messages,
-            response_model=InspectionReport,
-            temperature=0,
-        )
-        
-        # pdf_name = f'reports/{pdf.id}.json'
-        # report_path = os.path.join(settings.MEDIA_ROOT, pdf_name)
-        # logger.info(f"Generated report path: {report_path}")
-
-        report = response.dict()
+    def estimate_tokens(self, messages):
+        return sum(len(message["content"]) for message in messages) // 4 + OUTPUT_TOKEN_ESTIMATE
+
+    def record_usage(self, completion, metrics):
+        if metrics:
+            usage = getattr(completion, "usage", None)
+            metrics.add_usage(getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), RETRIES.get())
+
+    def index_deficiencies(self, pdf, report=None, content_hash=None):
+        """Write the report's Deficiency rows; the report in S3 stays the source of truth.
+
+        Failures are logged, not raised: backfill_deficiencies fills any gaps.
+        """
+        try:
+            if report is not None:
+                store_deficiencies(pdf, report)
+            else:
+                copy_deficiencies(pdf, content_hash)
+        except Exception as e:
+            logger.error(f"Error storing deficiencies for PDF ID {pdf.id}: {e}")
+
+    def format_report(self, response, pdf):
+        """The stored report JSON: the parsed model with newlines in descriptions flattened."""
+        report = response.model_dump()
         logger.info(f"Report generated for PDF ID: {pdf.id}, report content: {report}")
 
         for deficiency in report.get('deficiency_summary', []):
@@ -87,12 +184,69 @@ class DeficiencyReportGenerator:
             deficiency["description"] = description.replace('\n', '.') if description else "null"
             logger.debug(f"Processed deficiency: {deficiency}")
 
-        report_content = json.dumps(report, indent=4)
+        return json.dumps(report, indent=4)
 
-        report_filename = f"{pdf.id}_report.json"
 
-        pdf.deficiency_report.save(report_filename, ContentFile(report_content))
-        pdf.save()
+class AsyncDeficiencyReportGenerator(DeficiencyReportGenerator):
+    """DeficiencyReportGenerator for async views: AsyncOpenAI for the completion, and
+    extraction, hashing, S3 and ORM work moved off the event loop."""
 
-        logger.info(f"Deficiency report saved for PDF ID {pdf.id} at {pdf.deficiency_report.url}")
-        return pdf
\ No newline at end of file
+    def __init__(self):
+        self.client = instructor.from_openai(AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=DefaultAsyncHttpxClient(event_hooks={"response": [openai_limiter.aon_response]}),
+        ))
+        self.report_cache = ReportCache()
+        self.client.on("parse:error", self.count_retry)
+        logger.info("AsyncDeficiencyReportGenerator initialized with AsyncOpenAI client")
+
+    async def aextract_pages(self, pdf_source) -> List[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_extract_executor(), extract_page_texts, pdf_source)
+        except OSError as e:
+            # No process support (e.g. restricted containers): a thread still keeps the loop responsive.
+            logger.warning(f"Process pool unavailable, extracting in a thread: {e}")
+            return await asyncio.to_thread(extract_page_texts, pdf_source)
+
+    async def agenerate_report(self, pdf_source, pdf, metrics=None):
+        logger.info(f"Starting async report generation for PDF ID: {pdf.id}")
+        content_hash = await asyncio.to_thread(self.report_cache.compute_key, pdf_source)
+
+        cached_report = await sync_to_async(self.report_cache.lookup)(content_hash)
+        if cached_report:
+            pdf.deficiency_report.name = cached_report
+            pdf.content_hash = content_hash
+            await pdf.asave()
+            await sync_to_async(self.index_deficiencies)(pdf, content_hash=content_hash)
+            logger.info(f"Reused cached report {cached_report} for PDF ID {pdf.id}")
+            return pdf
+
+        with metrics.stage("extract") if metrics else nullcontext():
+            pages = await self.aextract_pages(pdf_source)
+        if metrics:
+            metrics.page_count = len(pages)
+
+        messages = self.build_messages(self.join_pages(pages))
+        await openai_limiter.aacquire(self.estimate_tokens(messages))
+        RETRIES.set(0)
+        with metrics.stage("llm") if metrics else nullcontext():
+            response, completion = await self.client.chat.completions.create_with_completion(
+                model=MODEL,
+                messages=messages,
+                response_model=InspectionReport,
+                temperature=0,
+            )
+        self.record_usage(completion, metrics)
+
+        report_content = self.format_report(response, pdf)
+        pdf.content_hash = content_hash
+        with metrics.stage("upload") if metrics else nullcontext():
+            # The S3 upload does no ORM work, so it can run outside the thread-sensitive executor.
+            await sync_to_async(pdf.deficiency_report.save, thread_sensitive=False)(
+                f"{pdf.id}_report.json", ContentFile(report_content), save=False
+            )
+        await pdf.asave()
+        await sync_to_async(self.index_deficiencies)(pdf, json.loads(report_content))
+        logger.info(f"Deficiency report saved for PDF ID {pdf.id}")
+        return pdf
@@ -0,0 +1,27 @@
+import json
+import logging
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+
+from .aws import get_client
+
+logger = logging.getLogger(__name__)
+
+
+def publish_pdf_uploaded(pdf_id):
+    """Notify the processing Lambda that a PDF is ready.
+
+    Publishing is best effort: the row is already stored as Not Processed, so a
+    failed send only means the PDF waits for the next scheduled run.
+    """
+    queue_url = settings.PDF_EVENTS_QUEUE_URL
+    if not queue_url:
+        return False
+    try:
+        get_client('sqs').send_message(QueueUrl=queue_url, MessageBody=json.dumps({'pdf_id': str(pdf_id)}))
+        logger.info(f"Published upload event for PDF {pdf_id}")
+        return True
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"Failed to publish upload event for PDF {pdf_id}: {e}")
+        return False
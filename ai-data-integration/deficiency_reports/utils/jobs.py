@@ -0,0 +1,229 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .aws import get_client
+from .deficiency_report import DeficiencyReportGenerator
+from .metrics import PipelineMetrics
+from ..models import PDF, PDFStatus, ReportJob, JobStatus
+from ..serializers import PdfSerializer
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+def enqueue_report_job(pdf, callback_url=None):
+    """Queue report generation for pdf, or return the job already queued or running for it.
+
+    Returns (job, created). The partial unique constraint on report_jobs makes
+    this safe against concurrent requests for the same PDF.
+    """
+    existing = ReportJob.objects.filter(pdf=pdf, status__in=ACTIVE_STATUSES).first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(pdf=pdf, callback_url=callback_url), True
+    except IntegrityError:
+        return ReportJob.objects.get(pdf=pdf, status__in=ACTIVE_STATUSES), False
+
+
+def claim_next_job(worker_id):
+    """Claim the oldest available job, skipping rows other workers have locked."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.QUEUED, available_at__lte=now)
+                | Q(status=JobStatus.RUNNING, lease_expires_at__lt=now)
+            )
+            .order_by('available_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = JobStatus.RUNNING
+        job.claimed_by = worker_id
+        job.lease_expires_at = now + timedelta(seconds=settings.REPORT_JOB_LEASE_SECONDS)
+        job.attempts += 1
+        job.started_at = now
+        job.save(update_fields=['status', 'claimed_by', 'lease_expires_at', 'attempts', 'started_at'])
+    return job
+
+
+def claim_pdf(pdf, claimed_by):
+    """Take the PDF's processing lease, unless the Lambda or another worker holds a live one."""
+    now = timezone.now()
+    return PDF.objects.filter(id=pdf.id).filter(
+        ~Q(status=PDFStatus.PROCESSING) | Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+    ).update(
+        status=PDFStatus.PROCESSING,
+        claimed_by=claimed_by,
+        lease_expires_at=now + timedelta(seconds=settings.REPORT_JOB_LEASE_SECONDS),
+    )
+
+
+@contextmanager
+def renew_lease(job):
+    """Keep extending the job's and its PDF's leases while the body runs.
+
+    A report can take longer than REPORT_JOB_LEASE_SECONDS; without renewal
+    claim_next_job would hand the still-running job to a second worker. The
+    leases are extended every third of the lease, and only while this worker
+    still holds them.
+    """
+    lease = timedelta(seconds=settings.REPORT_JOB_LEASE_SECONDS)
+    stopped = threading.Event()
+
+    def renew():
+        try:
+            while not stopped.wait(lease.total_seconds() / 3):
+                expires = timezone.now() + lease
+                ReportJob.objects.filter(id=job.id, status=JobStatus.RUNNING, claimed_by=job.claimed_by).update(lease_expires_at=expires)
+                PDF.objects.filter(id=job.pdf_id, status=PDFStatus.PROCESSING, claimed_by=f"job:{job.id}").update(lease_expires_at=expires)
+        except Exception as e:
+            logger.error(f"Could not renew the lease of job {job.id}: {e}")
+        finally:
+            connection.close()
+
+    renewer = threading.Thread(target=renew, name=f"lease-{job.id}", daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        renewer.join()
+
+
+def finish_job(job, status, error=None):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.lease_expires_at = None
+    job.save(update_fields=['status', 'error', 'finished_at', 'lease_expires_at'])
+    send_webhook(job)
+
+
+def run_job(job, report_generator=None):
+    """Generate the report for a claimed job and record the outcome."""
+    pdf = job.pdf
+    if pdf.deficiency_report:
+        finish_job(job, JobStatus.SUCCEEDED)
+        return job
+
+    if not claim_pdf(pdf, f"job:{job.id}"):
+        # Someone else is processing this PDF; look again once their lease is up.
+        pdf.refresh_from_db()
+        logger.info(f"PDF ID {pdf.id} is being processed by {pdf.claimed_by}; deferring job {job.id}")
+        job.status = JobStatus.QUEUED
+        job.attempts -= 1
+        job.available_at = pdf.lease_expires_at or timezone.now()
+        job.save(update_fields=['status', 'attempts', 'available_at'])
+        return job
+
+    pdf.refresh_from_db()
+    metrics = PipelineMetrics(source="api")
+    try:
+        with renew_lease(job):
+            with metrics.stage("download"):
+                pdf_bytes = get_client('s3').get_object(
+                    Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=pdf.pdf_file.name
+                )['Body'].read()
+            (report_generator or DeficiencyReportGenerator()).generate_report(pdf_bytes, pdf, metrics)
+    except Exception as e:
+        logger.error(f"Job {job.id} failed for PDF ID {pdf.id} (attempt {job.attempts}): {e}")
+        metrics.save(pdf, PDFStatus.PROCESS_FAILED)
+        if job.attempts < settings.REPORT_JOB_MAX_ATTEMPTS:
+            PDF.objects.filter(id=pdf.id).update(status=PDFStatus.NOT_PROCESSED, claimed_by=None, lease_expires_at=None)
+            job.status = JobStatus.QUEUED
+            job.error = str(e)
+            job.available_at = timezone.now() + timedelta(seconds=settings.REPORT_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            job.lease_expires_at = None
+            job.save(update_fields=['status', 'error', 'available_at', 'lease_expires_at'])
+        else:
+            PDF.objects.filter(id=pdf.id).update(status=PDFStatus.PROCESS_FAILED, claimed_by=None, lease_expires_at=None)
+            finish_job(job, JobStatus.FAILED, str(e))
+        return job
+
+    PDF.objects.filter(id=pdf.id).update(status=PDFStatus.PROCESS_SUCCESS, claimed_by=None, lease_expires_at=None)
+    metrics.save(pdf, PDFStatus.PROCESS_SUCCESS)
+    logger.info(f"Job {job.id} generated the report for PDF ID {pdf.id}")
+    finish_job(job, JobStatus.SUCCEEDED)
+    return job
+
+
+def job_payload(job):
+    return {
+        'job_id': str(job.id),
+        'request_id': str(job.pdf_id),
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'pdf': PdfSerializer(PDF.objects.get(id=job.pdf_id)).data if job.status == JobStatus.SUCCEEDED else None,
+    }
+
+
+def validate_callback_url(callback_url):
+    """Raise ValidationError unless callback_url is a public http(s) URL and, when an allowlist is configured, on it.
+
+    The host is resolved and every address it resolves to must be public, so
+    callbacks cannot reach the instance metadata service (169.254.169.254),
+    localhost or the private network, allowlisted or not.
+    """
+    URLValidator(schemes=['http', 'https'])(callback_url)
+    host = urlparse(callback_url).hostname
+    allowed_hosts = settings.REPORT_WEBHOOK_ALLOWED_HOSTS
+    if allowed_hosts and host not in allowed_hosts:
+        raise ValidationError(f"callback_url host is not allowed: {host}")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise ValidationError(f"callback_url host does not resolve: {host}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise ValidationError(f"callback_url host resolves to a non-public address: {host}")
+
+
+def send_webhook(job):
+    """POST the job result to its callback_url; signed with REPORT_WEBHOOK_SECRET when set. Best effort."""
+    if not job.callback_url:
+        return False
+    try:
+        # Checked again at send time: the host may resolve elsewhere than when the job was queued.
+        validate_callback_url(job.callback_url)
+    except ValidationError as e:
+        logger.error(f"Webhook for job {job.id} to {job.callback_url} refused: {e.message}")
+        return False
+    body = json.dumps(job_payload(job)).encode()
+    headers = {'Content-Type': 'application/json'}
+    if settings.REPORT_WEBHOOK_SECRET:
+        signature = hmac.new(settings.REPORT_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        headers['X-Signature-SHA256'] = signature
+    try:
+        response = requests.post(
+            job.callback_url, data=body, headers=headers, timeout=settings.REPORT_WEBHOOK_TIMEOUT, allow_redirects=False
+        )
+        response.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        logger.error(f"Webhook for job {job.id} to {job.callback_url} failed: {e}")
+        return False
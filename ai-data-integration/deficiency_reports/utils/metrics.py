@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.db import connection
+from django.utils import timezone
+from .config import MODEL, INPUT_TOKEN_PRICE, OUTPUT_TOKEN_PRICE
+from ..models import PDFMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineMetrics:
+    """Stage timings, token usage and retries for one report generation."""
+
+    STAGES = ("download", "extract", "llm", "upload")
+
+    def __init__(self, source="api"):
+        self.source = source
+        self.timings = {}
+        self.page_count = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = int((time.perf_counter() - start) * 1000)
+            with self.lock:
+                self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def add_usage(self, prompt_tokens, completion_tokens, retries=0):
+        with self.lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.retries += retries
+
+    @property
+    def cost_usd(self):
+        return (self.prompt_tokens * INPUT_TOKEN_PRICE + self.completion_tokens * OUTPUT_TOKEN_PRICE) / 1_000_000
+
+    def save(self, pdf, status):
+        """Persist the metrics row; failures are logged, never raised."""
+        try:
+            return PDFMetrics.objects.create(
+                pdf=pdf,
+                source=self.source,
+                status=status,
+                model=MODEL,
+                page_count=self.page_count,
+                prompt_tokens=self.prompt_tokens,
+                completion_tokens=self.completion_tokens,
+                retries=self.retries,
+                cost_usd=round(self.cost_usd, 6),
+                total_ms=int((time.perf_counter() - self.started) * 1000),
+                **{f"{stage}_ms": self.timings.get(stage) for stage in self.STAGES},
+            )
+        except Exception as e:
+            logger.error(f"Error recording metrics for PDF ID {pdf.id}: {e}")
+
+
+def metrics_summary(start, end, source=None):
+    """p50/p95 per stage plus token and cost totals for runs in [start, end)."""
+    columns = [f"{stage}_ms" for stage in PipelineMetrics.STAGES] + ["total_ms"]
+    percentiles = ", ".join(
+        f"percentile_cont(0.5) WITHIN GROUP (ORDER BY {column}), "
+        f"percentile_cont(0.95) WITHIN GROUP (ORDER BY {column})"
+        for column in columns
+    )
+    query = f"""
+        SELECT count(*), {percentiles},
+               coalesce(sum(page_count), 0), coalesce(sum(prompt_tokens), 0),
+               coalesce(sum(completion_tokens), 0), coalesce(sum(retries), 0), coalesce(sum(cost_usd), 0)
+        FROM pdf_metrics
+        WHERE created_at >= %s AND created_at < %s
+    """
+    params = [timezone.make_aware(start), timezone.make_aware(end)]
+    if source:
+        query += " AND source = %s"
+        params.append(source)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+
+    summary = {"runs": row[0], "stages": {}}
+    for index, column in enumerate(columns):
+        p50, p95 = row[1 + 2 * index], row[2 + 2 * index]
+        summary["stages"][column] = {"p50": p50, "p95": p95}
+    pages, prompt_tokens, completion_tokens, retries, cost = row[1 + 2 * len(columns):]
+    summary.update({
+        "pages": pages,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "retries": retries,
+        "cost_usd": float(cost),
+    })
+    return summary
@@ -0,0 +1,70 @@
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(uploaded_at, pk):
+    raw = json.dumps([uploaded_at.isoformat(), str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, pk_type=uuid.UUID):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, pk = json.loads(raw)
+        uploaded_at = parse_datetime(uploaded_at)
+        pk = pk_type(pk)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if uploaded_at is None:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return uploaded_at, pk
+
+
+def parse_page_size(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    size = int(value)
+    if size < 1:
+        raise ValueError(f"limit must be positive, got {size}")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, pk_type=uuid.UUID):
+    """One page of a .values() queryset ordered by (uploaded_at, id), starting after cursor.
+
+    Seeks straight to the cursor position instead of using OFFSET, so later
+    pages cost the same as the first. pk_type parses the id in the cursor.
+    Returns the rows and the cursor for the next page, or None when this is
+    the last one.
+    """
+    queryset = queryset.order_by('uploaded_at', 'id')
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor, pk_type)
+        queryset = queryset.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=pk))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1]['uploaded_at'], rows[-1]['id'])
+
+
+def stream_json_array(queryset, to_representation):
+    """Yield a JSON array of serialized rows as they are fetched from the database."""
+    encoder = JSONEncoder()
+    yield '['
+    for index, row in enumerate(queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)):
+        yield (',' if index else '') + encoder.encode(to_representation(row))
+    yield ']'
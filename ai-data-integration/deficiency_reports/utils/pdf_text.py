@@ -0,0 +1,26 @@
+import re
+from typing import List
+
+import fitz
+
+# Kept free of Django imports: extract_page_texts runs in spawned worker processes,
+# which import this module without Django being set up.
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def clean_text(text: str) -> str:
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def open_pdf(pdf_source):
+    """Open a PDF from in-memory bytes or from a local path."""
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf_source, filetype="pdf")
+    return fitz.open(pdf_source)
+
+
+def extract_page_texts(pdf_source) -> List[str]:
+    """Cleaned text of every page, one string per page."""
+    with open_pdf(pdf_source) as doc:
+        return [clean_text(page.get_text()) for page in doc]
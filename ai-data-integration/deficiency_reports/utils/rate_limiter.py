@@ -0,0 +1,137 @@
+# Source of truth for the OpenAI rate limiter. ai-data-integration-lambda/src/rate_limiter.py
+# is a copy (the Lambda image is built from its own directory and cannot import this one);
+# it differs only in the config import, and the Lambda tests fail when the two drift apart.
+import asyncio
+import re
+import threading
+import time
+from .config import OPENAI_RPM, OPENAI_TPM
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value, default=1.0):
+    """Parse OpenAI reset/retry durations such as "20ms", "1s" or "6m0s" into seconds."""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        parts = DURATION_PART.findall(value)
+        return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts) if parts else default
+
+
+class RateLimiter:
+    """Client-side token bucket for OpenAI requests per minute and tokens per minute.
+
+    acquire() blocks until one request and the estimated tokens fit in both
+    buckets. The limits start from OPENAI_RPM/OPENAI_TPM (0 = unknown) and are
+    corrected from the x-ratelimit-* headers of every response. A 429 pauses
+    all callers until the server's retry-after has passed and halves the
+    refill rate, which then recovers gradually on successful responses, so
+    concurrent workers back off together instead of retrying in a storm.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.lock = threading.Lock()
+        self.request_limit = requests_per_minute
+        self.token_limit = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.throttle = 1.0
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        if self.request_limit:
+            self.requests = min(self.request_limit, self.requests + elapsed * self.request_limit / 60 * self.throttle)
+        if self.token_limit:
+            self.tokens = min(self.token_limit, self.tokens + elapsed * self.token_limit / 60 * self.throttle)
+
+    def try_acquire(self, tokens, started):
+        """Take one request and the tokens if both buckets allow it; otherwise return the seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            wait = self.blocked_until - now
+            if wait <= 0:
+                # A single request larger than the whole bucket still has to go through eventually.
+                needed = min(tokens, self.token_limit) if self.token_limit else 0
+                has_request = not self.request_limit or self.requests >= 1
+                has_tokens = not self.token_limit or self.tokens >= needed
+                if has_request and has_tokens:
+                    if self.request_limit:
+                        self.requests -= 1
+                    if self.token_limit:
+                        self.tokens -= needed
+                    self.waited += now - started
+                    return 0
+                wait = max(
+                    (1 - self.requests) * 60 / (self.request_limit * self.throttle) if not has_request else 0,
+                    (needed - self.tokens) * 60 / (self.token_limit * self.throttle) if not has_tokens else 0,
+                )
+        return min(max(wait, 0.01), 5)
+
+    def acquire(self, tokens):
+        started = time.monotonic()
+        while wait := self.try_acquire(tokens, started):
+            time.sleep(wait)
+
+    async def aacquire(self, tokens):
+        """acquire() for coroutines: waits on the event loop instead of blocking it."""
+        started = time.monotonic()
+        while wait := self.try_acquire(tokens, started):
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers):
+        with self.lock:
+            self.refill(time.monotonic())
+            for bucket, limit_attr in (("requests", "request_limit"), ("tokens", "token_limit")):
+                known = getattr(self, limit_attr)
+                limit = headers.get(f"x-ratelimit-limit-{bucket}")
+                remaining = headers.get(f"x-ratelimit-remaining-{bucket}")
+                if limit and limit.isdigit():
+                    setattr(self, limit_attr, int(limit))
+                if remaining and remaining.isdigit():
+                    # Other clients share the account limit, so never assume more than the
+                    # server reports; the first response of an unknown limit sets the level.
+                    level = int(remaining) if not known else min(getattr(self, bucket), int(remaining))
+                    setattr(self, bucket, float(level))
+
+    def on_response(self, response):
+        """httpx response hook installed on the OpenAI client."""
+        self.update_from_headers(response.headers)
+        with self.lock:
+            if response.status_code == 429:
+                retry_after = response.headers.get("retry-after-ms")
+                retry_after = float(retry_after) / 1000 if retry_after else parse_duration(
+                    response.headers.get("retry-after") or response.headers.get("x-ratelimit-reset-tokens")
+                )
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                self.throttle = max(0.1, self.throttle / 2)
+                self.rate_limited += 1
+            else:
+                self.throttle = min(1.0, self.throttle + 0.05)
+
+    async def aon_response(self, response):
+        """Async variant of on_response for the AsyncOpenAI client's httpx hooks."""
+        self.on_response(response)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "request_limit": self.request_limit,
+                "token_limit": self.token_limit,
+                "throttle": round(self.throttle, 2),
+                "rate_limited": self.rate_limited,
+                "waited_s": round(self.waited, 3),
+            }
+
+
+# One limiter per process, shared by every generator and thread in it.
+openai_limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
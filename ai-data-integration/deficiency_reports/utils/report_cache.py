@@ -0,0 +1,60 @@
+import hashlib
+import logging
+import threading
+from .config import MODEL, PROMPT_VERSION
+from ..models import PDF, PDFStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """Content-addressed cache of generated reports.
+
+    The key is a hash of the PDF bytes, the model and the prompt version, stored
+    in PDF.content_hash. A PDF whose key matches an already processed PDF reuses
+    that PDF's report file instead of running extraction and the LLM again.
+    """
+
+    hits = 0
+    misses = 0
+    _lock = threading.Lock()
+
+    def compute_key(self, pdf_source) -> str:
+        digest = hashlib.sha256()
+        if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+            digest.update(pdf_source)
+        else:
+            with open(pdf_source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        digest.update(f"|{MODEL}|{PROMPT_VERSION}".encode())
+        return digest.hexdigest()
+
+    def lookup(self, content_hash: str):
+        report_name = (
+            PDF.objects.filter(content_hash=content_hash, status=PDFStatus.PROCESS_SUCCESS)
+            .exclude(deficiency_report__isnull=True)
+            .exclude(deficiency_report="")
+            .values_list("deficiency_report", flat=True)
+            .first()
+        )
+        with ReportCache._lock:
+            if report_name:
+                ReportCache.hits += 1
+            else:
+                ReportCache.misses += 1
+        logger.info(f"Report cache {'hit' if report_name else 'miss'} for {content_hash}")
+        return report_name
+
+    def invalidate(self, content_hash=None):
+        """Drop one cache entry, or every entry when content_hash is None."""
+        pdfs = PDF.objects.exclude(content_hash__isnull=True)
+        if content_hash:
+            pdfs = pdfs.filter(content_hash=content_hash)
+        cleared = pdfs.update(content_hash=None)
+        logger.info(f"Report cache invalidated, {cleared} entries cleared")
+        return cleared
+
+    def stats(self):
+        with ReportCache._lock:
+            return {"hits": ReportCache.hits, "misses": ReportCache.misses}
@@ -0,0 +1,49 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .aws import get_client
+
+logger = logging.getLogger(__name__)
+
+
+class ReportNotFound(Exception):
+    pass
+
+
+def fetch_report(report_key):
+    """Report JSON bytes plus validators, from the report cache or S3.
+
+    Returns {"body", "etag", "last_modified"} with the ETag as S3 reports it
+    and last_modified as a Unix timestamp. Reports do not change once written,
+    so entries live for REPORT_CACHE_TIMEOUT; that also bounds how long a
+    regenerated report can be served stale.
+    """
+    cache = caches[settings.REPORT_CACHE_ALIAS]
+    cache_key = f"deficiency-report:{report_key}"
+    entry = cache.get(cache_key)
+    if entry is not None:
+        return entry
+
+    s3_client = get_client('s3')
+    try:
+        s3_object = s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=report_key)
+    except s3_client.exceptions.NoSuchKey as e:
+        raise ReportNotFound(report_key) from e
+    entry = {
+        'body': s3_object['Body'].read(),
+        'etag': s3_object['ETag'],
+        'last_modified': int(s3_object['LastModified'].timestamp()),
+    }
+    if len(entry['body']) <= settings.REPORT_CACHE_MAX_BODY_BYTES:
+        cache.set(cache_key, entry, settings.REPORT_CACHE_TIMEOUT)
+    return entry
+
+
+def presigned_report_url(report_key):
+    return get_client('s3').generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': report_key},
+        ExpiresIn=settings.REPORT_URL_EXPIRY,
+    )
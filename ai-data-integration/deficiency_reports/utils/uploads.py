@@ -0,0 +1,89 @@
+import math
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .aws import get_client
+from ..models import pdf_upload_path
+
+PDF_CONTENT_TYPE = 'application/pdf'
+# S3 limits for multipart uploads.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class UploadError(Exception):
+    pass
+
+
+def upload_key(pdf, filename):
+    """Object key the client uploads to; the same key PDF.pdf_file would get from a form upload."""
+    return pdf_upload_path(pdf, default_storage.get_valid_name(filename))
+
+
+def presign_upload(key, size=None):
+    """Upload instructions for key: one presigned POST, or presigned multipart part URLs for large files.
+
+    Abandoned multipart uploads are left for the bucket's AbortIncompleteMultipartUpload
+    lifecycle rule to clean up.
+    """
+    s3_client = get_client('s3')
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    if size is not None and size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f"File is larger than the {settings.UPLOAD_MAX_BYTES} byte limit.")
+
+    if size is None or size < settings.UPLOAD_MULTIPART_THRESHOLD:
+        post = s3_client.generate_presigned_post(
+            Bucket=bucket,
+            Key=key,
+            Fields={'Content-Type': PDF_CONTENT_TYPE},
+            Conditions=[
+                {'Content-Type': PDF_CONTENT_TYPE},
+                ['content-length-range', 1, min(settings.UPLOAD_MAX_BYTES, settings.UPLOAD_MULTIPART_THRESHOLD)],
+            ],
+            ExpiresIn=settings.UPLOAD_URL_EXPIRY,
+        )
+        return {'method': 'POST', 'url': post['url'], 'fields': post['fields']}
+
+    part_size = max(settings.UPLOAD_PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=PDF_CONTENT_TYPE)['UploadId']
+    parts = [
+        {
+            'part_number': part_number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+                ExpiresIn=settings.UPLOAD_URL_EXPIRY,
+            ),
+        }
+        for part_number in range(1, math.ceil(size / part_size) + 1)
+    ]
+    return {'method': 'PUT', 'upload_id': upload_id, 'part_size': part_size, 'parts': parts}
+
+
+def complete_multipart_upload(key, upload_id, parts):
+    """Stitch the uploaded parts together; parts is [{"part_number", "etag"}] as returned by S3 per PUT."""
+    try:
+        get_client('s3').complete_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(
+                ({'PartNumber': int(part['part_number']), 'ETag': part['etag']} for part in parts),
+                key=lambda part: part['PartNumber'],
+            )},
+        )
+    except (ClientError, KeyError, TypeError, ValueError) as e:
+        raise UploadError(f"Could not complete multipart upload: {e}") from e
+
+
+def uploaded_size(key):
+    """Size of the uploaded object, or None if nothing has been uploaded to key yet."""
+    try:
+        head = get_client('s3').head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return head['ContentLength']
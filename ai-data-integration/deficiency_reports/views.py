@@ -1,19 +1,25 @@
-import boto3
-import tempfile
 import logging
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema
-from .serializers import PdfSerializer
-from .models import PDF, PDFStatus
-from .utils.deficiency_report import DeficiencyReportGenerator
-from django.conf import settings
-from django.http import JsonResponse
-import os
-import json
-from datetime import datetime 
-import requests
+from .serializers import PDF_COLUMNS, PdfSerializer, PdfRowSerializer, DeficiencyRowSerializer
+from .models import PDF, PDFStatus, ReportJob
+from .utils.metrics import metrics_summary
+from .utils.events import publish_pdf_uploaded
+from .utils.report_store import ReportNotFound, fetch_report, presigned_report_url
+from .utils.jobs import enqueue_report_job, job_payload, validate_callback_url
+from .utils.uploads import UploadError, complete_multipart_upload, presign_upload, upload_key, uploaded_size
+from .utils.pagination import InvalidCursor, keyset_page, parse_page_size, stream_json_array
+from .utils.deficiencies import GROUP_BY_FIELDS, deficiency_summary, filter_deficiencies
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.db import transaction
+from django.utils import timezone
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from datetime import datetime, timedelta
 logger = logging.getLogger(__name__)
 
 @extend_schema(
@@ -23,7 +29,6 @@ logger = logging.getLogger(__name__)
 )
 @api_view(['POST'])
 def upload_pdf(request):
-    print(json.dumps(dict(request.headers), indent=4)) 
     logger.info("Received request to upload PDF.")
     pdf_file = request.FILES.get('pdf_file')
     if not pdf_file:
@@ -32,9 +37,95 @@ def upload_pdf(request):
 
     pdf_instance = PDF.objects.create(pdf_file=pdf_file)
     logger.info(f"PDF uploaded successfully with ID: {pdf_instance.id}")
+    transaction.on_commit(lambda: publish_pdf_uploaded(pdf_instance.id))
     return Response(PdfSerializer(pdf_instance).data, status=status.HTTP_201_CREATED)
 
 
+
+@extend_schema(
+    tags=['Pdf'],
+    request={'application/json': {'type': 'object', 'properties': {'filename': {'type': 'string'}, 'size': {'type': 'integer'}}, 'required': ['filename']}},
+)
+@api_view(['POST'])
+def create_upload(request):
+    """Start a direct-to-S3 upload.
+
+    Creates the PDF row (Awaiting Upload) and returns presigned upload details
+    for its key: a POST form for small files, or one PUT URL per part when
+    size is at least UPLOAD_MULTIPART_THRESHOLD. The file never passes through
+    this server; call complete-upload once S3 has it.
+    """
+    filename = request.data.get('filename')
+    if not filename:
+        return Response({'error': 'filename is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    size = request.data.get('size')
+    try:
+        size = int(size) if size is not None else None
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be an integer number of bytes.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    pdf_instance = PDF(status=PDFStatus.AWAITING_UPLOAD)
+    pdf_instance.pdf_file.name = upload_key(pdf_instance, filename)
+    try:
+        upload = presign_upload(pdf_instance.pdf_file.name, size)
+    except UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error creating upload for {filename}: {e}")
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    pdf_instance.save()
+    logger.info(f"Created upload for PDF ID: {pdf_instance.id} ({upload['method']})")
+    return Response({'request_id': str(pdf_instance.id), 'key': pdf_instance.pdf_file.name, 'upload': upload},
+                    status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    tags=['Pdf'],
+    request={'application/json': {'type': 'object', 'properties': {
+        'upload_id': {'type': 'string'},
+        'parts': {'type': 'array', 'items': {'type': 'object', 'properties': {
+            'part_number': {'type': 'integer'}, 'etag': {'type': 'string'}}}},
+    }}},
+    responses=PdfSerializer,
+)
+@api_view(['POST'])
+def complete_upload(request, id):
+    """Finish a direct-to-S3 upload and queue the PDF for processing.
+
+    Multipart uploads pass upload_id and the part ETags. The object is checked
+    with a HEAD request before the row moves to Not Processed; calling this
+    again after that just returns the row.
+    """
+    try:
+        pdf_instance = PDF.objects.get(id=id)
+    except (PDF.DoesNotExist, ValidationError):
+        return Response({"error": f"PDF with ID {id} not found."}, status=status.HTTP_404_NOT_FOUND)
+    if pdf_instance.status != PDFStatus.AWAITING_UPLOAD:
+        return Response(PdfSerializer(pdf_instance).data, status=status.HTTP_200_OK)
+
+    key = pdf_instance.pdf_file.name
+    try:
+        if request.data.get('upload_id'):
+            complete_multipart_upload(key, request.data['upload_id'], request.data.get('parts') or [])
+        size = uploaded_size(key)
+    except UploadError as e:
+        logger.error(f"Completing upload for PDF ID {id} failed: {e}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error checking upload for PDF ID {id}: {e}")
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if not size:
+        return Response({'error': 'The file has not been uploaded to S3 yet.'}, status=status.HTTP_409_CONFLICT)
+
+    # Conditional update so concurrent completions publish the upload event only once.
+    updated = PDF.objects.filter(id=id, status=PDFStatus.AWAITING_UPLOAD).update(status=PDFStatus.NOT_PROCESSED)
+    if updated:
+        logger.info(f"Upload completed for PDF ID: {id} ({size} bytes)")
+        transaction.on_commit(lambda: publish_pdf_uploaded(id))
+    pdf_instance.refresh_from_db()
+    return Response(PdfSerializer(pdf_instance).data, status=status.HTTP_200_OK)
+
+
 @extend_schema(
     tags=['Pdf'],
     request={
@@ -69,90 +160,131 @@ def upload_pdf(request):
     
 #     return Response(PdfSerializer(uploaded_pdfs, many=True).data, status=status.HTTP_201_CREATED)
 
-@extend_schema(tags=['Pdf'], responses=PdfSerializer)
+@extend_schema(tags=['Pdf'], responses=PdfSerializer(many=True))
 @api_view(['GET'])
 def get_pdf(request, start_date, end_date):
+    """List PDFs uploaded between start_date and end_date (inclusive).
+
+    Without paging parameters the rows are streamed as a JSON array straight
+    from a server-side cursor. With ?limit= and/or ?cursor= a single page is
+    returned as {"results", "next_cursor"} (plus "count" when ?count=true).
+    File URLs come from the custom domain; ?signed=true presigns them instead.
+    """
     logger.info(f"Fetching PDFs between {start_date} and {end_date}.")
     try:
         start_date, end_date = datetime.strptime(start_date, '%Y-%m-%d'), datetime.strptime(end_date, '%Y-%m-%d')
-        pdf_documents = PDF.objects.filter(uploaded_at__date__range=[start_date, end_date])
-        logger.info(f"Fetched {pdf_documents.count()} PDFs.")
-        return Response(PdfSerializer(pdf_documents, many=True).data, status=status.HTTP_200_OK)
     except ValueError as e:
         logger.error(f"Invalid date format provided: {e}")
         return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
+    # Half-open timestamp range instead of uploaded_at__date so the uploaded_at indexes are usable.
+    pdf_documents = PDF.objects.filter(
+        uploaded_at__gte=timezone.make_aware(start_date),
+        uploaded_at__lt=timezone.make_aware(end_date + timedelta(days=1)),
+    )
+    if request.query_params.get('status'):
+        pdf_documents = pdf_documents.filter(status=request.query_params['status'])
+
+    params = request.query_params
+    serializer = PdfRowSerializer(signed=params.get('signed', '').lower() == 'true')
+    rows = pdf_documents.values(*serializer.value_fields)
+    if 'limit' not in params and 'cursor' not in params:
+        rows = stream_json_array(rows.order_by('uploaded_at', 'id'), serializer.to_representation)
+        return StreamingHttpResponse(rows, content_type='application/json')
+
+    try:
+        rows, next_cursor = keyset_page(rows, params.get('cursor'), parse_page_size(params.get('limit')))
+    except InvalidCursor as e:
+        logger.error(str(e))
+        return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as e:
+        logger.error(f"Invalid page size provided: {e}")
+        return Response({"error": "limit must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    page = {"results": serializer.serialize(rows), "next_cursor": next_cursor}
+    if params.get('count', '').lower() == 'true':
+        page["count"] = pdf_documents.count()
+    logger.info(f"Returning {len(rows)} PDFs.")
+    return Response(page, status=status.HTTP_200_OK)
+
 @extend_schema(tags=['Report'])
-@api_view(["GET"])
+@api_view(["GET", "POST"])
 def generate_deficiency_report(request, id):
+    """Queue report generation for a PDF and return 202 with the job.
+
+    The report is produced by the run_report_worker command; poll the job's
+    status_url or pass callback_url to have the result POSTed back. Asking
+    again while a job is queued or running returns that same job.
+    """
     logger.info(f"Generating deficiency report for PDF ID: {id}")
     try:
         pdf = PDF.objects.get(id=id)
-        if pdf.deficiency_report:
-            logger.info(f"Report already exists for PDF ID: {id}")
-            return Response(PdfSerializer(pdf).data, status=status.HTTP_208_ALREADY_REPORTED)
-
-        update_pdf_status(pdf, PDFStatus.PROCESSING)
-        s3_client = boto3.client('s3',
-                                  aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-                                 )
-        s3_bucket = settings.AWS_STORAGE_BUCKET_NAME  
-        s3_key = pdf.pdf_file.name  
+    except (PDF.DoesNotExist, ValidationError):
+        error_message = f"PDF with ID {id} not found."
+        logger.error(error_message)
+        return Response({"error": error_message}, status=status.HTTP_404_NOT_FOUND)
+    if pdf.deficiency_report:
+        logger.info(f"Report already exists for PDF ID: {id}")
+        return Response(PdfSerializer(pdf).data, status=status.HTTP_208_ALREADY_REPORTED)
+    if pdf.status == PDFStatus.AWAITING_UPLOAD:
+        return Response({"error": "The PDF upload has not been completed."}, status=status.HTTP_409_CONFLICT)
 
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            s3_client.download_fileobj(s3_bucket, s3_key, temp_file)
-            temp_file_path = temp_file.name  
+    callback_url = request.data.get('callback_url') or request.query_params.get('callback_url')
+    if callback_url:
+        try:
+            validate_callback_url(callback_url)
+        except ValidationError as e:
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
 
-        report_generator = DeficiencyReportGenerator()
-        report = report_generator.generate_report(temp_file_path, pdf)
+    job, created = enqueue_report_job(pdf, callback_url)
+    logger.info(f"{'Queued' if created else 'Reusing'} report job {job.id} for PDF ID: {id}")
+    payload = job_payload(job)
+    payload['status_url'] = request.build_absolute_uri(reverse('get_report_job', args=[job.id]))
+    return Response(payload, status=status.HTTP_202_ACCEPTED)
 
-        update_pdf_status(pdf, PDFStatus.PROCESS_SUCCESS)
-        logger.info(f"Deficiency report generated successfully for PDF ID: {id}")
 
-        os.remove(temp_file_path)
+@extend_schema(tags=['Report'])
+@api_view(["GET"])
+def get_report_job(request, job_id):
+    try:
+        job = ReportJob.objects.get(id=job_id)
+    except (ReportJob.DoesNotExist, ValidationError):
+        return Response({"error": f"Report job {job_id} not found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_payload(job), status=status.HTTP_200_OK)
 
-        return Response(PdfSerializer(report).data, status=status.HTTP_200_OK)
-    except PDF.DoesNotExist:
-        error_message = f"PDF with ID {id} not found."
-        logger.error(error_message)
-        return Response({"error": error_message}, status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        logger.error(f"Error processing PDF ID {id}: {e}")
-        update_pdf_status(pdf, PDFStatus.PROCESS_FAILED)
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
 @extend_schema(tags=['Report'])
 @api_view(["GET"])
 def get_deficiency_report(request, id):
+    """Return the stored report JSON for a PDF.
+
+    Bodies are served from the report cache with the S3 ETag and Last-Modified,
+    so If-None-Match / If-Modified-Since get a 304. With ?redirect=true the
+    response is a redirect to a short-lived presigned S3 URL instead.
+    """
     logger.info(f"Retrieving deficiency report for PDF ID: {id}")
     try:
-        pdf = PDF.objects.get(id=id)
+        pdf = PDF.objects.only(*PDF_COLUMNS).get(id=id)
         if not pdf.deficiency_report:
             return Response(PdfSerializer(pdf).data, status=status.HTTP_404_NOT_FOUND)
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
-
-        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
         report_key = str(pdf.deficiency_report)
 
-        s3_object = s3_client.get_object(Bucket=bucket_name, Key=report_key)
-        report_data = json.loads(s3_object['Body'].read().decode('utf-8'))
+        if request.query_params.get('redirect', '').lower() == 'true':
+            response = HttpResponseRedirect(presigned_report_url(report_key))
+            patch_cache_control(response, no_store=True)
+            return response
 
+        report = fetch_report(report_key)
+        response = HttpResponse(report['body'], content_type='application/json')
+        response['ETag'] = report['etag']
+        response['Last-Modified'] = http_date(report['last_modified'])
+        patch_cache_control(response, private=True, no_cache=True)
         logger.info(f"Deficiency report retrieved successfully for PDF ID: {id}")
-        # url=pdf.deficiency_report.url
-        # response=requests.get(url)
-        return JsonResponse(report_data, status=status.HTTP_200_OK)
+        return get_conditional_response(request, etag=report['etag'], last_modified=report['last_modified'], response=response)
     except PDF.DoesNotExist:
         error_message = f"PDF with ID {id} not found."
         logger.error(error_message)
         return Response({"error": error_message}, status=status.HTTP_404_NOT_FOUND)
-    except s3_client.exceptions.NoSuchKey:
+    except ReportNotFound:
         error_message = f"Report file not found in S3 for PDF ID: {id}."
         logger.error(error_message)
         return Response({"error": error_message}, status=status.HTTP_404_NOT_FOUND)
@@ -160,7 +292,56 @@ def get_deficiency_report(request, id):
         logger.error(f"Error retrieving report for PDF ID {id}: {e}")
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def update_pdf_status(pdf: PDF, status: str):
-    pdf.status = status
-    pdf.save()
-    logger.info(f"PDF ID {pdf.id} status updated to {status}")
\ No newline at end of file
+@extend_schema(tags=['Metrics'])
+@api_view(["GET"])
+def get_metrics_summary(request, start_date, end_date):
+    logger.info(f"Summarising metrics between {start_date} and {end_date}.")
+    try:
+        start_date, end_date = datetime.strptime(start_date, '%Y-%m-%d'), datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError as e:
+        logger.error(f"Invalid date format provided: {e}")
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+    # end_date is inclusive, so query up to the start of the following day.
+    summary = metrics_summary(start_date, end_date + timedelta(days=1), request.query_params.get('source'))
+    return Response(summary, status=status.HTTP_200_OK)
+
+@extend_schema(tags=['Deficiency'])
+@api_view(["GET"])
+def get_deficiencies(request):
+    """List deficiencies across all reports, read from the deficiencies table instead of S3.
+
+    Filters: start_date / end_date (YYYY-MM-DD, inclusive), severity, status,
+    location, inspector and pdf_id. Returns {"results", "next_cursor"}, paged
+    on (uploaded_at, id) with ?limit= and ?cursor=.
+    """
+    params = request.query_params
+    try:
+        deficiencies = filter_deficiencies(params).values(*DeficiencyRowSerializer.value_fields)
+        rows, next_cursor = keyset_page(deficiencies, params.get('cursor'), parse_page_size(params.get('limit')), pk_type=int)
+    except InvalidCursor as e:
+        logger.error(str(e))
+        return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+    except (ValueError, ValidationError) as e:
+        logger.error(f"Invalid deficiency filters provided: {e}")
+        return Response({"error": "Invalid filters. Dates use YYYY-MM-DD, limit is a positive integer and pdf_id a UUID."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    logger.info(f"Returning {len(rows)} deficiencies.")
+    return Response({"results": DeficiencyRowSerializer().serialize(rows), "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+@extend_schema(tags=['Deficiency'])
+@api_view(["GET"])
+def get_deficiency_summary(request):
+    """Count deficiencies (and the PDFs they come from) per severity, status, location or inspector.
+
+    Takes the same filters as get_deficiencies plus ?group_by= (default severity).
+    """
+    group_by = request.query_params.get('group_by', 'severity')
+    if group_by not in GROUP_BY_FIELDS:
+        return Response({"error": f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        summary = deficiency_summary(filter_deficiencies(request.query_params), group_by)
+    except (ValueError, ValidationError) as e:
+        logger.error(f"Invalid deficiency filters provided: {e}")
+        return Response({"error": "Invalid filters. Dates use YYYY-MM-DD and pdf_id is a UUID."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"group_by": group_by, "results": summary}, status=status.HTTP_200_OK)